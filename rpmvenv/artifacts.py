@@ -0,0 +1,448 @@
+"""A content addressed store of built RPMs.
+
+Every build is identified by a fingerprint of its rendered SPEC, the content
+of its source tree, the enabled extension versions, and the interpreter. A
+build whose fingerprint is already in the store is served from it without
+running rpmbuild. The store is a local directory with one entry for each
+fingerprint. Entries are evicted in least recently used order when the store
+grows beyond its size limit. Every read and change of the store happens
+under an exclusive lock on a file in the store so that concurrent rpmvenv
+processes can share it. Absolute paths of the build host are replaced with
+placeholders before the SPEC is hashed so that builds of the same inputs
+from different checkouts share entries.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+try:
+
+    import fcntl
+
+except ImportError:  # pragma: no cover
+
+    fcntl = None
+
+from . import stage
+
+
+# The default size limit of a store in bytes.
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+# The default number of source file hashes remembered by a store.
+DEFAULT_MAX_HASHES = 100000
+
+LOCK_FILE = '.lock'
+HASHES_FILE = '.hashes.json'
+TMP_PREFIX = '.tmp-'
+
+
+def _file_digest(path):
+    """Get the hex hash of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as content:
+
+        for chunk in iter(lambda: content.read(1024 * 1024), b''):
+
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def source_digest(source, ignore=(), selection=None, memo=None):
+    """Get a hash of the relative paths and content of a source tree.
+
+    Args:
+        source (str): The absolute path to the source directory.
+        ignore (iter of str): Glob patterns of base names to skip.
+        selection (stage.Selection): Optional filter of relative paths.
+        memo (dict): Optional mapping of absolute path to a signature,
+            content hash, and last use time from an earlier call. Files with
+            an unchanged signature are not read again. The mapping is updated
+            in place.
+
+    Returns:
+        str: The hex digest of the tree.
+    """
+    memo = {} if memo is None else memo
+    now = time.time()
+    dirs, files = stage.scan(source, ignore, selection)
+    digest = hashlib.sha256()
+    for path in sorted(dirs):
+
+        digest.update('d:{0}\0'.format(path).encode('utf8'))
+
+    for path in sorted(files):
+
+        absolute = os.path.join(source, path)
+        known = memo.get(absolute)
+        if not known or known[0] != files[path]:
+
+            known = [files[path], _file_digest(absolute)]
+
+        memo[absolute] = [known[0], known[1], now]
+        digest.update('f:{0}\0{1}\0'.format(path, known[1]).encode('utf8'))
+
+    return digest.hexdigest()
+
+
+def normalize(text, paths=None):
+    """Replace the absolute paths of the build host in a rendered SPEC.
+
+    Args:
+        text (str): The rendered SPEC.
+        paths (dict): A mapping of placeholder name to the absolute path it
+            replaces. Longer paths are replaced first so that a path inside
+            another keeps its own placeholder.
+
+    Returns:
+        str: The SPEC with each path replaced by '@<name>@'.
+    """
+    for name, path in sorted(
+            (paths or {}).items(),
+            key=lambda item: len(item[1]),
+            reverse=True,
+    ):
+
+        if path:
+
+            text = text.replace(path, '@{0}@'.format(name))
+
+    return text
+
+
+class SpecDigest(object):
+
+    """A text stream which hashes a SPEC as it is rendered into it.
+
+    The absolute paths of the build host are normalized one line at a time
+    so that the SPEC is never held in memory as a whole.
+    """
+
+    def __init__(self, paths=None):
+        """Initialize the digest.
+
+        Args:
+            paths (dict): The absolute paths of the build host, by
+                placeholder name, which are normalized before hashing.
+        """
+        self.paths = paths
+        self._digest = hashlib.sha256()
+        self._buffer = ''
+
+    def write(self, text):
+        """Hash every complete line of the text."""
+        lines = (self._buffer + text).split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+
+            self._digest.update(
+                normalize('{0}\n'.format(line), self.paths).encode('utf8'),
+            )
+
+    def hexdigest(self):
+        """Get the hex digest of everything written so far."""
+        digest = self._digest.copy()
+        digest.update(normalize(self._buffer, self.paths).encode('utf8'))
+        return digest.hexdigest()
+
+
+def fingerprint(
+        specfile,
+        source,
+        extensions=(),
+        interpreter='',
+        mode='all',
+        paths=None,
+):
+    """Get the key of a build.
+
+    Args:
+        specfile (str, Spec, or SpecDigest): The rendered SPEC file, a Spec
+            which is rendered to be hashed, or a SpecDigest into which the
+            SPEC was already written. The paths of a SpecDigest are its own.
+        source (str): The digest of the source tree from source_digest.
+        extensions (iter): The enabled extensions.
+        interpreter (str): A description of the interpreter used.
+        mode (str): The rpmbuild build mode, which decides the packages built.
+        paths (dict): The absolute paths of the build host, by placeholder
+            name, which are normalized in the SPEC before it is hashed.
+
+    Returns:
+        str: The hex digest which identifies the build.
+    """
+    if not isinstance(specfile, SpecDigest):
+
+        digest = SpecDigest(paths)
+        if isinstance(specfile, str):
+
+            digest.write(specfile)
+
+        else:
+
+            specfile.write(digest)
+
+        specfile = digest
+
+    document = {
+        'spec': specfile.hexdigest(),
+        'source': source,
+        'extensions': sorted(
+            '{0}=={1}'.format(ext.name, ext.version) for ext in extensions
+        ),
+        'interpreter': interpreter,
+        'mode': mode,
+    }
+    return hashlib.sha256(
+        json.dumps(document, sort_keys=True).encode('utf8'),
+    ).hexdigest()
+
+
+class Store(object):
+
+    """A directory of built RPMs keyed by fingerprint."""
+
+    def __init__(
+            self,
+            path,
+            max_size=DEFAULT_MAX_SIZE,
+            max_hashes=DEFAULT_MAX_HASHES,
+    ):
+        """Initialize the store.
+
+        Args:
+            path (str): The directory which holds the store. It is created
+                if it does not exist.
+            max_size (int): The size in bytes beyond which entries are
+                evicted.
+            max_hashes (int): The number of source file hashes beyond which
+                the least recently used are forgotten.
+        """
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.max_hashes = max_hashes
+        if not os.path.isdir(self.path):
+
+            os.makedirs(self.path)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Hold the exclusive lock of the store."""
+        with open(os.path.join(self.path, LOCK_FILE), 'a') as lock_file:
+
+            if fcntl is not None:
+
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+            try:
+
+                yield
+
+            finally:
+
+                if fcntl is not None:
+
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read_hashes(self):
+        """Get the content hashes memo. The lock must be held."""
+        try:
+
+            with open(os.path.join(self.path, HASHES_FILE)) as hashes_file:
+
+                return json.load(hashes_file)
+
+        except (IOError, OSError, ValueError):
+
+            return {}
+
+    def _write_hashes(self, memo):
+        """Persist the content hashes memo. The lock must be held."""
+        descriptor, tmp = tempfile.mkstemp(prefix=TMP_PREFIX, dir=self.path)
+        with os.fdopen(descriptor, 'w') as hashes_file:
+
+            json.dump(memo, hashes_file)
+
+        os.replace(tmp, os.path.join(self.path, HASHES_FILE))
+
+    def prune_hashes(self, memo):
+        """Remove the hashes of missing files and the least recently used.
+
+        Returns:
+            dict: The memo with at most max_hashes entries.
+        """
+        entries = sorted(
+            (
+                item for item in memo.items()
+                if os.path.exists(item[0])
+            ),
+            key=lambda item: item[1][2] if len(item[1]) > 2 else 0,
+            reverse=True,
+        )
+        return dict(entries[:self.max_hashes])
+
+    def read_hashes(self):
+        """Get the content hashes memo of the store."""
+        with self.lock():
+
+            return self._read_hashes()
+
+    def write_hashes(self, memo):
+        """Merge a memo into the store and prune it.
+
+        Entries from other processes which were written since the memo was
+        read are kept unless the memo used the file more recently.
+        """
+        with self.lock():
+
+            merged = self._read_hashes()
+            for path, value in memo.items():
+
+                known = merged.get(path)
+                if not known or len(known) < 3 or known[2] <= value[2]:
+
+                    merged[path] = value
+
+            self._write_hashes(self.prune_hashes(merged))
+
+    def get(self, key, destination):
+        """Copy the RPMs of a fingerprint into the destination.
+
+        The lock is only held to find the entry and mark its use so that
+        other processes are not blocked while the RPMs are copied. An entry
+        which is evicted during the copy is a miss and nothing is left in
+        the destination.
+
+        Returns:
+            tuple of str: The paths of the copies or None if the fingerprint
+                is not in the store.
+        """
+        entry = os.path.join(self.path, key)
+        with self.lock():
+
+            if not os.path.isdir(entry):
+
+                return None
+
+            names = sorted(os.listdir(entry))
+            # The modification time of an entry records its last use.
+            os.utime(entry)
+
+        paths = []
+        try:
+
+            for name in names:
+
+                # Copy to a temporary name first so that an interrupted copy
+                # never looks like a complete RPM.
+                descriptor, tmp = tempfile.mkstemp(
+                    prefix=TMP_PREFIX,
+                    dir=destination,
+                )
+                os.close(descriptor)
+                paths.append(tmp)
+                shutil.copy2(os.path.join(entry, name), tmp)
+                os.replace(tmp, os.path.join(destination, name))
+                paths[-1] = os.path.join(destination, name)
+
+        except (IOError, OSError):
+
+            for path in paths:
+
+                if os.path.exists(path):
+
+                    os.unlink(path)
+
+            # Only an entry which was evicted meanwhile is a miss. Any
+            # other failure, such as a full disk, is reported.
+            if os.path.isdir(entry):
+
+                raise
+
+            return None
+
+        return tuple(paths)
+
+    def put(self, key, paths):
+        """Store the RPMs of a fingerprint and evict old entries."""
+        tmp = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=self.path)
+        try:
+
+            for path in paths:
+
+                shutil.copy2(path, os.path.join(tmp, os.path.basename(path)))
+
+            with self.lock():
+
+                entry = os.path.join(self.path, key)
+                if os.path.isdir(entry):
+
+                    # Another process stored the same build first.
+                    shutil.rmtree(tmp)
+
+                else:
+
+                    os.rename(tmp, entry)
+                    os.utime(entry)
+
+                self.evict()
+
+        except BaseException:
+
+            if os.path.isdir(tmp):
+
+                shutil.rmtree(tmp)
+
+            raise
+
+    def entries(self):
+        """Get the last use time, size, and path of every entry."""
+        result = []
+        for entry in os.scandir(self.path):
+
+            if entry.name.startswith('.') or not entry.is_dir():
+
+                continue
+
+            size = sum(
+                os.path.getsize(os.path.join(entry.path, name))
+                for name in os.listdir(entry.path)
+            )
+            result.append((entry.stat().st_mtime, size, entry.path))
+
+        return sorted(result)
+
+    def evict(self):
+        """Remove the least recently used entries beyond the size limit.
+
+        The hashes of missing and least recently used source files are
+        pruned too. This must be called with the lock held.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        self._write_hashes(self.prune_hashes(self._read_hashes()))
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+
+            if total <= self.max_size:
+
+                break
+
+            shutil.rmtree(path)
+            total -= size
+            removed += 1
+
+        return removed
@@ -0,0 +1,79 @@
+"""A small persistent cache of JSON documents.
+
+Documents are stored in the user cache directory which follows the XDG base
+directory specification. Reads and writes never fail. A cache that cannot be
+used simply behaves as if it were empty.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import tempfile
+
+
+def directory():
+    """Get the absolute path to the rpmvenv cache directory."""
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'),
+        '.cache',
+    )
+    return os.path.join(root, 'rpmvenv')
+
+
+def path(name):
+    """Get the absolute path to a named document in the cache."""
+    return os.path.join(directory(), '{0}.json'.format(name))
+
+
+def read(name):
+    """Get the named document or None if it is missing or unreadable."""
+    try:
+
+        with open(path(name), 'r') as cache_file:
+
+            return json.load(cache_file)
+
+    except (OSError, ValueError):
+
+        return None
+
+
+def write(name, document):
+    """Store a document under a name.
+
+    The document is written to a temporary file and renamed into place so
+    that concurrent readers never observe a partial write.
+
+    Returns:
+        bool: True if the document was stored and False otherwise.
+    """
+    tmp = None
+    try:
+
+        if not os.path.isdir(directory()):
+
+            os.makedirs(directory())
+
+        descriptor, tmp = tempfile.mkstemp(
+            prefix='.{0}'.format(name),
+            dir=directory(),
+        )
+        with os.fdopen(descriptor, 'w') as cache_file:
+
+            json.dump(document, cache_file)
+
+        os.replace(tmp, path(name))
+
+    except OSError:
+
+        if tmp and os.path.exists(tmp):
+
+            os.unlink(tmp)
+
+        return False
+
+    return True
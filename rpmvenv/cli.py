@@ -6,16 +6,31 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import collections
+import contextlib
 import os
 import shutil
 import subprocess
 import sys
+import threading
+import time
+import traceback
 
 import confpy.api
+import confpy.parser
 
 from .extensions import loader as extensions_loader
+from . import artifacts
+from . import config as lazyconfig
+from . import lock
+from . import matrix
+from . import profiling
 from . import rpmbuild
 from . import spec
+from . import stage
+from . import timing
+from . import wheelhouse
+from . import workspace as workspaces
 
 
 confpy.api.Configuration(
@@ -26,15 +41,68 @@ confpy.api.Configuration(
             default=(),
         ),
     ),
+    matrix=confpy.api.Namespace(
+        description='Build several variants of the RPM from one config.',
+        variants=confpy.api.ListOption(
+            description=(
+                'Variants to build. Each sets a python, a buildarch, and a '
+                'suffix for the package name.'
+            ),
+            option=matrix.VariantOption(),
+            default=(),
+        ),
+    ),
+)
+
+
+Job = collections.namedtuple('Job', ['config', 'variant', 'staged'])
+
+
+# Extensions of the configuration files picked up when a directory is given
+# on the command line.
+CONFIG_EXTENSIONS = (
+    '.json',
+    '.ini',
 )
 
 
+def find_configs(paths):
+    """Expand any directories in paths into the config files they contain.
+
+    Args:
+        paths (iter of str): Paths to configuration files or directories.
+
+    Returns:
+        tuple of str: The absolute paths of all configuration files.
+    """
+    configs = []
+    for path in paths:
+
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+
+            configs.append(path)
+            continue
+
+        configs.extend(
+            os.path.join(path, name) for name in sorted(os.listdir(path))
+            if os.path.splitext(name)[1] in CONFIG_EXTENSIONS
+            and os.path.isfile(os.path.join(path, name))
+        )
+
+    return tuple(configs)
+
+
 def parse_args(argv):
     """Parse the command line arguments."""
     parser = argparse.ArgumentParser(description='Generate an RPM.')
     parser.add_argument(
         'config',
-        help='The path to a configuration file.',
+        help=(
+            'The path to a configuration file. Multiple files, or '
+            'directories of them, may be given to build several RPMs.'
+        ),
+        nargs='+',
     )
     parser.add_argument(
         '--source',
@@ -58,33 +126,385 @@ def parse_args(argv):
         default=False,
         action='store_true',
     )
+    parser.add_argument(
+        '--stage-mode',
+        help=(
+            'How to place the source files in the build directory. Both '
+            'reflink and hardlink fall back to a copy when unsupported and '
+            'clone tries a reflink and then a hardlink. Default is reflink.'
+        ),
+        choices=stage.MODES,
+        default='reflink',
+    )
+    parser.add_argument(
+        '--stage-jobs',
+        help='The number of files to copy concurrently while staging.',
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        '--source-files',
+        help=(
+            'Which files of the source to package. Use git to include only '
+            'files tracked by git. Default is all.'
+        ),
+        choices=('all', 'git'),
+        default='all',
+    )
+    parser.add_argument(
+        '--timings',
+        help=(
+            'Write a JSON report of the time spent in each rpmbuild phase '
+            'and install step next to the RPM.'
+        ),
+        default=False,
+        action='store_true',
+    )
+    parser.add_argument(
+        '--profile',
+        help=(
+            'Write a JSON profile of each extension and of the SPEC '
+            'rendering to the given path.'
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        '--artifact-cache',
+        help=(
+            'A directory in which to store built RPMs by a fingerprint of '
+            'their inputs. Builds with identical inputs are copied from it '
+            'rather than built again.'
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        '--artifact-cache-size',
+        help=(
+            'The size in MiB beyond which the least recently used RPMs are '
+            'removed from the artifact cache. Default is 10240.'
+        ),
+        type=int,
+        default=10240,
+    )
+    parser.add_argument(
+        '--build-mode',
+        help=(
+            'Which rpmbuild stages to run: all, binary for only the RPM, '
+            'source for only the source RPM, or install to run the SPEC '
+            'through %%install without packaging. Overrides the build_mode '
+            'of the configuration. Default is all.'
+        ),
+        choices=tuple(rpmbuild.BUILD_MODES),
+        default=None,
+    )
+    parser.add_argument(
+        '--workspace',
+        help=(
+            'The directory in which rpmbuild runs. Default is a directory '
+            'of the current user in the system temporary directory.'
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        '--keep-failed-workspace',
+        help='Keep the rpmbuild directory of a failed build for inspection.',
+        default=False,
+        action='store_true',
+    )
+    parser.add_argument(
+        '--reuse-workspace',
+        help=(
+            'Keep the rpmbuild directory of each source in the workspace and '
+            'reuse it in later builds so that only changed files are staged.'
+        ),
+        default=False,
+        action='store_true',
+    )
+    parser.add_argument(
+        '--clean-workspace',
+        help=(
+            'Remove the reused rpmbuild directories of the workspace which '
+            'no build is using before building.'
+        ),
+        default=False,
+        action='store_true',
+    )
+    parser.add_argument(
+        '--jobs',
+        help='The number of RPMs to build concurrently. Default is 1.',
+        type=int,
+        default=1,
+    )
     args, _ = parser.parse_known_args(argv)
     args = vars(args)
-    args['config'] = os.path.abspath(args['config'])
+    args['config'] = find_configs(args['config'])
     args['source'] = (
         os.path.abspath(args['source'])
         if args['source']
-        else os.path.dirname(args['config'])
+        else None
+    )
+    args['profile'] = (
+        os.path.abspath(args['profile'])
+        if args['profile']
+        else None
+    )
+    args['artifact_cache'] = (
+        os.path.abspath(args['artifact_cache'])
+        if args['artifact_cache']
+        else None
+    )
+    args['workspace'] = (
+        os.path.abspath(args['workspace'])
+        if args['workspace']
+        else None
     )
     return args
 
 
-def generate_rpm(source, destination, specfile, verbose=False):
-    """Generate an RPM from the given arguments mapping."""
-    top = rpmbuild.topdir()
-    rpmbuild.copy_source(top, source)
-    specfile = rpmbuild.write_spec(top, specfile)
-    pkg = rpmbuild.build(specfile=specfile, top=top, verbose=verbose)
-    shutil.move(pkg, destination)
-    return os.path.join(destination, os.path.basename(pkg))
+def build_workspace(args):
+    """Get the workspace described by the command line arguments."""
+    return workspaces.Workspace(
+        args['workspace'],
+        keep_failed=args['keep_failed_workspace'],
+        reuse=args['reuse_workspace'],
+    )
+
+
+def main_package(rpm_paths, name=None):
+    """Get the path of the binary RPM of the named package.
+
+    RPM file names are '<name>-<version>-<release>.<arch>.rpm'. The first
+    binary RPM is used when none has the name and the first RPM when there
+    is no binary RPM.
+
+    Returns:
+        str: The path or None if there are no RPMs.
+    """
+    binaries = tuple(
+        path for path in rpm_paths if not path.endswith('.src.rpm')
+    )
+    for path in binaries:
+
+        if os.path.basename(path).rsplit('-', 2)[0] == name:
+
+            return path
+
+    return next(iter(binaries or rpm_paths), None)
+
 
+def install_buildroot(destination, name):
+    """Get the buildroot of an install mode build.
 
-def generate_spec(config, extensions):
-    """Generate a SPEC file from the given arguments mapping."""
+    Args:
+        destination (str): The directory which receives the RPMs.
+        name (str): The name of the package, or the path to its source.
+    """
+    return os.path.join(
+        os.path.abspath(destination),
+        '{0}-buildroot'.format(os.path.basename(name)),
+    )
+
+
+def generate_rpm(
+        source,
+        destination,
+        specfile,
+        verbose=False,
+        stage_mode='reflink',
+        stage_jobs=None,
+        staged=None,
+        archive=None,
+        use_git=False,
+        recorder=None,
+        store=None,
+        extensions=(),
+        interpreter='',
+        workspace=None,
+        mode='all',
+        name=None,
+        host_paths=None,
+        profiler=None,
+):
+    """Generate an RPM from the given arguments mapping.
+
+    If staged is given then it is a copy of the source which is shared with
+    other builds. Its files are reflinked into place, or hardlinked where
+    reflinks are not supported, so that the source is only copied once. If
+    archive is given then the source is streamed into a tarball with that
+    compression instead of being copied as a directory. If use_git is given
+    then only the files tracked by git are included. A staged copy has
+    already been filtered. If recorder is given then it collects the
+    timings of the build and they are written next to the RPM. The paths of
+    every RPM in the destination are returned, which includes any
+    subpackages.
+
+    The specfile is a Spec which is rendered once, straight into the SPEC
+    file. If profiler is given then that rendering is profiled as the
+    'render' section.
+
+    If store is given then it is an artifacts.Store. The build is keyed by
+    the SPEC, the source tree, the extensions, and the interpreter. The SPEC
+    is hashed as it is written. When the key is in the store the RPMs are
+    copied from it without a build. The host_paths map placeholder names to
+    absolute paths of this host which are normalized in the SPEC before it
+    is hashed. The source is always one of them. No timings are written when
+    the RPMs come from the store.
+
+    If workspace is given then it is a workspace.Workspace which provides
+    the rpmbuild %_topdir. The default removes the %_topdir from the system
+    temporary directory once the build finishes.
+
+    The mode is the name of one of the rpmbuild.BUILD_MODES. Nothing is
+    returned in the install mode and nothing is stored or reused for it. Its
+    buildroot is the install_buildroot in the destination rather than the
+    BuildRoot of the SPEC so that it can be inspected.
+
+    The timings are written next to the RPM of the named package rather
+    than a subpackage, such as the deps or debuginfo RPM.
+    """
+    key = None
+    store = None if mode == 'install' else store
+    workspace = workspace or workspaces.Workspace()
+    with workspace.topdir(source) as top:
+
+        digest = (
+            (artifacts.SpecDigest(dict(host_paths or {}, source=source)),)
+            if store
+            else ()
+        )
+        with profile_section(profiler, 'render'):
+
+            specfile = rpmbuild.write_spec(top, specfile, *digest)
+
+        if store:
+
+            memo = store.read_hashes()
+            key = artifacts.fingerprint(
+                digest[0],
+                artifacts.source_digest(
+                    staged or source,
+                    rpmbuild.IGNORED_PATTERNS,
+                    None if staged else stage.Selection.from_source(
+                        source,
+                        use_git,
+                    ),
+                    memo,
+                ),
+                extensions,
+                interpreter,
+                mode,
+            )
+            store.write_hashes(memo)
+            cached = store.get(key, destination)
+            if cached:
+
+                sys.stdout.write(
+                    'Reused the RPMs built from identical inputs.{0}'.format(
+                        os.linesep,
+                    )
+                )
+                if recorder:
+
+                    sys.stdout.write(
+                        'No timings were written because nothing was '
+                        'built.{0}'.format(os.linesep)
+                    )
+
+                return cached
+
+        if archive:
+
+            rpmbuild.archive_source(
+                top,
+                staged or source,
+                archive,
+                name=os.path.basename(source),
+                use_git=use_git and not staged,
+            )
+
+        elif staged:
+
+            # The staged copy is in the same workspace so its files can be
+            # linked in rather than copied again for every build.
+            rpmbuild.copy_source(
+                top,
+                staged,
+                name=os.path.basename(source),
+                mode='clone',
+                jobs=stage_jobs,
+            )
+
+        else:
+
+            rpmbuild.copy_source(
+                top,
+                source,
+                mode=stage_mode,
+                jobs=stage_jobs,
+                use_git=use_git,
+            )
+
+        if recorder:
+
+            recorder.start()
+
+        try:
+
+            pkgs = rpmbuild.build(
+                specfile=specfile,
+                top=top,
+                verbose=verbose,
+                on_line=recorder.feed if recorder else None,
+                mode=mode,
+                buildroot=(
+                    install_buildroot(destination, name or source)
+                    if mode == 'install'
+                    else None
+                ),
+            )
+
+        finally:
+
+            if recorder:
+
+                recorder.stop()
+
+        rpm_paths = []
+        for pkg in pkgs:
+
+            shutil.move(pkg, destination)
+            rpm_paths.append(os.path.join(destination, os.path.basename(pkg)))
+
+    if recorder:
+
+        main = main_package(rpm_paths, name)
+        recorder.write('{0}.timings.json'.format(
+            os.path.splitext(main)[0]
+            if main
+            else os.path.join(destination, os.path.basename(source)),
+        ))
+
+    if store:
+
+        store.put(key, rpm_paths)
+
+    return tuple(rpm_paths)
+
+
+def generate_spec(config, extensions, recorder=None, profiler=None):
+    """Generate a SPEC from the given arguments mapping.
+
+    The Spec is returned unrendered so that it can be streamed straight into
+    the SPEC file. If recorder is given then the SPEC is instrumented with
+    its timing markers. If profiler is given then each extension is profiled
+    as a separate section.
+    """
     specfile = spec.Spec()
     for ext in extensions:
 
-        specfile = ext.generate(config, specfile)
+        with profile_section(profiler, 'extension:{0}'.format(ext.name)):
+
+            specfile = ext.generate(config, specfile)
 
         if not specfile:
 
@@ -94,29 +514,52 @@ def generate_spec(config, extensions):
             )
             sys.exit(1)
 
-    return str(specfile)
+    if recorder:
 
+        specfile = recorder.instrument(specfile)
 
-def main(argv=sys.argv[1:]):
-    """Build an RPM."""
-    args = parse_args(argv)
-    config = confpy.api.parse_options(
-        files=(args['config'],),
-        env_prefix='RPMVENV',
-        strict=False,
-    )
+    return specfile
+
+
+def profile_section(profiler, name):
+    """Profile the body of a with statement if there is a profiler."""
+    if not profiler:
+
+        return contextlib.nullcontext()
+
+    return profiler.section(name)
+
+
+def load_config(path, source):
+    """Load a configuration file and the extensions it enables.
+
+    Args:
+        path: The absolute path to the configuration file.
+        source: The absolute path to the package source.
+
+    Returns:
+        A tuple of the loaded configuration and the extensions in order.
+
+    Raises:
+        MissingDependency: If an extension requires one which is not enabled.
+        InvalidDependency: If an extension requires another version of one.
+    """
+    # The file is parsed once. The extension whitelist comes from the raw
+    # values and every other namespace is only validated when it is used.
+    config = lazyconfig.LazyConfiguration(path, env_prefix='RPMVENV')
     whitelist = tuple(config.extensions.enabled)
     extensions = extensions_loader.load_extensions(whitelist=whitelist)
-    config = confpy.api.parse_options(
-        files=(args['config'],),
-        env_prefix='RPMVENV',
-        strict=True,
-    )
-    config.core.source = args['source']
+    config.check()
+    config.core.source = source
+    extensions_loader.validate_extensions(extensions)
+    return config, extensions
 
+
+def load_config_or_exit(path, source):
+    """Load a configuration file or exit with the dependency error."""
     try:
 
-        extensions_loader.validate_extensions(extensions)
+        return load_config(path, source)
 
     except (
             extensions_loader.MissingDependency,
@@ -126,20 +569,124 @@ def main(argv=sys.argv[1:]):
         sys.stderr.write('{0}{1}'.format(str(exc), os.linesep))
         sys.exit(1)
 
-    specfile = generate_spec(config, extensions)
 
+def human_size(size):
+    """Get a readable representation of a size in bytes."""
+    for unit in ('B', 'KiB', 'MiB'):
+
+        if size < 1024:
+
+            return '{0:.1f} {1}'.format(size, unit)
+
+        size = size / 1024
+
+    return '{0:.1f} GiB'.format(size)
+
+
+def build_interpreter(config, extensions):
+    """Get a description of the interpreters which a build depends on."""
+    description = sys.version
+    if 'python_venv' in (ext.name for ext in extensions):
+
+        # Imported here rather than at the top of the module because
+        # importing an extension registers its configuration namespace.
+        from .extensions.python import venv
+
+        description = '{0}\n{1}'.format(description, venv.interpreter(config))
+
+    return description
+
+
+def build_host_paths(config, extensions):
+    """Get the absolute paths of this host which appear in the SPEC."""
+    paths = {}
+    if 'python_venv' in (ext.name for ext in extensions):
+
+        from .extensions.python import venv
+
+        paths['wheelhouse'] = venv.wheelhouse_path(config)
+        if config.python_venv.cache_dir:
+
+            paths['cache_dir'] = os.path.abspath(
+                os.path.expanduser(config.python_venv.cache_dir),
+            )
+
+    return paths
+
+
+def write_profile(profiler, path):
+    """Write the profile of a build if there is a profiler."""
+    if not profiler:
+
+        return
+
+    profiler.write(path)
+    sys.stderr.write('Profile written to {0}.{1}'.format(path, os.linesep))
+
+
+def build_config(path, args, variant=None, staged=None):
+    """Build an RPM from a single configuration file and exit."""
+    source = args['source'] or os.path.dirname(path)
+    config, extensions = load_config_or_exit(path, source)
+    config.core.destination = os.path.abspath(args['destination'])
+    if variant:
+
+        try:
+
+            matrix.apply(config, variant)
+
+        except ValueError as exc:
+
+            sys.stderr.write('{0}{1}'.format(str(exc), os.linesep))
+            sys.exit(1)
+
+    if args['build_mode']:
+
+        config.core.build_mode = args['build_mode']
+
+    recorder = timing.Recorder() if args['timings'] else None
+    profiler = profiling.Profiler() if args['profile'] else None
+    specfile = generate_spec(config, extensions, recorder, profiler)
     if args['spec']:
 
-        sys.stdout.write('{0}{1}'.format(specfile, os.linesep))
+        with profile_section(profiler, 'render'):
+
+            specfile.write(sys.stdout)
+
+        sys.stdout.write(os.linesep)
+        write_profile(profiler, args['profile'])
         sys.exit(0)
 
+    store = None
+    if args['artifact_cache']:
+
+        store = artifacts.Store(
+            args['artifact_cache'],
+            args['artifact_cache_size'] * 1024 * 1024,
+        )
+
+    started = time.time()
     try:
 
-        rpm_path = generate_rpm(
-            args['source'],
+        rpm_paths = generate_rpm(
+            source,
             args['destination'],
             specfile,
             args['verbose'],
+            args['stage_mode'],
+            args['stage_jobs'],
+            staged,
+            config.core.source_archive,
+            args['source_files'] == 'git',
+            recorder,
+            store,
+            extensions,
+            build_interpreter(config, extensions),
+            build_workspace(args),
+            config.core.build_mode,
+            config.core.name,
+            build_host_paths(config, extensions),
+            profiler,
         )
 
     except rpmbuild.RpmProcessError as exc:
@@ -163,6 +710,13 @@ def main(argv=sys.argv[1:]):
             exc.stdout,
             os.linesep,
         ))
+        if exc.log:
+
+            sys.stderr.write('The full output is logged at: {0}.{1}'.format(
+                exc.log,
+                os.linesep,
+            ))
+
         sys.exit(1)
 
     except subprocess.CalledProcessError as exc:
@@ -180,10 +734,583 @@ def main(argv=sys.argv[1:]):
         ))
         sys.exit(1)
 
-    sys.stdout.write('RPM generated at {0}{1}.'.format(rpm_path, os.linesep))
+    finally:
+
+        # The SPEC is rendered during the build so the profile is written
+        # once the build is over, whether or not it succeeded.
+        write_profile(profiler, args['profile'])
+
+    for rpm_path in rpm_paths:
+
+        sys.stdout.write('RPM generated at {0}{1}.'.format(
+            rpm_path,
+            os.linesep,
+        ))
+
+    if config.core.build_mode == 'install':
+
+        sys.stdout.write(
+            'Installed into the buildroot at {0} in {1:.1f} seconds. Remove '
+            'it once it has been inspected.{2}'.format(
+                install_buildroot(
+                    args['destination'],
+                    config.core.name or source,
+                ),
+                time.time() - started,
+                os.linesep,
+            )
+        )
+        sys.exit(0)
+
+    sys.stdout.write('Built {0} in {1:.1f} seconds.{2}'.format(
+        human_size(sum(os.path.getsize(path) for path in rpm_paths)),
+        time.time() - started,
+        os.linesep,
+    ))
+    sys.exit(0)
+
+
+class PrefixedStream(object):
+
+    """A text stream wrapper which prefixes every line written to it."""
+
+    def __init__(self, stream, prefix):
+        """Initialize the wrapper with the underlying stream."""
+        self._stream = stream
+        self._prefix = prefix
+        self._buffer = ''
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        """Write all complete lines with the prefix."""
+        with self._lock:
+
+            lines = (self._buffer + text).split('\n')
+            self._buffer = lines.pop()
+            for line in lines:
+
+                self._stream.write('{0}{1}\n'.format(self._prefix, line))
+
+            self._stream.flush()
+
+    def flush(self):
+        """Write any partial line and flush the underlying stream."""
+        with self._lock:
+
+            if self._buffer:
+
+                self._stream.write('{0}{1}\n'.format(
+                    self._prefix,
+                    self._buffer,
+                ))
+                self._buffer = ''
+
+            self._stream.flush()
+
+
+def job_name(job):
+    """Get a short name which identifies a job in the output."""
+    return '{0}{1}'.format(
+        os.path.splitext(os.path.basename(job.config))[0],
+        job.variant.suffix if job.variant else '',
+    )
+
+
+def build_job(job_args):
+    """Run build_config in a worker and return the exit code.
+
+    All output of the build is prefixed with the name of the configuration
+    file so that the interleaved output of concurrent builds can be told
+    apart.
+    """
+    job, args = job_args
+    if args['profile']:
+
+        # Every build gets its own profile beside the requested path.
+        root, ext = os.path.splitext(args['profile'])
+        args = dict(
+            args,
+            profile='{0}.{1}{2}'.format(root, job_name(job), ext or '.json'),
+        )
+
+    prefix = '[{0}] '.format(job_name(job))
+    sys.stdout = PrefixedStream(sys.__stdout__, prefix)
+    sys.stderr = PrefixedStream(sys.__stderr__, prefix)
+    code = 0
+    try:
+
+        build_config(job.config, args, job.variant, job.staged)
+
+    except SystemExit as exc:
+
+        code = exc.code or 0
+
+    except Exception:
+
+        traceback.print_exc()
+        code = 1
+
+    finally:
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+
+    return job, code
+
+
+def read_option(path, namespace, name, default=()):
+    """Read a raw option value from a configuration file.
+
+    This does not register or set any configuration values which makes it
+    safe to use before the workers are forked.
+    """
+    value = confpy.parser.configfile_from_path(
+        path,
+        strict=False,
+    ).items(namespace).get(name, default)
+    if isinstance(value, str):
+
+        value = tuple(item.strip() for item in value.split(','))
+
+    return value
+
+
+def preload_extensions(paths):
+    """Import the extensions enabled by every one of the given configs.
+
+    Workers are forked from this process so anything imported here is
+    shared with every build. Only extensions enabled by all of the configs
+    are imported because importing an extension registers its options and
+    any required options must then be set by every configuration file.
+    """
+    common = None
+    for path in paths:
+
+        try:
+
+            enabled = set(read_option(path, 'extensions', 'enabled'))
+
+        except Exception:
+
+            # Any problem with the file is reported by the build itself.
+            return ()
+
+        common = enabled if common is None else common & enabled
+
+    common = tuple(sorted(common or ()))
+    extensions_loader.load_extensions(whitelist=common)
+    return common
+
+
+def expand_jobs(paths):
+    """Get a job for every variant of every configuration file."""
+    jobs = []
+    option = matrix.VariantOption()
+    for path in paths:
+
+        try:
+
+            variants = read_option(path, 'matrix', 'variants')
+
+        except Exception:
+
+            variants = ()
+
+        if not variants:
+
+            jobs.append(Job(config=path, variant=None, staged=None))
+            continue
+
+        jobs.extend(
+            Job(config=path, variant=option.coerce(variant), staged=None)
+            for variant in variants
+        )
+
+    return tuple(jobs)
+
+
+def stage_shared(jobs, args, root):
+    """Stage each source used by more than one job only once.
+
+    Returns:
+        tuple of Job: The jobs with the path to their shared staged source.
+    """
+    sources = collections.Counter(
+        args['source'] or os.path.dirname(job.config) for job in jobs
+    )
+    staged = {}
+    for source, count in sources.items():
+
+        if count < 2 or args['spec']:
+
+            continue
+
+        staged[source] = stage.stage(
+            source,
+            os.path.join(root, str(len(staged)), os.path.basename(source)),
+            ignore=rpmbuild.IGNORED_PATTERNS,
+            mode=args['stage_mode'],
+            jobs=args['stage_jobs'],
+            selection=stage.Selection.from_source(
+                source,
+                args['source_files'] == 'git',
+            ),
+        )
+
+    return tuple(
+        job._replace(staged=staged.get(
+            args['source'] or os.path.dirname(job.config)
+        ))
+        for job in jobs
+    )
+
+
+def build_configs(jobs, args):
+    """Build an RPM for each job and exit.
+
+    Each build runs in a fresh worker process because configuration values
+    are stored globally once parsed.
+    """
+    # Imported here as it is only needed for multiple builds and it is
+    # slow to import.
+    import multiprocessing
+
+    # Workers only share the preloaded extensions when they are forked. Any
+    # other start method imports everything again in each worker.
+    if multiprocessing.get_start_method() == 'fork':
+
+        preload_extensions(tuple(set(job.config for job in jobs)))
+
+    root = build_workspace(args).mkdtemp()
+    results = []
+    try:
+
+        try:
+
+            jobs = stage_shared(jobs, args, root)
+
+        except subprocess.CalledProcessError as exc:
+
+            sys.stderr.write('Could not stage the source: {0}.{1}'.format(
+                str(exc),
+                os.linesep,
+            ))
+            sys.exit(1)
+
+        pool = multiprocessing.Pool(
+            processes=max(1, args['jobs']),
+            maxtasksperchild=1,
+        )
+        try:
+
+            for job, code in pool.imap_unordered(
+                    build_job,
+                    ((job, args) for job in jobs),
+            ):
+
+                results.append((job, code))
+
+        finally:
+
+            pool.close()
+            pool.join()
+
+    finally:
+
+        shutil.rmtree(root, ignore_errors=True)
+
+    failed = tuple(job for job, code in results if code != 0)
+    sys.stdout.write('{0} of {1} builds succeeded.{2}'.format(
+        len(results) - len(failed),
+        len(jobs),
+        os.linesep,
+    ))
+    for job in failed:
+
+        sys.stdout.write('Failed: {0} ({1}){2}'.format(
+            job_name(job),
+            job.config,
+            os.linesep,
+        ))
+
+    sys.exit(1 if failed else 0)
+
+
+def main(argv=sys.argv[1:]):
+    """Build an RPM."""
+    # A configuration file may share the name of a command so existing paths
+    # are always built.
+    if argv and argv[0] in COMMANDS and not os.path.exists(argv[0]):
+
+        return COMMANDS[argv[0]](argv[1:])
+
+    args = parse_args(argv)
+    if not args['config']:
+
+        sys.stderr.write('No configuration files found.{0}'.format(
+            os.linesep,
+        ))
+        sys.exit(1)
+
+    if args['clean_workspace']:
+
+        sys.stdout.write('Removed {0} reused build directories.{1}'.format(
+            build_workspace(args).clean(),
+            os.linesep,
+        ))
+
+    try:
+
+        jobs = expand_jobs(args['config'])
+
+    except (TypeError, ValueError) as exc:
+
+        sys.stderr.write('{0}{1}'.format(str(exc), os.linesep))
+        sys.exit(1)
+
+    if len(jobs) == 1:
+
+        build_config(jobs[0].config, args, jobs[0].variant)
+
+    build_configs(jobs, args)
+
+
+def build_wheelhouse(argv):
+    """Build every requirement of a configuration into a wheelhouse."""
+    parser = argparse.ArgumentParser(
+        prog='rpmvenv wheelhouse',
+        description=(
+            'Build every requirement into a local directory of wheels so '
+            'that RPM builds can install without network access.'
+        ),
+    )
+    parser.add_argument(
+        'config',
+        help='The path to a configuration file.',
+    )
+    parser.add_argument(
+        '--source',
+        help='Path to package source. Default is config parent directory.',
+        default=None,
+    )
+    parser.add_argument(
+        '--wheelhouse',
+        help=(
+            'The directory in which to place the wheels. Default is the '
+            'python_venv wheelhouse option.'
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        '--update-lock',
+        help=(
+            'Add the hashes of the built wheels to the lock file. Without '
+            'it the lock file is never modified.'
+        ),
+        action='store_true',
+    )
+    args, _ = parser.parse_known_args(argv)
+    args = vars(args)
+    args['config'] = os.path.abspath(args['config'])
+    args['source'] = (
+        os.path.abspath(args['source'])
+        if args['source']
+        else os.path.dirname(args['config'])
+    )
+    config, extensions = load_config_or_exit(args['config'], args['source'])
+    if 'python_venv' not in (ext.name for ext in extensions):
+
+        sys.stderr.write('The python_venv extension is not enabled.{0}'.format(
+            os.linesep,
+        ))
+        sys.exit(1)
+
+    # Imported here rather than at the top of the module because importing
+    # an extension registers its configuration namespace.
+    from .extensions.python import venv
+
+    path = (
+        os.path.abspath(args['wheelhouse'])
+        if args['wheelhouse']
+        else venv.wheelhouse_path(config)
+    )
+    if not path:
+
+        sys.stderr.write(
+            'No wheelhouse configured. Set python_venv.wheelhouse or pass '
+            '--wheelhouse.{0}'.format(os.linesep)
+        )
+        sys.exit(1)
+
+    lock_file = venv.lock_path(config)
+    if lock_file and not os.path.isfile(lock_file):
+
+        sys.stderr.write(
+            'The lock file {0} does not exist. Generate it with the rpmvenv '
+            'lock command first.{1}'.format(lock_file, os.linesep)
+        )
+        sys.exit(1)
+
+    try:
+
+        wheelhouse.build(
+            path=path,
+            source=args['source'],
+            requirements=tuple(config.python_venv.requirements),
+            python=config.python_venv.python,
+            pip_flags=tuple(config.python_venv.pip_flags),
+            lock_file=lock_file,
+            update_lock=args['update_lock'],
+        )
+
+    except subprocess.CalledProcessError as exc:
+
+        sys.stderr.write(
+            'There was an error building the wheelhouse.{0}'.format(
+                os.linesep,
+            )
+        )
+        sys.stderr.write('The exit code was: {0}.{1}'.format(
+            exc.returncode,
+            os.linesep,
+        ))
+        sys.stderr.write('The pip command was: {0}.{1}'.format(
+            exc.cmd,
+            os.linesep,
+        ))
+        sys.exit(1)
+
+    sys.stdout.write('Wheelhouse generated at {0}.{1}'.format(
+        path,
+        os.linesep,
+    ))
+    missing = (
+        lock.missing_hashes(lock_file, path)
+        if lock_file and not args['update_lock']
+        else ()
+    )
+    if missing:
+
+        sys.stderr.write(
+            'The lock file {0} has no hash for the wheels built for: {1}. '
+            'Installing them will fail the hash check. Pass --update-lock '
+            'to add their hashes.{2}'.format(
+                lock_file,
+                ', '.join(missing),
+                os.linesep,
+            )
+        )
+
     sys.exit(0)
 
 
+def build_lock(argv):
+    """Resolve the requirements of a configuration into a lock file."""
+    parser = argparse.ArgumentParser(
+        prog='rpmvenv lock',
+        description=(
+            'Resolve every requirements file once into a lock file which '
+            'pins each requirement with hashes so that RPM builds install '
+            'without dependency resolution.'
+        ),
+    )
+    parser.add_argument(
+        'config',
+        help='The path to a configuration file.',
+    )
+    parser.add_argument(
+        '--source',
+        help='Path to package source. Default is config parent directory.',
+        default=None,
+    )
+    parser.add_argument(
+        '--output',
+        help=(
+            'The path at which to write the lock file. Default is the '
+            'python_venv lock option.'
+        ),
+        default=None,
+    )
+    args, _ = parser.parse_known_args(argv)
+    args = vars(args)
+    args['config'] = os.path.abspath(args['config'])
+    args['source'] = (
+        os.path.abspath(args['source'])
+        if args['source']
+        else os.path.dirname(args['config'])
+    )
+    config, extensions = load_config_or_exit(args['config'], args['source'])
+    if 'python_venv' not in (ext.name for ext in extensions):
+
+        sys.stderr.write('The python_venv extension is not enabled.{0}'.format(
+            os.linesep,
+        ))
+        sys.exit(1)
+
+    # Imported here rather than at the top of the module because importing
+    # an extension registers its configuration namespace.
+    from .extensions.python import venv
+
+    path = (
+        os.path.abspath(args['output'])
+        if args['output']
+        else venv.lock_path(config)
+    )
+    if not path:
+
+        sys.stderr.write(
+            'No lock file configured. Set python_venv.lock or pass '
+            '--output.{0}'.format(os.linesep)
+        )
+        sys.exit(1)
+
+    try:
+
+        lock.generate(
+            path=path,
+            source=args['source'],
+            requirements=tuple(config.python_venv.requirements),
+            python=config.python_venv.python,
+            pip_flags=tuple(config.python_venv.pip_flags),
+        )
+
+    except subprocess.CalledProcessError as exc:
+
+        sys.stderr.write(
+            'There was an error resolving the requirements.{0}'.format(
+                os.linesep,
+            )
+        )
+        sys.stderr.write('The exit code was: {0}.{1}'.format(
+            exc.returncode,
+            os.linesep,
+        ))
+        sys.stderr.write('The pip command was: {0}.{1}'.format(
+            exc.cmd,
+            os.linesep,
+        ))
+        sys.exit(1)
+
+    except ValueError as exc:
+
+        sys.stderr.write('{0}{1}'.format(str(exc), os.linesep))
+        sys.exit(1)
+
+    sys.stdout.write('Lock file generated at {0}.{1}'.format(
+        path,
+        os.linesep,
+    ))
+    sys.exit(0)
+
+
+COMMANDS = {
+    'lock': build_lock,
+    'wheelhouse': build_wheelhouse,
+}
+
+
 if __name__ == '__main__':
 
     main()
@@ -0,0 +1,187 @@
+"""Single pass loading of configuration files.
+
+The configuration file is read and parsed once. Values are only coerced and
+validated for a namespace when it is first accessed, which is usually from
+the generate method of the extension that owns it. Values are applied in the
+same order as confpy: the file, then environment variables, then CLI flags.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+import sys
+
+import confpy.api
+import confpy.exc
+import confpy.parser
+
+
+class LazyConfiguration(object):
+
+    """A configuration which applies each namespace on first access."""
+
+    def __init__(self, path, env_prefix='RPMVENV', env=None, arguments=None):
+        """Read and parse a configuration file.
+
+        Args:
+            path (str): The path to the configuration file.
+            env_prefix (str): The prefix of environment variable options.
+            env (dict): The environment. The default is os.environ.
+            arguments (iter of str): The CLI arguments which may contain
+                options. The default is sys.argv.
+
+        Raises:
+            UnrecognizedFileExtension: If there is no loader for the path.
+        """
+        self._document = confpy.parser.configfile_from_path(path, strict=True)
+        self._namespaces = frozenset(self._document.namespaces)
+        self._env_prefix = env_prefix.upper()
+        self._env = os.environ if env is None else env
+        self._arguments = (
+            sys.argv[1:] if arguments is None else tuple(arguments)
+        )
+        self._applied = set()
+
+    def _cli_values(self, name, namespace):
+        """Get the CLI flag values for the options of a namespace."""
+        parser = argparse.ArgumentParser(add_help=False)
+        for option_name, _ in namespace:
+
+            parser.add_argument('--{0}_{1}'.format(
+                name.lower(),
+                option_name.lower(),
+            ))
+
+        values, _ = parser.parse_known_args(self._arguments)
+        return vars(values)
+
+    def apply(self, name):
+        """Set the values of a namespace from every source and validate it.
+
+        Raises:
+            AttributeError: If the namespace is not registered.
+            OptionNotRegistered: If the file sets an option which does not
+                exist in the namespace.
+            MissingRequiredOption: If a required option is not set.
+        """
+        namespace = confpy.api.Configuration().get(name)
+        if namespace is None:
+
+            raise AttributeError('Namespace {0} does not exist.'.format(name))
+
+        if name in self._applied:
+
+            return namespace
+
+        # Mark the namespace first so that a failure is not retried with a
+        # partially applied namespace.
+        self._applied.add(name)
+        if name in self._namespaces:
+
+            for option_name, value in self._document.items(name).items():
+
+                if not hasattr(namespace, option_name):
+
+                    raise confpy.exc.OptionNotRegistered(
+                        'The option {0} is not registered.'.format(
+                            option_name,
+                        )
+                    )
+
+                setattr(namespace, option_name, value)
+
+        for option_name, _ in namespace:
+
+            value = self._env.get('{0}_{1}_{2}'.format(
+                self._env_prefix,
+                name.upper(),
+                option_name.upper(),
+            ))
+            if value:
+
+                setattr(namespace, option_name, value)
+
+        cli_values = self._cli_values(name, namespace)
+        for option_name, _ in namespace:
+
+            value = cli_values.get('{0}_{1}'.format(
+                name.lower(),
+                option_name.lower(),
+            ))
+            if value:
+
+                setattr(namespace, option_name, value)
+
+        for option_name, option in namespace:
+
+            if option.required and option.value is None:
+
+                raise confpy.exc.MissingRequiredOption(
+                    'Option {0} in namespace {1} is required.'.format(
+                        option_name,
+                        name,
+                    )
+                )
+
+        return namespace
+
+    def check(self):
+        """Check that the file only uses registered namespaces and options.
+
+        Values are not coerced by this check.
+
+        Raises:
+            NamespaceNotRegistered: If the file contains a namespace which is
+                not registered.
+            OptionNotRegistered: If the file contains an option which is not
+                registered in its namespace.
+        """
+        registered = confpy.api.Configuration()
+        for name in self._namespaces:
+
+            namespace = registered.get(name)
+            if namespace is None:
+
+                raise confpy.exc.NamespaceNotRegistered(
+                    'The namespace {0} is not registered.'.format(name)
+                )
+
+            for option_name in self._document.items(name):
+
+                if not hasattr(namespace, option_name):
+
+                    raise confpy.exc.OptionNotRegistered(
+                        'The option {0} is not registered.'.format(
+                            option_name,
+                        )
+                    )
+
+        return self
+
+    def get(self, name, default=None):
+        """Get a namespace by name or the default if it is not registered."""
+        try:
+
+            return self.apply(name)
+
+        except AttributeError:
+
+            return default
+
+    def __getattr__(self, name):
+        """Get a namespace by name."""
+        if name.startswith('_'):
+
+            raise AttributeError(name)
+
+        return self.apply(name)
+
+    def __iter__(self):
+        """Iterate over every registered namespace, applying each one."""
+        for name, _ in confpy.api.Configuration():
+
+            yield name, self.apply(name)
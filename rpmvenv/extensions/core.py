@@ -5,14 +5,48 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+
 from confpy.api import Configuration
+from confpy.api import IntegerOption
 from confpy.api import Namespace
+from confpy.api import PatternOption
 from confpy.api import StringOption
 from confpy.api import ListOption
 
 from . import interface
 
 
+# The rpm io name and default level of each payload compression algorithm.
+PAYLOADS = {
+    'gzip': ('gzdio', 9),
+    'bzip2': ('bzdio', 9),
+    'xz': ('xzdio', 6),
+    'lzma': ('lzdio', 6),
+    'zstd': ('zstdio', 19),
+}
+
+# The payload algorithms for which rpm supports compressing with threads.
+THREADED_PAYLOADS = ('xz', 'zstd')
+
+
+def payload(compression, level=None, threads=None):
+    """Get the rpm payload macro value for compression settings.
+
+    For example, zstd at level 19 with threads set to 0 is 'w19T0.zstdio'.
+    A threads value of 0 uses every available CPU. Threads are ignored for
+    algorithms that rpm does not compress in parallel.
+    """
+    io_name, default_level = PAYLOADS[compression]
+    level = default_level if level is None else level
+    thread_flag = ''
+    if threads is not None and compression in THREADED_PAYLOADS:
+
+        thread_flag = 'T{0}'.format(threads)
+
+    return 'w{0}{1}.{2}'.format(level, thread_flag, io_name)
+
+
 cfg = Configuration(
     core=Namespace(
         description='Common core RPM metadata fields.',
@@ -51,6 +85,51 @@ cfg = Configuration(
             description='The path to the package source.',
             required=False,
         ),
+        destination=StringOption(
+            description='The directory in which built RPMs are placed.',
+            required=False,
+        ),
+        source_archive=PatternOption(
+            description=(
+                'Ship the source as a tarball compressed with gz, bz2, xz, '
+                'or zst rather than as a directory.'
+            ),
+            pattern='^(gz|bz2|xz|zst)$',
+            required=False,
+        ),
+        payload_compression=PatternOption(
+            description=(
+                'The algorithm used to compress the RPM payloads: gzip, '
+                'bzip2, xz, lzma, or zstd. Default is the rpm default.'
+            ),
+            pattern='^(gzip|bzip2|xz|lzma|zstd)$',
+            required=False,
+        ),
+        payload_level=IntegerOption(
+            description=(
+                'The payload compression level. Default depends on the '
+                'algorithm.'
+            ),
+            required=False,
+        ),
+        payload_threads=IntegerOption(
+            description=(
+                'The number of threads used to compress xz and zstd '
+                'payloads. Use 0 for one per CPU.'
+            ),
+            required=False,
+        ),
+        build_mode=PatternOption(
+            description=(
+                'Which rpmbuild stages to run: all builds the RPM and the '
+                'source RPM but keeps only the RPM, binary only the RPM, '
+                'source only the source RPM, and install only runs the '
+                'SPEC through %install into <name>-buildroot in the '
+                'destination. Default is all.'
+            ),
+            pattern='^(all|binary|source|install)$',
+            default='all',
+        ),
         buildroot=StringOption(
             description='The name of the buildroot directory to use.',
             default=(
@@ -110,8 +189,10 @@ class Extension(interface.Extension):
         license = config.core.license
         url = config.core.url
         source = config.core.source
+        source_archive = config.core.source_archive
         buildroot = config.core.buildroot
         buildarch = config.core.buildarch
+        payload_compression = config.core.payload_compression
         requires = tuple(config.core.requires)
         conflicts = tuple(config.core.conflicts)
         obsoletes = tuple(config.core.obsoletes)
@@ -154,10 +235,35 @@ class Extension(interface.Extension):
 
             spec.tags['Url'] = url
 
-        if source:
+        # Extensions refer to the unpacked source through this macro so that
+        # it resolves whether the source is a directory or a tarball.
+        spec.macros['rpmvenv_source'] = '%{SOURCE0}'
+        if source and source_archive:
+
+            source_name = os.path.basename(source)
+            spec.macros['rpmvenv_source'] = '%{{_builddir}}/{0}'.format(
+                source_name,
+            )
+            spec.tags['Source0'] = '{0}.tar.{1}'.format(
+                source_name,
+                source_archive,
+            )
+            spec.blocks.prep.append('%setup -q -n {0}'.format(source_name))
+
+        elif source:
 
             spec.tags['Source0'] = source
 
+        if payload_compression:
+
+            value = payload(
+                payload_compression,
+                config.core.payload_level,
+                config.core.payload_threads,
+            )
+            spec.globals['_binary_payload'] = value
+            spec.globals['_source_payload'] = value
+
         spec.blocks.prep.append('rm -rf %{buildroot}/*')
         spec.blocks.clean.append('rm -rf %{buildroot}')
 
@@ -5,6 +5,10 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import glob
+import os
+import posixpath
+
 from confpy.api import Configuration
 from confpy.api import ListOption
 from confpy.api import Namespace
@@ -13,12 +17,16 @@ from .option import FileOption
 from .. import interface
 
 
+# The end of the manifest here-document in the install block.
+MANIFEST_END = 'RPMVENV_FILE_EXTRAS'
+
+
 cfg = Configuration(
     file_extras=Namespace(
         description='Package files not in the Python package.',
         files=ListOption(
             description='Extra files to include. Paths are relative to'
-                        'buildroot.',
+                        'buildroot. A src may be a glob pattern.',
             option=FileOption(),
             default=(),
         ),
@@ -26,13 +34,111 @@ cfg = Configuration(
 )
 
 
+def _escape(path):
+    """Escape a real file name for use in the SPEC."""
+    return path.replace('%', '%%')
+
+
+def expand(source, file_):
+    """Get the files which a file_extras entry refers to.
+
+    A src which contains glob characters is matched against the source
+    directory, with '**' matching any number of directories. Every match
+    becomes an entry with the same directives whose dest is the part of the
+    match after the fixed directories of the pattern joined to the dest.
+    Matches inside a matched directory are left to the copy of the directory.
+    A pattern which matches nothing produces no entries.
+
+    Returns:
+        tuple of RpmFile: The entries with a literal src.
+    """
+    if not any(character in file_.src for character in '*?['):
+
+        return (file_,)
+
+    parts = file_.src.split('/')
+    fixed = []
+    for part in parts:
+
+        if any(character in part for character in '*?['):
+
+            break
+
+        fixed.append(part)
+
+    prefix = '/'.join(fixed)
+    matches = sorted(
+        os.path.relpath(match, source)
+        for match in glob.glob(
+            os.path.join(glob.escape(source), file_.src),
+            recursive=True,
+        )
+    )
+    matched = frozenset(matches)
+    entries = []
+    for match in matches:
+
+        parent = posixpath.dirname(match)
+        while parent and parent not in matched:
+
+            parent = posixpath.dirname(parent)
+
+        if parent:
+
+            continue
+
+        entries.append(file_._replace(
+            src=_escape(match),
+            # Only the matched part is a real file name. The dest may use
+            # macros which must still expand.
+            dest=posixpath.normpath(posixpath.join(
+                file_.dest,
+                _escape(posixpath.relpath(match, prefix or '.')),
+            )),
+        ))
+
+    return tuple(entries)
+
+
+def directive(file_):
+    """Get the %files line of a file_extras entry."""
+    file_directive = ""
+    if file_.file_attr is not None:
+        # file with attributes modifiers (permissions, user, group)
+        file_directive = '%attr({0}, {1}, {2}) '.format(
+                file_.file_attr['permissions'],
+                file_.file_attr['user'],
+                file_.file_attr['group'],
+            )
+
+    if file_.file_type is not None:
+        if file_.file_type_option is not None:
+            # file with a modifier (e.g. config) including an option
+            # (e.g. noreplace)
+            file_directive += '%{1}({2}) /{0}'.format(
+                file_.dest,
+                file_.file_type,
+                file_.file_type_option
+            )
+        else:
+            # file with a modifier (e.g. doc) but no additional option
+            file_directive += '%{1} /{0}'.format(
+                file_.dest,
+                file_.file_type)
+    else:
+        # simple file without an extra modifiers
+        file_directive += '/{0}'.format(file_.dest)
+
+    return file_directive
+
+
 class Extension(interface.Extension):
 
     """Extension which adds packaging of extra files."""
 
     name = 'file_extras'
     description = 'Package files not in the buildroot.'
-    version = '1.1.0'
+    version = '1.2.0'
     requirements = {
         'file_permissions': ('>=1.0.0', '<2.0.0'),
     }
@@ -40,44 +146,26 @@ class Extension(interface.Extension):
     @staticmethod
     def generate(config, spec):
         """Produce file block segments for packaging files."""
+        source = config.core.source or os.getcwd()
+        manifest = []
         for file_ in config.file_extras.files:
 
-            file_directive = ""
-            if file_.file_attr is not None:
-                # file with attributes modifiers (permissions, user, group)
-                file_directive = '%attr({0}, {1}, {2}) '.format(
-                        file_.file_attr['permissions'],
-                        file_.file_attr['user'],
-                        file_.file_attr['group'],
-                    )
-
-            if file_.file_type is not None:
-                if file_.file_type_option is not None:
-                    # file with a modifier (e.g. config) including an option
-                    # (e.g. noreplace)
-                    file_directive += '%{1}({2}) /{0}'.format(
-                        file_.dest,
-                        file_.file_type,
-                        file_.file_type_option
-                    )
-                else:
-                    # file with a modifier (e.g. doc) but no additional option
-                    file_directive += '%{1} /{0}'.format(
-                        file_.dest,
-                        file_.file_type)
-            else:
-                # simple file without an extra modifiers
-                file_directive += '/{0}'.format(file_.dest)
+            for entry in expand(source, file_):
+
+                manifest.append('{0}\t{1}'.format(entry.src, entry.dest))
+                spec.blocks.files.append(directive(entry))
+
+        if manifest:
 
             spec.blocks.install.append(
-                'mkdir -p "%{{buildroot}}/%(dirname {0})"'.format(file_.dest)
+                '# Copy every extra file in one pass from this manifest of '
+                'sources and destinations.'
             )
             spec.blocks.install.append(
-                'cp -R %{{SOURCE0}}/{0} %{{buildroot}}/{1}'.format(
-                    file_.src,
-                    file_.dest,
-                )
+                'rpmvenv-helper copy --source=%{{rpmvenv_source}} '
+                '--destination=%{{buildroot}} <<\'{0}\''.format(MANIFEST_END)
             )
-            spec.blocks.files.append(file_directive)
+            spec.blocks.install.extend(manifest)
+            spec.blocks.install.append(MANIFEST_END)
 
         return spec
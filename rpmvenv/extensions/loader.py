@@ -5,8 +5,18 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import pkg_resources
-import semver
+import hashlib
+import importlib
+import os
+import sys
+
+from .. import cache
+
+
+GROUP = 'rpmvenv.extensions'
+
+# The name of the cached document which indexes the installed entry points.
+INDEX = 'entry_points'
 
 
 class MissingDependency(Exception):
@@ -19,20 +29,132 @@ class InvalidDependency(Exception):
     """Found dependency but with the wrong version."""
 
 
+def fingerprint():
+    """Get a value which changes whenever installed packages may change.
+
+    Installing or removing a distribution changes the modification time of
+    the directory on sys.path which holds its metadata.
+    """
+    digest = hashlib.sha256()
+    digest.update(sys.executable.encode('utf8'))
+    digest.update(sys.version.encode('utf8'))
+    for entry in sys.path:
+
+        try:
+
+            mtime = os.stat(entry or os.curdir).st_mtime_ns
+
+        except OSError:
+
+            mtime = None
+
+        digest.update('{0}\0{1}\0'.format(entry, mtime).encode('utf8'))
+
+    return digest.hexdigest()
+
+
+def discover(group):
+    """Get a mapping of entry point name to value by scanning sys.path."""
+    try:
+
+        from importlib import metadata
+
+    except ImportError:
+
+        # Python 3.7 has no importlib.metadata.
+        import pkg_resources
+
+        return dict(
+            (ep.name, '{0}:{1}'.format(ep.module_name, '.'.join(ep.attrs)))
+            for ep in reversed(tuple(pkg_resources.iter_entry_points(group)))
+        )
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+
+        entry_points = entry_points.select(group=group)
+
+    else:
+
+        entry_points = entry_points.get(group, ())
+
+    found = {}
+    for entry_point in entry_points:
+
+        # The first distribution on sys.path wins, as with imports.
+        found.setdefault(entry_point.name, entry_point.value)
+
+    return found
+
+
+def entry_points(group=GROUP, refresh=False):
+    """Get a mapping of entry point name to value for a group.
+
+    The mapping is read from a persisted index when the fingerprint of the
+    environment matches the one it was built with. Otherwise the installed
+    distributions are scanned and the index is rebuilt.
+    """
+    current = fingerprint()
+    index = None if refresh else cache.read(INDEX)
+    if (
+            isinstance(index, dict) and
+            index.get('fingerprint') == current and
+            group in index.get('groups', {})
+    ):
+
+        return index['groups'][group]
+
+    found = discover(group)
+    cache.write(INDEX, {'fingerprint': current, 'groups': {group: found}})
+    return found
+
+
+def load_entry_point(value):
+    """Import the object named by an entry point value."""
+    module, _, attrs = value.partition(':')
+    target = importlib.import_module(module.strip())
+    for attr in attrs.split('[', 1)[0].strip().split('.'):
+
+        if attr:
+
+            target = getattr(target, attr)
+
+    return target
+
+
 def load_extensions(whitelist=()):
-    """Get an iterable of extensions in order."""
+    """Get an iterable of extensions in order.
+
+    Only the modules of whitelisted extensions are imported.
+    """
     whitelist = ('core',) + tuple(whitelist)
-    extensions = pkg_resources.iter_entry_points('rpmvenv.extensions')
-    extensions = (
-        extension for extension in extensions if extension.name in whitelist
-    )
-    extensions = tuple(set(extensions))
-    extensions = sorted(extensions, key=lambda ext: whitelist.index(ext.name))
-    return tuple(extension.load() for extension in extensions)
+    names = []
+    for name in whitelist:
+
+        if name not in names:
+
+            names.append(name)
+
+    try:
+
+        index = entry_points()
+        return tuple(
+            load_entry_point(index[name]) for name in names if name in index
+        )
+
+    except (ImportError, AttributeError):
+
+        # The index may predate a change the fingerprint did not catch.
+        index = entry_points(refresh=True)
+        return tuple(
+            load_entry_point(index[name]) for name in names if name in index
+        )
 
 
 def validate_extensions(extensions):
     """Process the extension dependencies."""
+    import semver
+
     ext_map = dict(
         (ext.name, ext) for ext in extensions
     )
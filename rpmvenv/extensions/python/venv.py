@@ -5,9 +5,17 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import glob
+import hashlib
+import os
+import re
+import shutil
+
 from confpy.api import Configuration
+from confpy.api import IntegerOption
 from confpy.api import ListOption
 from confpy.api import Namespace
+from confpy.api import PatternOption
 from confpy.api import StringOption
 from confpy.api import BoolOption
 
@@ -26,6 +34,13 @@ cfg = Configuration(
             option=StringOption(),
             default=('--always-copy',),
         ),
+        installer=PatternOption(
+            description='The tool used to create the venv and install into '
+                        'it: pip or uv. Falls back to pip when uv is not '
+                        'found.',
+            pattern='^(pip|uv)$',
+            default='pip',
+        ),
         name=StringOption(
             description='The name of the installed venv.',
             required=True,
@@ -49,6 +64,15 @@ cfg = Configuration(
             option=StringOption(),
             default=('requirements.txt',)
         ),
+        lock=StringOption(
+            description='A lock file, relative to the source, which pins '
+                        'every requirement with hashes. It is installed '
+                        'in place of the requirements files without '
+                        'dependency resolution. The project is then '
+                        'always installed with pip. Generate it with the '
+                        'rpmvenv lock command.',
+            required=False,
+        ),
         pip_flags=ListOption(
             description='Flags to pass to pip during pip install calls.',
             option=StringOption(),
@@ -72,10 +96,292 @@ cfg = Configuration(
             required=False,
             default=False,
         ),
+        precompile=BoolOption(
+            description='Whether to compile bytecode for the installed '
+                        'paths during the build.',
+            required=False,
+            default=False,
+        ),
+        precompile_optimize=ListOption(
+            description='The optimization levels for which to compile '
+                        'bytecode.',
+            option=IntegerOption(),
+            default=(0,),
+        ),
+        dedup=BoolOption(
+            description='Whether to replace identical files in the venv '
+                        'with hardlinks.',
+            required=False,
+            default=False,
+        ),
+        postprocess=BoolOption(
+            description='Whether to remove RECORD files and __pycache__ '
+                        'directories, relocate, and strip the venv in a '
+                        'single pass over its files.',
+            required=False,
+            default=False,
+        ),
+        split_deps=BoolOption(
+            description='Whether to package the requirements in a separate '
+                        '<name>-deps RPM which is versioned by their hash.',
+            required=False,
+            default=False,
+        ),
+        cache_dir=StringOption(
+            description='A directory in which to cache built virtualenvs '
+                        'between builds. Caching is disabled when unset.',
+            required=False,
+        ),
+        wheelhouse=StringOption(
+            description='A directory of wheels, relative to the source, '
+                        'from which to install without using an index. '
+                        'Build it with the rpmvenv wheelhouse command.',
+            required=False,
+        ),
     ),
 )
 
 
+def wheelhouse_path(config):
+    """Get the absolute path to the configured wheelhouse, if any."""
+    if not config.python_venv.wheelhouse:
+
+        return None
+
+    return os.path.abspath(os.path.join(
+        config.core.source or os.getcwd(),
+        os.path.expanduser(config.python_venv.wheelhouse),
+    ))
+
+
+def lock_path(config):
+    """Get the absolute path to the configured lock file, if any."""
+    if not config.python_venv.lock:
+
+        return None
+
+    return os.path.abspath(os.path.join(
+        config.core.source or os.getcwd(),
+        os.path.expanduser(config.python_venv.lock),
+    ))
+
+
+def cache_path(config, name):
+    """Get the absolute path to a named directory in the cache_dir."""
+    return os.path.join(
+        os.path.abspath(os.path.expanduser(config.python_venv.cache_dir)),
+        name,
+    )
+
+
+def requirement_files(config):
+    """Get the requirements files which are installed, in order."""
+    if config.python_venv.lock:
+
+        return (config.python_venv.lock,)
+
+    return tuple(config.python_venv.requirements)
+
+
+def install_requirement(config, requirement):
+    """Get the install line for one of the requirement_files."""
+    if config.python_venv.lock:
+
+        # Every dependency is pinned in the lock so nothing is resolved.
+        return '%{{venv_pip}} --no-deps --require-hashes -r {0}'.format(
+            requirement,
+        )
+
+    return '%{{venv_pip}} -r {0}'.format(requirement)
+
+
+def installer(config):
+    """Get the installer to use, which is pip if uv is not available."""
+    if config.python_venv.installer == 'uv' and shutil.which('uv'):
+
+        return 'uv'
+
+    return 'pip'
+
+
+def constraint_files(config):
+    """Get the constraints files named in the pip flags."""
+    flags = ' '.join(config.python_venv.pip_flags).split()
+    paths = []
+    for position, flag in enumerate(flags):
+
+        if flag in ('-c', '--constraint') and position + 1 < len(flags):
+
+            paths.append(flags[position + 1])
+
+        elif flag.startswith('--constraint='):
+
+            paths.append(flag[len('--constraint='):])
+
+    return tuple(paths)
+
+
+def pip_inputs(config, digest):
+    """Hash the files, outside of the options, which decide what pip installs.
+
+    These are the name and size of each wheel in the wheelhouse and the
+    content of each constraints file named in the pip flags, which pip
+    reads relative to the source.
+    """
+    wheelhouse = wheelhouse_path(config)
+    if wheelhouse and os.path.isdir(wheelhouse):
+
+        for name in sorted(os.listdir(wheelhouse)):
+
+            digest.update('{0}:{1}\0'.format(
+                name,
+                os.path.getsize(os.path.join(wheelhouse, name)),
+            ).encode('utf8'))
+
+    source = config.core.source or os.getcwd()
+    for constraint in constraint_files(config):
+
+        digest.update(constraint.encode('utf8'))
+        digest.update(b'\0')
+        path = os.path.join(source, os.path.expanduser(constraint))
+        if os.path.isfile(path):
+
+            with open(path, 'rb') as constraint_file:
+
+                digest.update(constraint_file.read())
+
+        digest.update(b'\0')
+
+
+def deps_version(config):
+    """Get the version of the deps package.
+
+    The version is a hash of everything which decides what the requirements
+    install and how the installed files look: the venv command, installed
+    location, and resolved interpreter, the pip flags, the post-processing
+    options, the pip_inputs, and the name and content of each requirements
+    file.
+    """
+    source = config.core.source or os.getcwd()
+    digest = hashlib.sha256()
+    for part in (
+            installer(config),
+            config.python_venv.cmd,
+            config.python_venv.python or '',
+            interpreter(config),
+            config.python_venv.path,
+            config.python_venv.name,
+            config.python_venv.wheelhouse or '',
+    ) + tuple(config.python_venv.flags) + tuple(config.python_venv.pip_flags):
+
+        digest.update(part.encode('utf8'))
+        digest.update(b'\0')
+
+    for option, value in (
+            ('strip_binaries', config.python_venv.strip_binaries),
+            ('remove_pycache', config.python_venv.remove_pycache),
+            ('postprocess', config.python_venv.postprocess),
+            ('precompile', config.python_venv.precompile),
+            (
+                'precompile_optimize',
+                tuple(config.python_venv.precompile_optimize),
+            ),
+            ('dedup', config.python_venv.dedup),
+    ):
+
+        digest.update('{0}={1!r}\0'.format(option, value).encode('utf8'))
+
+    pip_inputs(config, digest)
+    for requirement in requirement_files(config):
+
+        digest.update(requirement.encode('utf8'))
+        digest.update(b'\0')
+        path = os.path.join(source, requirement)
+        if os.path.isfile(path):
+
+            with open(path, 'rb') as requirement_file:
+
+                digest.update(requirement_file.read())
+
+        digest.update(b'\0')
+
+    return digest.hexdigest()[:16]
+
+
+def deps_built(config, version):
+    """Get whether a deps RPM of the version is already in the destination."""
+    if not config.core.destination:
+
+        return False
+
+    # Macros in the release, such as %{?dist}, are matched by any value.
+    release = re.sub(r'%\{[^}]*\}', '*', config.core.release)
+    return bool(glob.glob(os.path.join(
+        glob.escape(config.core.destination),
+        '{0}-deps-{1}-{2}.*.rpm'.format(
+            glob.escape(config.core.name),
+            version,
+            release,
+        ),
+    )))
+
+
+def interpreter(config):
+    """Get a string which identifies the interpreter used for the venv."""
+    executable = config.python_venv.python or config.python_venv.cmd
+    resolved = shutil.which(executable.split()[0])
+    if not resolved:
+
+        return executable
+
+    resolved = os.path.realpath(resolved)
+    return '{0}:{1}'.format(resolved, os.stat(resolved).st_mtime)
+
+
+def layer_keys(config, spec):
+    """Generate the venv cache key of every install layer.
+
+    The first layer is the empty venv and each requirements file adds another
+    layer on top of it. Every key covers the keys before it so that a change
+    to one requirements file invalidates that layer and all that follow. The
+    base key covers the venv command, the pip command, the interpreter, the
+    venv and pip flags, and the pip_inputs so that a new index, constraint,
+    or wheel rebuilds every layer.
+
+    Returns:
+        tuple of str: One key for the base venv followed by one key for
+            each requirements file.
+    """
+    source = config.core.source or os.getcwd()
+    digest = hashlib.sha256()
+    for part in (
+            spec.macros['venv_cmd'],
+            spec.macros['venv_pip'],
+            interpreter(config),
+    ) + tuple(config.python_venv.flags) + tuple(config.python_venv.pip_flags):
+
+        digest.update(part.encode('utf8'))
+        digest.update(b'\0')
+
+    pip_inputs(config, digest)
+    keys = [digest.hexdigest()]
+    for requirement in requirement_files(config):
+
+        digest.update(requirement.encode('utf8'))
+        digest.update(b'\0')
+        path = os.path.join(source, requirement)
+        if os.path.isfile(path):
+
+            with open(path, 'rb') as requirement_file:
+
+                digest.update(requirement_file.read())
+
+        digest.update(b'\0')
+        keys.append(digest.hexdigest())
+
+    return tuple(keys)
+
+
 class Extension(interface.Extension):
 
     """Extension for packaging a Python virtualenv."""
@@ -88,12 +394,29 @@ class Extension(interface.Extension):
     @staticmethod
     def generate(config, spec):
         """Generate Python virtualenv content."""
-        spec.macros['venv_cmd'] = '{0} {1}'.format(
-            config.python_venv.cmd,
-            ' '.join(
-                config.python_venv.flags if config.python_venv.flags else ()
-            ),
-        )
+        use_uv = installer(config) == 'uv'
+        if not use_uv:
+
+            spec.macros['venv_cmd'] = '{0} {1}'.format(
+                config.python_venv.cmd,
+                ' '.join(
+                    config.python_venv.flags
+                    if config.python_venv.flags else ()
+                ),
+            )
+
+        else:
+
+            # uv always links the interpreter so the virtualenv copy flag
+            # does not apply. The seed packages keep setup.py installs and
+            # pip available in the venv.
+            spec.macros['venv_cmd'] = ' '.join(
+                ('uv', 'venv', '--seed') + tuple(
+                    flag for flag in config.python_venv.flags or ()
+                    if flag != '--always-copy'
+                )
+            )
+
         if config.python_venv.python:
 
             spec.macros['venv_cmd'] = '{0} --python={1}'.format(
@@ -107,15 +430,31 @@ class Extension(interface.Extension):
         spec.macros['venv_dir'] = '%{buildroot}/%{venv_install_dir}'
         spec.macros['venv_bin'] = '%{venv_dir}/bin'
         spec.macros['venv_python'] = '%{venv_bin}/python'
-        spec.macros['venv_pip'] = (
-            '%{{venv_python}} %{{venv_bin}}/pip install {0}'.format(
-                ' '.join(
-                    config.python_venv.pip_flags
-                    if config.python_venv.pip_flags
-                    else ()
-                ),
+        pip_flags = tuple(config.python_venv.pip_flags)
+        if config.python_venv.wheelhouse:
+
+            pip_flags = pip_flags + (
+                '--no-index',
+                '--find-links={0}'.format(wheelhouse_path(config)),
             )
-        )
+
+        if not use_uv:
+
+            spec.macros['venv_pip'] = (
+                '%{{venv_python}} %{{venv_bin}}/pip install {0}'.format(
+                    ' '.join(pip_flags),
+                )
+            )
+
+        else:
+
+            # Files are copied from the uv cache rather than linked because
+            # the relocation rewrites some of them in place.
+            spec.macros['venv_pip'] = (
+                'uv pip install --python=%{{venv_python}} --link-mode=copy '
+                '{0}'.format(' '.join(pip_flags))
+            )
+
         spec.macros['__prelink_undo_cmd'] = "%{nil}"
 
         spec.globals['__os_install_post'] = (
@@ -131,51 +470,160 @@ class Extension(interface.Extension):
             'mkdir -p %{buildroot}/%{venv_install_dir}',
         )
 
-        spec.blocks.files.append('/%{venv_install_dir}')
+        if not config.python_venv.split_deps:
+
+            spec.blocks.files.append('/%{venv_install_dir}')
+
+        else:
+
+            spec.blocks.get('files')
+            spec.blocks.arguments('files').extend((
+                '-f',
+                '%{_builddir}/rpmvenv-app.files',
+            ))
+
+        if not config.python_venv.cache_dir:
+
+            spec.blocks.install.append('%{venv_cmd} %{venv_dir}')
+            for requirement in requirement_files(config):
 
-        spec.blocks.install.append('%{venv_cmd} %{venv_dir}')
-        for requirement in config.python_venv.requirements:
+                spec.blocks.install.extend((
+                    'cd %{rpmvenv_source}',
+                    install_requirement(config, requirement),
+                    'cd -',
+                ))
 
+        else:
+
+            keys = layer_keys(config, spec)
+            spec.macros['venv_cache'] = (
+                'rpmvenv-helper venv-cache --cache-dir={0}'.format(
+                    os.path.abspath(
+                        os.path.expanduser(config.python_venv.cache_dir)
+                    ),
+                )
+            )
             spec.blocks.install.extend((
-                'cd %{SOURCE0}',
-                '%{{venv_pip}} -r {0}'.format(requirement),
-                'cd -',
+                '# Restore the deepest cached venv layer and only run the '
+                'install steps',
+                '# which come after it. A failed restore builds every layer '
+                'again.',
+                'venv_layer=$(%{{venv_cache}} restore '
+                '--destination=%{{venv_dir}} {0}) || venv_layer=-1'.format(
+                    ' '.join(keys),
+                ),
+                'venv_layer=${venv_layer:--1}',
+                'if [ "$venv_layer" -lt 0 ]; then',
+                'rm -rf %{venv_dir}',
+                '%{venv_cmd} %{venv_dir}',
+                '%{{venv_cache}} save --source=%{{venv_dir}} {0}'.format(
+                    keys[0],
+                ),
+                'fi',
+            ))
+            for position, requirement in enumerate(
+                    requirement_files(config),
+                    start=1,
+            ):
+
+                spec.blocks.install.extend((
+                    'if [ "$venv_layer" -lt {0} ]; then'.format(position),
+                    'cd %{rpmvenv_source}',
+                    install_requirement(config, requirement),
+                    'cd -',
+                    '%{{venv_cache}} save --source=%{{venv_dir}} {0}'.format(
+                        keys[position],
+                    ),
+                    'fi',
+                ))
+
+        if config.python_venv.split_deps:
+
+            spec.blocks.install.extend((
+                '# Everything installed so far belongs to the deps package.',
+                'rpmvenv-helper split snapshot '
+                '--output=%{_builddir}/rpmvenv-deps.json %{venv_dir}',
             ))
 
         if config.python_venv.require_setup_py:
-            spec.blocks.install.append('cd %{SOURCE0}')
+            spec.blocks.install.append('cd %{rpmvenv_source}')
 
-            if config.python_venv.use_pip_install:
+            if config.python_venv.lock:
+                # setup.py install cannot skip dependencies so pip is used
+                # whenever the lock has already installed them.
+                spec.blocks.install.append('%{venv_pip} --no-deps .')
+            elif config.python_venv.use_pip_install:
                 spec.blocks.install.append('%{venv_pip} .')
             else:
                 spec.blocks.install.append('%{venv_python} setup.py install')
 
             spec.blocks.install.append('cd -')
 
-        if config.python_venv.remove_pycache:
-            spec.blocks.install.append(
-                r'find %{venv_dir} -type d -name "__pycache__" -print0 | '
-                r'xargs -0 rm -rf'
+        if config.python_venv.postprocess:
+
+            postprocess_cmd = (
+                'rpmvenv-helper postprocess '
+                '--destination=/%{venv_install_dir} '
+                '--buildroot=%{buildroot}'
             )
+            if config.python_venv.remove_pycache:
 
-        spec.blocks.install.extend((
-            '# RECORD files are used by wheels for checksum. They contain path'
-            ' names which',
-            '# match the buildroot and must be removed or the package will '
-            'fail to build.',
-            'find %{buildroot} -name "RECORD" -exec rm -rf {} \\;',
-            '# Change the virtualenv path to the target installation '
-            'direcotry.',
-            'venvctrl-relocate --source=%{venv_dir}'
-            ' --destination=/%{venv_install_dir}',
-        ))
+                postprocess_cmd += ' --remove-pycache'
+
+            if config.python_venv.strip_binaries:
+
+                postprocess_cmd += ' --strip'
+                if config.python_venv.cache_dir:
+
+                    postprocess_cmd += ' --strip-cache-dir={0}'.format(
+                        cache_path(config, 'strip'),
+                    )
 
-        if config.python_venv.strip_binaries:
             spec.blocks.install.extend((
-                '# Strip native modules as they contain buildroot paths in'
-                'their debug information',
-                'find %{venv_dir}/lib -type f -name "*.so" | xargs -r strip',
+                '# Remove RECORD files, relocate the virtualenv, and strip '
+                'native modules',
+                '# in a single pass over the files.',
+                '{0} %{{venv_dir}}'.format(postprocess_cmd),
             ))
+
+        else:
+
+            if config.python_venv.remove_pycache:
+                spec.blocks.install.append(
+                    r'find %{venv_dir} -type d -name "__pycache__" -print0 | '
+                    r'xargs -0 rm -rf'
+                )
+
+            spec.blocks.install.extend((
+                '# RECORD files are used by wheels for checksum. They contain '
+                'path names which',
+                '# match the buildroot and must be removed or the package '
+                'will fail to build.',
+                'find %{buildroot} -name "RECORD" -exec rm -rf {} \\;',
+                '# Change the virtualenv path to the target installation '
+                'direcotry.',
+                'venvctrl-relocate --source=%{venv_dir}'
+                ' --destination=/%{venv_install_dir}',
+            ))
+
+        if config.python_venv.strip_binaries:
+            # The postprocess command already strips in its single pass.
+            if not config.python_venv.postprocess:
+
+                strip_cmd = 'rpmvenv-helper strip'
+                if config.python_venv.cache_dir:
+
+                    strip_cmd = '{0} --cache-dir={1}'.format(
+                        strip_cmd,
+                        cache_path(config, 'strip'),
+                    )
+
+                spec.blocks.install.extend((
+                    '# Strip native modules as they contain buildroot paths '
+                    'in their debug information',
+                    '{0} %{{venv_dir}}/lib'.format(strip_cmd),
+                ))
+
         else:
             spec.macros["debug_package"] = "debug_package %{nil}"
             spec.macros["__strip"] = "/bin/true"
@@ -185,4 +633,95 @@ class Extension(interface.Extension):
             # those packages that inject an additional binary strip step.
             # See https://github.com/kevinconway/rpmvenv/pull/93 for details.
 
+        if config.python_venv.precompile:
+
+            precompile_cmd = (
+                'rpmvenv-helper precompile --python=%{venv_python} '
+                '--install-dir=/%{venv_install_dir}'
+            )
+            for level in config.python_venv.precompile_optimize:
+
+                precompile_cmd = '{0} --optimize={1}'.format(
+                    precompile_cmd,
+                    level,
+                )
+
+            if config.python_venv.cache_dir:
+
+                precompile_cmd = '{0} --cache-dir={1}'.format(
+                    precompile_cmd,
+                    cache_path(config, 'precompile'),
+                )
+
+            spec.blocks.install.extend((
+                '# Compile bytecode which records the installed paths.',
+                '{0} %{{venv_dir}}'.format(precompile_cmd),
+            ))
+
+        if config.python_venv.dedup:
+
+            dedup_cmd = 'rpmvenv-helper dedup'
+            if config.python_venv.split_deps:
+
+                # Links between the deps and app packages would break when
+                # either package is updated.
+                dedup_cmd = (
+                    '{0} --snapshot=%{{_builddir}}/rpmvenv-deps.json'.format(
+                        dedup_cmd,
+                    )
+                )
+
+            spec.blocks.install.extend((
+                '# Replace identical files with hardlinks so the payload '
+                'holds one copy.',
+                '{0} %{{venv_dir}}'.format(dedup_cmd),
+            ))
+
+        if config.python_venv.split_deps:
+
+            Extension._split_deps(config, spec)
+
         return spec
+
+    @staticmethod
+    def _split_deps(config, spec):
+        """Package the requirements in a separate deps subpackage."""
+        version = deps_version(config)
+        requires = '%{{name}}-deps = {0}-%{{release}}'.format(version)
+        spec.tags['Requires'] = ', '.join(
+            value for value in (spec.tags.get('Requires'), requires) if value
+        )
+        lists_cmd = (
+            'rpmvenv-helper split lists '
+            '--snapshot=%{_builddir}/rpmvenv-deps.json '
+            '--prefix=/%{venv_install_dir} '
+            '--app=%{_builddir}/rpmvenv-app.files'
+        )
+        if deps_built(config, version):
+
+            # The deps RPM in the destination already holds these files.
+            spec.blocks.install.extend((
+                '# The deps package is already built so its files are '
+                'removed.',
+                '{0} %{{venv_dir}}'.format(lists_cmd),
+            ))
+            return
+
+        spec.blocks.install.append(
+            '{0} --deps=%{{_builddir}}/rpmvenv-deps.files '
+            '%{{venv_dir}}'.format(lists_cmd),
+        )
+        spec.blocks.get('package deps').extend((
+            'Version: {0}'.format(version),
+            'Summary: The Python requirements of %{name}',
+            'AutoReq: No',
+            'AutoProv: No',
+        ))
+        spec.blocks.get('description deps').append(
+            'The virtualenv of %{name} with only its requirements installed.'
+        )
+        spec.blocks.get('files deps')
+        spec.blocks.arguments('files deps').extend((
+            '-f',
+            '%{_builddir}/rpmvenv-deps.files',
+        ))
@@ -0,0 +1,66 @@
+"""Commands which are executed by the generated SPEC during an rpmbuild.
+
+Each command module must expose a 'name' string, an 'add_parser' callable
+which consumes the argparse subparsers object, and a 'run' callable which
+consumes the parsed arguments and returns an exit code.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import sys
+
+from . import copy
+from . import dedup
+from . import postprocess
+from . import precompile
+from . import split
+from . import strip
+from . import venvcache
+
+
+COMMANDS = (
+    venvcache,
+    strip,
+    postprocess,
+    precompile,
+    dedup,
+    split,
+    copy,
+)
+
+
+def parse_args(argv):
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Helper commands used by rpmvenv SPEC files.',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    for command in COMMANDS:
+
+        command.add_parser(subparsers.add_parser(
+            command.name,
+            help=command.__doc__.splitlines()[0],
+        )).set_defaults(run=command.run)
+
+    args = parser.parse_args(argv)
+    if not args.command:
+
+        parser.print_usage(sys.stderr)
+        sys.exit(2)
+
+    return args
+
+
+def main(argv=sys.argv[1:]):
+    """Run a helper command."""
+    args = parse_args(argv)
+    sys.exit(args.run(args) or 0)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,193 @@
+"""Copy the files listed in a manifest into the buildroot.
+
+Each line of the manifest holds a source path, relative to the source
+directory, and a destination path, relative to the buildroot, separated by a
+tab. Every entry is copied as 'cp -R' would copy it: directories are copied
+recursively, symlinks are copied as links, and a destination which is an
+existing directory receives the source inside of it. Entries are copied in
+manifest order, and the parent directories of each destination are created
+just before it is copied, so that the result matches running 'cp -R' once for
+each line. Entries whose destinations do not overlap are copied concurrently.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import concurrent.futures
+import os
+import shutil
+import sys
+
+
+name = 'copy'
+
+
+def parse(lines):
+    """Get the source and destination pairs of the manifest lines.
+
+    Raises:
+        ValueError: If a line does not have exactly two fields.
+    """
+    entries = []
+    for line in lines:
+
+        line = line.rstrip('\r\n')
+        if not line:
+
+            continue
+
+        fields = line.split('\t')
+        if len(fields) != 2:
+
+            raise ValueError(
+                'The manifest line {0!r} must be a source and a destination '
+                'separated by a tab.'.format(line)
+            )
+
+        entries.append(tuple(fields))
+
+    return entries
+
+
+def copy_entry(src, dst):
+    """Copy one path in the same way as 'cp -R'."""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.isdir(dst) and not os.path.islink(dst):
+
+        dst = os.path.join(dst, os.path.basename(os.path.normpath(src)))
+
+    if os.path.islink(src):
+
+        os.symlink(os.readlink(src), dst)
+
+    elif os.path.isdir(src):
+
+        shutil.copytree(
+            src,
+            dst,
+            symlinks=True,
+            copy_function=shutil.copy,
+        )
+
+    else:
+
+        shutil.copy(src, dst)
+
+    return dst
+
+
+def _parts(path):
+    """Get the components of a normalized destination path."""
+    return tuple(
+        part for part in os.path.normpath(path).split(os.sep) if part
+    )
+
+
+def groups(pairs):
+    """Group the source and destination pairs by overlapping destinations.
+
+    Two destinations overlap when they are equal or one contains the other.
+    Each group keeps the manifest order of its pairs and no two groups
+    overlap, so the groups may be copied concurrently.
+
+    Returns:
+        list of list: The groups of pairs.
+    """
+    result = []
+    for index, (src, dst) in enumerate(pairs):
+
+        parts = _parts(dst)
+        merged = [(index, src, dst, parts)]
+        remaining = []
+        for group in result:
+
+            if any(
+                    other[:len(parts)] == parts or parts[:len(other)] == other
+                    for _, _, _, other in group
+            ):
+
+                merged.extend(group)
+
+            else:
+
+                remaining.append(group)
+
+        result = remaining + [sorted(merged)]
+
+    return [
+        [(src, dst) for _, src, dst, _ in group]
+        for group in sorted(result)
+    ]
+
+
+def _copy_group(group):
+    """Copy one group of pairs in order."""
+    for src, dst in group:
+
+        copy_entry(src, dst)
+
+
+def copy(source, destination, entries, jobs=None):
+    """Copy every manifest entry from the source into the destination.
+
+    Returns:
+        int: The number of entries copied.
+    """
+    pairs = tuple(
+        (
+            os.path.join(source, src),
+            os.path.join(destination, dst.lstrip('/')),
+        )
+        for src, dst in entries
+    )
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+
+        tuple(pool.map(_copy_group, groups(pairs)))
+
+    return len(pairs)
+
+
+def add_parser(parser):
+    """Add the command arguments to the given parser."""
+    parser.add_argument(
+        '--source',
+        help='The directory which the source paths are relative to.',
+        required=True,
+    )
+    parser.add_argument(
+        '--destination',
+        help='The directory which the destination paths are relative to.',
+        required=True,
+    )
+    parser.add_argument(
+        '--jobs',
+        help='The number of entries to copy concurrently.',
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        'manifest',
+        help='The path to the manifest. Default is standard input.',
+        nargs='?',
+        default='-',
+    )
+    return parser
+
+
+def run(args):
+    """Run the command with the parsed arguments."""
+    if args.manifest == '-':
+
+        entries = parse(sys.stdin)
+
+    else:
+
+        with open(args.manifest) as manifest:
+
+            entries = parse(manifest)
+
+    count = copy(args.source, args.destination, entries, args.jobs)
+    sys.stdout.write('Copied {0} extra files.{1}'.format(count, os.linesep))
+    return 0
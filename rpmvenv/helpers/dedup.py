@@ -0,0 +1,182 @@
+"""Replace byte-identical files in a directory with hardlinks.
+
+Virtualenvs often contain many copies of the same content, such as native
+libraries vendored by several wheels, license files, and files copied rather
+than linked from the interpreter. Files are first grouped by size, so only
+files which share a size with another are read and hashed. Hashing runs
+concurrently. Files are only linked together when their mode also matches so
+that the permissions of each path are unchanged. RPM stores the content of a
+set of hardlinks once in the payload.
+
+When the venv is split into a deps and an app package, files are only linked
+to files of the same package. A hardlink between two packages would be
+broken by an update of either package.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import concurrent.futures
+import hashlib
+import os
+import stat
+import sys
+
+from . import split
+
+
+name = 'dedup'
+
+
+def _digest(path):
+    """Get the hash of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as content:
+
+        for chunk in iter(lambda: content.read(1024 * 1024), b''):
+
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def candidates(root, package=None):
+    """Get groups of regular files under root which could be identical.
+
+    Args:
+        root (str): The directory to search.
+        package (callable): Optional function which maps the path of a file
+            relative to root to the package which holds it. Files of
+            different packages are never grouped together.
+
+    Returns:
+        list of list of tuple: Each group holds the path, size, mode, and
+            inode of files which have the same size and mode. Only one path
+            is kept for each inode so that existing hardlinks are not
+            counted twice.
+    """
+    groups = collections.defaultdict(dict)
+    for current, _, files in os.walk(root):
+
+        for file_name in files:
+
+            path = os.path.join(current, file_name)
+            info = os.lstat(path)
+            if not stat.S_ISREG(info.st_mode) or not info.st_size:
+
+                continue
+
+            owner = None
+            if package is not None:
+
+                owner = package(os.path.relpath(path, root))
+
+            groups[(
+                info.st_size,
+                info.st_mode,
+                info.st_dev,
+                owner,
+            )].setdefault(
+                info.st_ino,
+                (path, info.st_size, info.st_mode, info.st_ino),
+            )
+
+    return [
+        sorted(group.values())
+        for group in groups.values()
+        if len(group) > 1
+    ]
+
+
+def link(source, path):
+    """Replace path with a hardlink to source."""
+    tmp = '{0}.rpmvenv-dedup'.format(path)
+    os.link(source, tmp)
+    try:
+
+        os.rename(tmp, path)
+
+    except BaseException:
+
+        os.unlink(tmp)
+        raise
+
+
+def dedup(root, jobs=None, snapshot=None):
+    """Hardlink every duplicate file under root to a single copy.
+
+    Args:
+        root (str): The directory to search.
+        jobs (int): The number of files to hash concurrently.
+        snapshot (str): Optional path to a snapshot from the split command.
+            When given, files of the deps package are only linked to other
+            files of the deps package and likewise for the app package.
+
+    Returns:
+        dict: The number of files linked and the number of bytes saved.
+    """
+    package = None
+    if snapshot:
+
+        deps_files = split.divide(root, snapshot)[1]
+        package = deps_files.__contains__
+
+    groups = candidates(root, package)
+    files = [entry for group in groups for entry in group]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+
+        digests = dict(zip(
+            (entry[0] for entry in files),
+            pool.map(lambda entry: _digest(entry[0]), files),
+        ))
+
+    counts = {'linked': 0, 'saved': 0}
+    for group in groups:
+
+        originals = {}
+        for path, size, _, _ in group:
+
+            original = originals.setdefault(digests[path], path)
+            if original != path:
+
+                link(original, path)
+                counts['linked'] += 1
+                counts['saved'] += size
+
+    return counts
+
+
+def add_parser(parser):
+    """Add the command arguments to the given parser."""
+    parser.add_argument(
+        '--jobs',
+        help='The number of files to hash concurrently.',
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        '--snapshot',
+        help=(
+            'A snapshot from the split command. Files are only linked to '
+            'files of the same package.'
+        ),
+        default=None,
+    )
+    parser.add_argument('root', help='The directory to search.')
+    return parser
+
+
+def run(args):
+    """Run the command with the parsed arguments."""
+    counts = dedup(args.root, args.jobs, args.snapshot)
+    sys.stdout.write(
+        'Linked {0} duplicate files and saved {1} bytes.{2}'.format(
+            counts['linked'],
+            counts['saved'],
+            os.linesep,
+        )
+    )
+    return 0
@@ -0,0 +1,362 @@
+"""Clean up and relocate a virtualenv in a single pass over its files.
+
+This replaces the separate walks of the RECORD and __pycache__ cleanup, the
+venvctrl-relocate command, and binary stripping. Shebangs are detected from
+the first bytes of each file in the bin directory and .pth files are searched
+through mmap so that only files which reference the build path are read in
+full and rewritten. RECORD files elsewhere in the buildroot, such as those of
+other venvs or extra files, are removed by a second walk which skips the
+venv.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import concurrent.futures
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+
+from venvctrl import api as venvctrl
+
+from . import strip
+
+
+name = 'postprocess'
+
+# The longest first line of a script which is checked for a shebang.
+SHEBANG_LIMIT = 512
+
+# The second line of a shebang written by pip for long interpreter paths.
+EXEC_SHEBANG = b"'''exec'"
+
+
+def _replace(path, head, rest_offset):
+    """Replace the first bytes of a file, preserving the rest and its mode."""
+    directory = os.path.dirname(path)
+    descriptor, tmp = tempfile.mkstemp(dir=directory)
+    try:
+
+        with os.fdopen(descriptor, 'wb') as new_file:
+
+            new_file.write(head)
+            with open(path, 'rb') as old_file:
+
+                old_file.seek(rest_offset)
+                shutil.copyfileobj(old_file, new_file)
+
+        shutil.copymode(path, tmp)
+        os.rename(tmp, path)
+
+    except BaseException:
+
+        os.unlink(tmp)
+        raise
+
+
+def relocate_shebang(path, destination):
+    """Point a python shebang at the interpreter in the destination.
+
+    Returns:
+        bool: True if the file was rewritten.
+    """
+    python = os.path.join(destination, 'bin', 'python').encode('utf8')
+    with open(path, 'rb') as script:
+
+        if script.read(2) != b'#!':
+
+            return False
+
+        first = b'#!' + script.readline(SHEBANG_LIMIT)
+        second = script.readline(SHEBANG_LIMIT)
+        third = script.readline(SHEBANG_LIMIT)
+
+    if first == b'#!/bin/sh\n' and second.startswith(EXEC_SHEBANG):
+
+        if b'python' not in second and b'pypy' not in second:
+
+            return False
+
+        head = first + EXEC_SHEBANG + b' ' + python + b' "$0" "$@"\n'
+        _replace(path, head + third, len(first) + len(second) + len(third))
+        return True
+
+    if not first.endswith(b'\n') or (
+            b'python' not in first and b'pypy' not in first
+    ):
+
+        return False
+
+    _replace(path, b'#!' + python + b'\n', len(first))
+    return True
+
+
+def relocate_pth(path, origins, destination):
+    """Replace references to the build path in a .pth file.
+
+    Returns:
+        bool: True if the file was rewritten.
+    """
+    if not os.path.getsize(path):
+
+        return False
+
+    with open(path, 'rb') as pth_file:
+
+        with mmap.mmap(
+                pth_file.fileno(),
+                0,
+                access=mmap.ACCESS_READ,
+        ) as content:
+
+            if not any(content.find(origin) >= 0 for origin in origins):
+
+                return False
+
+            data = content[:]
+
+    for origin in origins:
+
+        data = data.replace(origin, destination.encode('utf8'))
+
+    with open(path, 'wb') as pth_file:
+
+        pth_file.write(data)
+
+    return True
+
+
+def remove_records(root, skip=None):
+    """Remove every entry named RECORD under root as 'rm -rf' would.
+
+    Args:
+        root (str): The directory to search.
+        skip (str): An optional directory under root which is not searched.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    removed = 0
+    skip = os.path.abspath(skip) if skip else None
+    for current, dirs, files in os.walk(root):
+
+        dirs[:] = [
+            name for name in dirs
+            if os.path.abspath(os.path.join(current, name)) != skip
+        ]
+        for name in dirs + files:
+
+            if name != 'RECORD':
+
+                continue
+
+            path = os.path.join(current, name)
+            if name in dirs and not os.path.islink(path):
+
+                shutil.rmtree(path)
+
+            else:
+
+                os.unlink(path)
+
+            removed += 1
+
+        dirs[:] = [name for name in dirs if name != 'RECORD']
+
+    return removed
+
+
+def postprocess(
+        venv,
+        destination,
+        remove_pycache=False,
+        remove_record=True,
+        strip_binaries=False,
+        strip_cache_dir=None,
+        jobs=None,
+        buildroot=None,
+):
+    """Clean up and relocate a venv in one traversal.
+
+    Args:
+        venv (str): The path to the venv in the buildroot.
+        destination (str): The path at which the venv is installed.
+        remove_pycache (bool): Remove every __pycache__ directory.
+        remove_record (bool): Remove every wheel RECORD file in the venv
+            and, if a buildroot is given, in the rest of the buildroot.
+        strip_binaries (bool): Strip the ELF objects in the lib directory.
+        strip_cache_dir (str): Optional cache of stripped objects.
+        jobs (int): The number of objects to strip concurrently.
+        buildroot (str): The optional buildroot which contains the venv.
+
+    Returns:
+        dict: Counts of each kind of change made.
+    """
+    counts = {
+        'pycache': 0,
+        'record': 0,
+        'shebang': 0,
+        'pth': 0,
+        'stripped': 0,
+    }
+    origins = tuple(
+        path.encode('utf8')
+        for path in sorted(
+            set((os.path.abspath(venv), venv)),
+            key=len,
+            reverse=True,
+        )
+    )
+    bin_dir = os.path.join(venv, 'bin')
+    lib_dir = os.path.join(venv, 'lib')
+    elf_files = []
+    pending = [(venv, False)]
+    while pending:
+
+        current, in_lib = pending.pop()
+        for entry in os.scandir(current):
+
+            if entry.is_dir(follow_symlinks=False):
+
+                if remove_record and entry.name == 'RECORD':
+
+                    shutil.rmtree(entry.path)
+                    counts['record'] += 1
+                    continue
+
+                if remove_pycache and entry.name == '__pycache__':
+
+                    shutil.rmtree(entry.path)
+                    counts['pycache'] += 1
+                    continue
+
+                pending.append((entry.path, in_lib or entry.path == lib_dir))
+                continue
+
+            if not entry.is_file(follow_symlinks=False):
+
+                continue
+
+            if remove_record and entry.name == 'RECORD':
+
+                os.unlink(entry.path)
+                counts['record'] += 1
+
+            elif entry.name.endswith('.pth'):
+
+                counts['pth'] += relocate_pth(entry.path, origins, destination)
+
+            elif current == bin_dir:
+
+                counts['shebang'] += relocate_shebang(entry.path, destination)
+
+            elif (
+                    strip_binaries and
+                    in_lib and
+                    strip.is_strippable(entry.path)
+            ):
+
+                elf_files.append(entry.path)
+
+    if remove_record and buildroot:
+
+        counts['record'] += remove_records(buildroot, venv)
+
+    for activate in venvctrl.VirtualEnvironment(venv).bin.activates:
+
+        activate.vpath = destination
+
+    if elf_files:
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+
+            counts['stripped'] = sum(
+                result != 'skipped'
+                for result in pool.map(
+                    lambda path: strip.strip_file(
+                        path,
+                        cache_dir=strip_cache_dir,
+                    ),
+                    elf_files,
+                )
+            )
+
+    return counts
+
+
+def add_parser(parser):
+    """Add the command arguments to the given parser."""
+    parser.add_argument(
+        '--destination',
+        help='The path at which the venv is installed.',
+        required=True,
+    )
+    parser.add_argument(
+        '--remove-pycache',
+        help='Remove every __pycache__ directory.',
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--keep-record',
+        help='Keep the wheel RECORD files.',
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--buildroot',
+        help=(
+            'The buildroot which contains the venv. RECORD files in the '
+            'rest of it are removed too.'
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        '--strip',
+        help='Strip the ELF objects in the lib directory.',
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--strip-cache-dir',
+        help='A directory in which to cache stripped objects.',
+        default=None,
+    )
+    parser.add_argument(
+        '--jobs',
+        help='The number of objects to strip concurrently.',
+        type=int,
+        default=None,
+    )
+    parser.add_argument('venv', help='The path to the venv to process.')
+    return parser
+
+
+def run(args):
+    """Run the command with the parsed arguments."""
+    counts = postprocess(
+        args.venv,
+        args.destination,
+        remove_pycache=args.remove_pycache,
+        remove_record=not args.keep_record,
+        strip_binaries=args.strip,
+        strip_cache_dir=args.strip_cache_dir,
+        jobs=args.jobs,
+        buildroot=args.buildroot,
+    )
+    sys.stdout.write(
+        'Removed {0} RECORD files and {1} __pycache__ directories. Relocated '
+        '{2} scripts and {3} .pth files. Stripped {4} ELF objects.{5}'.format(
+            counts['record'],
+            counts['pycache'],
+            counts['shebang'],
+            counts['pth'],
+            counts['stripped'],
+            os.linesep,
+        )
+    )
+    return 0
@@ -0,0 +1,236 @@
+"""Precompile the Python sources of a virtualenv to bytecode.
+
+The bytecode must match the interpreter of the virtualenv so the compile
+runs in that interpreter. This module only uses the standard library so that
+the venv python can execute it directly as a script. It runs in isolated
+mode so that the other helper modules do not shadow the standard library.
+Bytecode is written with unchecked-hash invalidation and with the final
+install path recorded as the file name so that tracebacks and the import
+system see the installed paths. Compiled files may be cached by a key of the
+interpreter magic number, the optimization level, the install path, and the
+hash of the source.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+name = 'precompile'
+
+
+def sources(venv):
+    """Get the paths of every Python source file in the venv lib directory."""
+    for current, _, files in os.walk(os.path.join(venv, 'lib')):
+
+        for file_name in files:
+
+            if file_name.endswith('.py'):
+
+                yield os.path.join(current, file_name)
+
+
+def compile_source(task):
+    """Compile one source for one optimization level.
+
+    Args:
+        task (tuple): The source path, the path to record in the bytecode,
+            the optimization level, and the cache directory or None.
+
+    Returns:
+        str: One of 'compiled', 'cached', or 'failed'.
+    """
+    import importlib.util
+    import py_compile
+
+    path, dfile, optimize, cache_dir = task
+    cfile = importlib.util.cache_from_source(
+        path,
+        optimization=optimize if optimize else '',
+    )
+    cached = None
+    if cache_dir:
+
+        with open(path, 'rb') as source_file:
+
+            source = source_file.read()
+
+        digest = hashlib.sha256()
+        for part in (
+                importlib.util.MAGIC_NUMBER,
+                str(optimize).encode('utf8'),
+                dfile.encode('utf8'),
+                hashlib.sha256(source).digest(),
+        ):
+
+            digest.update(part)
+            digest.update(b'\0')
+
+        cached = os.path.join(cache_dir, digest.hexdigest())
+        if os.path.isfile(cached):
+
+            if not os.path.isdir(os.path.dirname(cfile)):
+
+                os.makedirs(os.path.dirname(cfile))
+
+            shutil.copyfile(cached, cfile)
+            return 'cached'
+
+    try:
+
+        py_compile.compile(
+            path,
+            cfile=cfile,
+            dfile=dfile,
+            doraise=True,
+            optimize=optimize,
+            invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+        )
+
+    except (py_compile.PyCompileError, SyntaxError, UnicodeError):
+
+        # Some distributions ship files, such as test data or templates,
+        # which are not valid for this interpreter. compileall skips them
+        # too.
+        return 'failed'
+
+    if cached:
+
+        descriptor, tmp = tempfile.mkstemp(dir=cache_dir)
+        os.close(descriptor)
+        shutil.copyfile(cfile, tmp)
+        os.rename(tmp, cached)
+
+    return 'compiled'
+
+
+def precompile(venv, install_dir, optimize=(0,), cache_dir=None, jobs=None):
+    """Compile every source in the venv with the running interpreter.
+
+    Returns:
+        dict: The number of files for each result of compile_source.
+    """
+    import concurrent.futures
+
+    if cache_dir and not os.path.isdir(cache_dir):
+
+        os.makedirs(cache_dir)
+
+    tasks = tuple(
+        (
+            path,
+            os.path.join(install_dir, os.path.relpath(path, venv)),
+            level,
+            cache_dir,
+        )
+        for path in sources(venv)
+        for level in optimize
+    )
+    counts = {'compiled': 0, 'cached': 0, 'failed': 0}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+
+        for result in pool.map(compile_source, tasks, chunksize=64):
+
+            counts[result] += 1
+
+    return counts
+
+
+def add_parser(parser):
+    """Add the command arguments to the given parser."""
+    parser.add_argument(
+        '--python',
+        help='The interpreter of the venv. Default is the venv bin/python.',
+        default=None,
+    )
+    parser.add_argument(
+        '--install-dir',
+        help='The path at which the venv is installed.',
+        required=True,
+    )
+    parser.add_argument(
+        '--optimize',
+        help='An optimization level to compile. May be given many times.',
+        type=int,
+        action='append',
+        default=None,
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='A directory in which to cache compiled files.',
+        default=None,
+    )
+    parser.add_argument(
+        '--jobs',
+        help='The number of files to compile concurrently.',
+        type=int,
+        default=None,
+    )
+    parser.add_argument('venv', help='The path to the venv to compile.')
+    return parser
+
+
+def command(args):
+    """Get the command which runs the compile in the venv interpreter."""
+    # The script runs in isolated mode so that the directory of the helpers
+    # is not put on the path where its modules, such as copy, would shadow
+    # the standard library.
+    cmd = [
+        args.python or os.path.join(args.venv, 'bin', 'python'),
+        '-I',
+        os.path.splitext(os.path.abspath(__file__))[0] + '.py',
+        '--install-dir={0}'.format(args.install_dir),
+    ]
+    cmd.extend(
+        '--optimize={0}'.format(level) for level in (args.optimize or (0,))
+    )
+    if args.cache_dir:
+
+        cmd.append('--cache-dir={0}'.format(os.path.abspath(args.cache_dir)))
+
+    if args.jobs:
+
+        cmd.append('--jobs={0}'.format(args.jobs))
+
+    cmd.append(os.path.abspath(args.venv))
+    return cmd
+
+
+def run(args):
+    """Run the command with the parsed arguments."""
+    return subprocess.call(command(args))
+
+
+def main(argv):
+    """Compile the venv with the running interpreter."""
+    args = add_parser(argparse.ArgumentParser()).parse_args(argv)
+    counts = precompile(
+        args.venv,
+        args.install_dir,
+        tuple(args.optimize or (0,)),
+        args.cache_dir,
+        args.jobs,
+    )
+    sys.stdout.write(
+        'Compiled {0} files, {1} from cache, and skipped {2}.{3}'.format(
+            counts['compiled'] + counts['cached'],
+            counts['cached'],
+            counts['failed'],
+            os.linesep,
+        )
+    )
+    return 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv[1:]))
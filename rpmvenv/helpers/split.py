@@ -0,0 +1,235 @@
+"""Divide the files of a virtualenv between a deps and an app package.
+
+A snapshot of the venv is taken once the requirements are installed and
+before the application is. Every path in the snapshot belongs to the deps
+package and every path added later belongs to the app package, except for
+bytecode compiled later for a deps source and new __pycache__ directories
+in a deps directory. The result is written as two RPM file lists for use
+with '%files -f'.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import sys
+
+
+name = 'split'
+
+
+def walk(venv):
+    """Get the relative paths of every directory and file in the venv.
+
+    Returns:
+        tuple: A set of the directories and a set of the other paths.
+    """
+    directories = set(('.',))
+    files = set()
+    for current, dirs, file_names in os.walk(venv):
+
+        relative = os.path.relpath(current, venv)
+        for dir_name in tuple(dirs):
+
+            if os.path.islink(os.path.join(current, dir_name)):
+
+                # Links to directories are packaged as links.
+                dirs.remove(dir_name)
+                files.add(os.path.normpath(os.path.join(relative, dir_name)))
+                continue
+
+            directories.add(os.path.normpath(os.path.join(relative, dir_name)))
+
+        for file_name in file_names:
+
+            files.add(os.path.normpath(os.path.join(relative, file_name)))
+
+    return directories, files
+
+
+def snapshot(venv, output):
+    """Record the paths in the venv which belong to the deps package."""
+    directories, files = walk(venv)
+    with open(output, 'w') as snapshot_file:
+
+        json.dump(
+            {'directories': sorted(directories), 'files': sorted(files)},
+            snapshot_file,
+        )
+
+
+def _source(path):
+    """Get the source of a compiled file in a __pycache__ directory."""
+    parent, file_name = os.path.split(path)
+    if os.path.basename(parent) != '__pycache__':
+
+        return None
+
+    return os.path.join(
+        os.path.dirname(parent),
+        '{0}.py'.format(file_name.split('.', 1)[0]),
+    )
+
+
+def divide(venv, snapshot_path):
+    """Divide the current paths of the venv between the packages.
+
+    Returns:
+        tuple: The directories and files of the deps package followed by
+            the directories and files of the app package.
+    """
+    with open(snapshot_path) as snapshot_file:
+
+        recorded = json.load(snapshot_file)
+
+    recorded_dirs = set(recorded['directories'])
+    recorded_files = set(recorded['files'])
+    directories, files = walk(venv)
+    deps_files = set()
+    for path in files:
+
+        if path in recorded_files or _source(path) in recorded_files:
+
+            deps_files.add(path)
+
+    deps_dirs = set()
+    for path in directories:
+
+        if path in recorded_dirs or (
+                os.path.basename(path) == '__pycache__' and
+                os.path.dirname(path) in recorded_dirs
+        ):
+
+            deps_dirs.add(path)
+
+    return (
+        deps_dirs,
+        deps_files,
+        directories - deps_dirs,
+        files - deps_files,
+    )
+
+
+def _entry(prefix, path):
+    """Get the %files entry for a path relative to the venv."""
+    entry = os.path.normpath(os.path.join(prefix, path)).replace('%', '%%')
+    if any(character.isspace() for character in entry):
+
+        entry = '"{0}"'.format(entry)
+
+    return entry
+
+
+def write_list(output, prefix, directories, files):
+    """Write an RPM file list for the given relative paths."""
+    with open(output, 'w') as list_file:
+
+        for path in sorted(directories):
+
+            list_file.write('%dir {0}\n'.format(_entry(prefix, path)))
+
+        for path in sorted(files):
+
+            list_file.write('{0}\n'.format(_entry(prefix, path)))
+
+
+def lists(venv, snapshot_path, prefix, app, deps=None):
+    """Write the file lists of the app package and, optionally, deps.
+
+    When deps is not given the deps package is not being built and its files
+    are removed from the venv so that rpmbuild does not find them unpackaged.
+
+    Returns:
+        dict: The number of files in each package.
+    """
+    deps_dirs, deps_files, app_dirs, app_files = divide(venv, snapshot_path)
+    write_list(app, prefix, app_dirs, app_files)
+    if deps:
+
+        write_list(deps, prefix, deps_dirs, deps_files)
+
+    else:
+
+        for path in deps_files:
+
+            os.unlink(os.path.join(venv, path))
+
+    return {'deps': len(deps_files), 'app': len(app_files)}
+
+
+def add_parser(parser):
+    """Add the command arguments to the given parser."""
+    actions = parser.add_subparsers(dest='action')
+    snapshot_parser = actions.add_parser(
+        'snapshot',
+        help='Record the paths which belong to the deps package.',
+    )
+    snapshot_parser.add_argument(
+        '--output',
+        help='The file in which to record the paths.',
+        required=True,
+    )
+    snapshot_parser.add_argument('venv', help='The path to the venv.')
+    lists_parser = actions.add_parser(
+        'lists',
+        help='Write the file lists of the packages.',
+    )
+    lists_parser.add_argument(
+        '--snapshot',
+        help='The file written by the snapshot action.',
+        required=True,
+    )
+    lists_parser.add_argument(
+        '--prefix',
+        help='The path at which the venv is installed.',
+        required=True,
+    )
+    lists_parser.add_argument(
+        '--app',
+        help='The file in which to write the app file list.',
+        required=True,
+    )
+    lists_parser.add_argument(
+        '--deps',
+        help=(
+            'The file in which to write the deps file list. When not given '
+            'the deps files are removed from the venv.'
+        ),
+        default=None,
+    )
+    lists_parser.add_argument('venv', help='The path to the venv.')
+    return parser
+
+
+def run(args):
+    """Run the command with the parsed arguments."""
+    if args.action == 'snapshot':
+
+        snapshot(args.venv, args.output)
+        return 0
+
+    if args.action == 'lists':
+
+        counts = lists(
+            args.venv,
+            args.snapshot,
+            args.prefix,
+            args.app,
+            args.deps,
+        )
+        sys.stdout.write(
+            'Packaged {0} files as deps and {1} files as the app.{2}'.format(
+                counts['deps'],
+                counts['app'],
+                os.linesep,
+            )
+        )
+        return 0
+
+    sys.stderr.write('An action of snapshot or lists is required.{0}'.format(
+        os.linesep,
+    ))
+    return 2
@@ -0,0 +1,290 @@
+"""Strip debug information from the ELF objects in a directory.
+
+Files are recognised as ELF by their header rather than by name so that
+versioned libraries, such as those vendored in '.libs' directories by
+auditwheel, are included. Only executables and shared objects are stripped;
+relocatable objects are left as they are. Objects without debug sections or a
+symbol table, and objects whose headers cannot be read, are left untouched.
+The stripped output of each object may be cached by the hash of its content
+so that unchanged binaries are not stripped again.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+
+
+name = 'strip'
+
+ELF_MAGIC = b'\x7fELF'
+
+# The e_type values of executables and shared objects.
+ET_EXEC = 2
+ET_DYN = 3
+
+# Section names which mark an object as worth stripping.
+STRIPPED_SECTIONS = ('.symtab',)
+STRIPPED_PREFIXES = ('.debug', '.zdebug')
+
+
+def is_elf(path):
+    """Get whether a file starts with the ELF magic number."""
+    try:
+
+        with open(path, 'rb') as elf_file:
+
+            return elf_file.read(4) == ELF_MAGIC
+
+    except (IOError, OSError):
+
+        return False
+
+
+def is_strippable(path):
+    """Get whether a file is an ELF executable or shared object."""
+    try:
+
+        with open(path, 'rb') as elf_file:
+
+            ident = elf_file.read(18)
+
+    except (IOError, OSError):
+
+        return False
+
+    if len(ident) < 18 or ident[:4] != ELF_MAGIC:
+
+        return False
+
+    order = '<' if ident[5] == 1 else '>'
+    return struct.unpack(order + 'H', ident[16:18])[0] in (ET_EXEC, ET_DYN)
+
+
+def section_names(path):
+    """Get the names of the sections in an ELF object.
+
+    Returns:
+        frozenset of str: The names of the sections or None if the section
+            headers could not be read, such as in a truncated file.
+    """
+    try:
+
+        return _section_names(path)
+
+    except struct.error:
+
+        return None
+
+
+def _section_names(path):
+    """Read the names of the sections in an ELF object."""
+    with open(path, 'rb') as elf_file:
+
+        ident = elf_file.read(16)
+        if len(ident) < 16 or ident[:4] != ELF_MAGIC:
+
+            return None
+
+        is_64 = ident[4] == 2
+        order = '<' if ident[5] == 1 else '>'
+        if is_64:
+
+            header = struct.Struct(order + 'HHIQQQIHHHHHH')
+            section = struct.Struct(order + 'IIQQQQIIQQ')
+
+        else:
+
+            header = struct.Struct(order + 'HHIIIIIHHHHHH')
+            section = struct.Struct(order + 'IIIIIIIIII')
+
+        fields = header.unpack(elf_file.read(header.size))
+        shoff, shentsize, shnum, shstrndx = (
+            fields[5], fields[10], fields[11], fields[12],
+        )
+        if not shoff or not shnum or shstrndx >= shnum:
+
+            return None
+
+        if shentsize < section.size:
+
+            return None
+
+        elf_file.seek(shoff)
+        table = elf_file.read(shentsize * shnum)
+        if len(table) < shentsize * shnum:
+
+            return None
+
+        headers = tuple(
+            section.unpack_from(table, index * shentsize)
+            for index in range(shnum)
+        )
+        strings = headers[shstrndx]
+        elf_file.seek(strings[4])
+        names = elf_file.read(strings[5])
+
+    result = set()
+    for header_fields in headers:
+
+        offset = header_fields[0]
+        result.add(
+            names[offset:names.find(b'\0', offset)].decode('utf8', 'replace')
+        )
+
+    return frozenset(result)
+
+
+def needs_strip(path):
+    """Get whether an ELF object has debug sections or a symbol table."""
+    names = section_names(path)
+    if names is None:
+
+        # Objects which cannot be parsed, such as truncated files, would
+        # only make strip fail.
+        return False
+
+    return any(
+        section_name in STRIPPED_SECTIONS or
+        section_name.startswith(STRIPPED_PREFIXES)
+        for section_name in names
+    )
+
+
+def find(root):
+    """Get the paths of every regular ELF executable and shared object."""
+    for current, _, files in os.walk(root):
+
+        for file_name in files:
+
+            path = os.path.join(current, file_name)
+            if not os.path.islink(path) and is_strippable(path):
+
+                yield path
+
+
+def _key(path, command):
+    """Get the cache key of an object for a strip command."""
+    digest = hashlib.sha256()
+    digest.update(command.encode('utf8'))
+    digest.update(b'\0')
+    with open(path, 'rb') as content:
+
+        for chunk in iter(lambda: content.read(1024 * 1024), b''):
+
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def strip_file(path, command='strip', cache_dir=None):
+    """Strip a single ELF object.
+
+    Returns:
+        str: One of 'skipped', 'cached', or 'stripped'.
+
+    Raises:
+        CalledProcessError: If the strip command fails.
+    """
+    if not needs_strip(path):
+
+        return 'skipped'
+
+    cached = None
+    if cache_dir:
+
+        cached = os.path.join(cache_dir, _key(path, command))
+        if os.path.isfile(cached):
+
+            # Replace rather than write through the file in case it is a
+            # hardlink to a file outside of the build.
+            tmp = '{0}.rpmvenv-strip'.format(path)
+            shutil.copyfile(cached, tmp)
+            shutil.copymode(path, tmp)
+            os.rename(tmp, path)
+            return 'cached'
+
+    subprocess.check_call((command, path))
+    if cached:
+
+        if not os.path.isdir(cache_dir):
+
+            os.makedirs(cache_dir)
+
+        descriptor, tmp = tempfile.mkstemp(dir=cache_dir)
+        os.close(descriptor)
+        shutil.copyfile(path, tmp)
+        os.rename(tmp, cached)
+
+    return 'stripped'
+
+
+def strip(root, command='strip', cache_dir=None, jobs=None):
+    """Strip every ELF object under root concurrently.
+
+    The default is one worker for each CPU.
+
+    Returns:
+        dict: The number of files for each result of strip_file.
+    """
+    counts = {'skipped': 0, 'cached': 0, 'stripped': 0}
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=jobs or os.cpu_count(),
+    ) as pool:
+
+        for result in pool.map(
+                lambda path: strip_file(path, command, cache_dir),
+                tuple(find(root)),
+        ):
+
+            counts[result] += 1
+
+    return counts
+
+
+def add_parser(parser):
+    """Add the command arguments to the given parser."""
+    parser.add_argument(
+        '--cache-dir',
+        help='A directory in which to cache stripped objects.',
+        default=None,
+    )
+    parser.add_argument(
+        '--command',
+        help='The strip command to run. Default is strip.',
+        default='strip',
+    )
+    parser.add_argument(
+        '--jobs',
+        help=(
+            'The number of objects to strip concurrently. Default is one '
+            'for each CPU.'
+        ),
+        type=int,
+        default=None,
+    )
+    parser.add_argument('root', help='The directory to search.')
+    return parser
+
+
+def run(args):
+    """Run the command with the parsed arguments."""
+    counts = strip(args.root, args.command, args.cache_dir, args.jobs)
+    sys.stdout.write(
+        'Stripped {0} ELF objects, {1} from cache, and skipped {2}.{3}'.format(
+            counts['stripped'] + counts['cached'],
+            counts['cached'],
+            counts['skipped'],
+            os.linesep,
+        )
+    )
+    return 0
@@ -0,0 +1,188 @@
+"""Save and restore layers of a virtualenv from a local cache.
+
+Each layer is identified by a key which is generated with the SPEC. Keys are
+chained so that a layer key covers every layer before it. Restoring looks for
+the deepest layer available and prints its position so the SPEC can skip the
+install steps which are already covered by it.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+
+from venvctrl import api as venvctrl
+
+from .. import stage
+
+
+name = 'venv-cache'
+
+
+def _tree(cache_dir, key):
+    return os.path.join(cache_dir, key, 'venv')
+
+
+def _origin(cache_dir, key):
+    return os.path.join(cache_dir, key, 'origin')
+
+
+def relocate_pth(path, origin, destination):
+    """Rewrite any .pth file which references the original venv path."""
+    for current, _, files in os.walk(path):
+
+        for file_name in files:
+
+            if not file_name.endswith('.pth'):
+
+                continue
+
+            file_path = os.path.join(current, file_name)
+            with open(file_path, 'r') as pth_file:
+
+                content = pth_file.read()
+
+            if origin not in content:
+
+                continue
+
+            with open(file_path, 'w') as pth_file:
+
+                pth_file.write(content.replace(origin, destination))
+
+
+def save(cache_dir, source, key):
+    """Store a copy of the venv at source as the given layer.
+
+    Returns:
+        bool: False if the layer already existed and True otherwise.
+    """
+    if os.path.isdir(_tree(cache_dir, key)):
+
+        return False
+
+    if not os.path.isdir(cache_dir):
+
+        os.makedirs(cache_dir)
+
+    # The layer is assembled in a temporary directory and renamed into place
+    # so that concurrent builds never observe a partial layer.
+    tmp = tempfile.mkdtemp(prefix='.{0}'.format(key), dir=cache_dir)
+    try:
+
+        shutil.copytree(
+            source,
+            os.path.join(tmp, 'venv'),
+            symlinks=True,
+            copy_function=stage.stage_file,
+        )
+        with open(os.path.join(tmp, 'origin'), 'w') as origin_file:
+
+            origin_file.write(os.path.abspath(source))
+
+        os.rename(tmp, os.path.join(cache_dir, key))
+
+    except OSError:
+
+        shutil.rmtree(tmp, ignore_errors=True)
+        if os.path.isdir(_tree(cache_dir, key)):
+
+            return False
+
+        raise
+
+    return True
+
+
+def restore(cache_dir, destination, keys):
+    """Restore the deepest available layer into destination.
+
+    Returns:
+        int: The position of the restored layer in keys or -1 if none of the
+            layers are cached.
+    """
+    for position in range(len(keys) - 1, -1, -1):
+
+        key = keys[position]
+        if not os.path.isdir(_tree(cache_dir, key)):
+
+            continue
+
+        with open(_origin(cache_dir, key), 'r') as origin_file:
+
+            origin = origin_file.read().strip()
+
+        destination = os.path.abspath(destination)
+        if os.path.lexists(destination):
+
+            shutil.rmtree(destination)
+
+        shutil.copytree(
+            _tree(cache_dir, key),
+            destination,
+            symlinks=True,
+            copy_function=stage.stage_file,
+        )
+        venvctrl.VirtualEnvironment(destination).relocate(destination)
+        relocate_pth(destination, origin, destination)
+        return position
+
+    return -1
+
+
+def add_parser(parser):
+    """Add the command arguments to the given parser."""
+    parser.add_argument(
+        '--cache-dir',
+        help='The directory which contains the cached layers.',
+        required=True,
+    )
+    actions = parser.add_subparsers(dest='action')
+    save_parser = actions.add_parser('save', help='Store a venv layer.')
+    save_parser.add_argument(
+        '--source',
+        help='The path to the venv to store.',
+        required=True,
+    )
+    save_parser.add_argument('key', help='The key of the layer.')
+    restore_parser = actions.add_parser(
+        'restore',
+        help='Restore the deepest cached layer and print its position.',
+    )
+    restore_parser.add_argument(
+        '--destination',
+        help='The path at which to restore the venv.',
+        required=True,
+    )
+    restore_parser.add_argument(
+        'keys',
+        help='The keys of every layer in order.',
+        nargs='+',
+    )
+    return parser
+
+
+def run(args):
+    """Run the command with the parsed arguments."""
+    if args.action == 'save':
+
+        save(args.cache_dir, args.source, args.key)
+        return 0
+
+    if args.action == 'restore':
+
+        sys.stdout.write('{0}{1}'.format(
+            restore(args.cache_dir, args.destination, args.keys),
+            os.linesep,
+        ))
+        return 0
+
+    sys.stderr.write('An action of save or restore is required.{0}'.format(
+        os.linesep,
+    ))
+    return 2
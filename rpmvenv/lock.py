@@ -0,0 +1,268 @@
+"""Functions for locking the requirements of a venv to pinned hashes."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+HEADER = (
+    '# This file is generated by the rpmvenv lock command. It pins every\n'
+    '# requirement to one version and hash and is installed without\n'
+    '# dependency resolution.\n'
+)
+
+
+def command(report, requirements=(), python=None, pip_flags=()):
+    """Get the pip command which resolves the requirements to a report.
+
+    Args:
+        report (str): The path at which pip writes the installation report.
+        requirements (iter of str): Paths to requirements files.
+        python (str): The interpreter for which to resolve. The default is
+            the current interpreter.
+        pip_flags (iter of str): Additional flags to pass to pip.
+
+    Returns:
+        list of str: The command arguments.
+    """
+    cmd = [
+        python or sys.executable,
+        '-m',
+        'pip',
+        'install',
+        '--dry-run',
+        '--ignore-installed',
+        '--quiet',
+        '--report={0}'.format(report),
+    ]
+    for flag in pip_flags:
+
+        cmd.extend(flag.split())
+
+    for requirement in requirements:
+
+        cmd.extend(('-r', requirement))
+
+    return cmd
+
+
+def _hashes(item):
+    """Get the hashes of an installation report item as name=value."""
+    archive = item.get('download_info', {}).get('archive_info', {})
+    hashes = archive.get('hashes')
+    if hashes:
+
+        return tuple(
+            '{0}:{1}'.format(name, value)
+            for name, value in sorted(hashes.items())
+        )
+
+    if archive.get('hash'):
+
+        return (archive['hash'].replace('=', ':', 1),)
+
+    return ()
+
+
+def _entry(name, version, hashes):
+    """Render one pinned requirement of a lock file."""
+    return '{0}=={1}{2}\n'.format(
+        name,
+        version,
+        ''.join(' \\\n    --hash={0}'.format(value) for value in hashes),
+    )
+
+
+def render(report):
+    """Render a pip installation report as a lock file.
+
+    Args:
+        report (dict): The parsed pip installation report.
+
+    Returns:
+        str: The content of the lock file.
+
+    Raises:
+        ValueError: If a requirement has no archive hash, such as a VCS or a
+            local directory requirement.
+    """
+    lines = [HEADER]
+    missing = []
+    for item in sorted(
+            report['install'],
+            key=lambda value: value['metadata']['name'].lower(),
+    ):
+
+        name = item['metadata']['name']
+        hashes = _hashes(item)
+        if not hashes:
+
+            missing.append(name)
+            continue
+
+        lines.append(_entry(name, item['metadata']['version'], hashes))
+
+    if missing:
+
+        raise ValueError(
+            'Requirements without an archive hash cannot be locked: '
+            '{0}.'.format(', '.join(missing))
+        )
+
+    return ''.join(lines)
+
+
+def generate(path, source, requirements=(), python=None, pip_flags=()):
+    """Resolve the requirements once and write the lock file.
+
+    Requirements paths are resolved relative to the source directory.
+
+    Raises:
+        CalledProcessError: If pip fails.
+        ValueError: If a requirement cannot be locked.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+
+        report = os.path.join(directory, 'report.json')
+        subprocess.check_call(
+            command(report, requirements, python, pip_flags),
+            cwd=source,
+        )
+        with open(report) as report_file:
+
+            content = render(json.load(report_file))
+
+    finally:
+
+        shutil.rmtree(directory)
+
+    with open(path, 'w') as lock_file:
+
+        lock_file.write(content)
+
+    return path
+
+
+def _normalize(value):
+    """Normalize a name or version the way wheel file names do."""
+    return re.sub(r'[-_.]+', '_', value).lower()
+
+
+def wheel_hashes(wheelhouse):
+    """Get the hashes of the wheels in a wheelhouse.
+
+    Returns:
+        dict: The name=value hashes keyed by the normalized name and version
+            of each wheel.
+    """
+    result = {}
+    for file_name in sorted(os.listdir(wheelhouse)):
+
+        if not file_name.endswith('.whl'):
+
+            continue
+
+        digest = hashlib.sha256()
+        with open(os.path.join(wheelhouse, file_name), 'rb') as wheel:
+
+            for chunk in iter(lambda: wheel.read(1024 * 1024), b''):
+
+                digest.update(chunk)
+
+        name, version = file_name.split('-')[:2]
+        result.setdefault((_normalize(name), _normalize(version)), []).append(
+            'sha256:{0}'.format(digest.hexdigest()),
+        )
+
+    return result
+
+
+def _read(path):
+    """Read the lines of a lock file.
+
+    Returns:
+        list: A str for each comment or blank line and a tuple of the name,
+            version, and list of hashes for each requirement.
+    """
+    with open(path) as lock_file:
+
+        content = lock_file.read()
+
+    lines = []
+    for line in content.replace(' \\\n', ' ').splitlines():
+
+        if not line.strip() or line.startswith('#'):
+
+            lines.append(line)
+            continue
+
+        fields = line.split()
+        name, version = fields[0].split('==', 1)
+        lines.append((name, version, [
+            field[len('--hash='):] for field in fields[1:]
+            if field.startswith('--hash=')
+        ]))
+
+    return lines
+
+
+def missing_hashes(path, wheelhouse):
+    """Get the locked requirements whose wheels fail the hash check.
+
+    Returns:
+        tuple of str: The name==version of each locked requirement which has
+            a wheel in the wheelhouse whose hash is not in the lock file.
+    """
+    hashes = wheel_hashes(wheelhouse)
+    return tuple(
+        '{0}=={1}'.format(line[0], line[1])
+        for line in _read(path)
+        if not isinstance(line, str) and any(
+            value not in line[2]
+            for value in hashes.get(
+                (_normalize(line[0]), _normalize(line[1])),
+                (),
+            )
+        )
+    )
+
+
+def add_hashes(path, wheelhouse):
+    """Add the hashes of the wheels in a wheelhouse to a lock file.
+
+    Wheels built from a source distribution match none of the hashes which
+    the resolver recorded so they would otherwise fail the hash check when
+    installed from the wheelhouse.
+    """
+    hashes = wheel_hashes(wheelhouse)
+    lines = []
+    for line in _read(path):
+
+        if isinstance(line, str):
+
+            lines.append('{0}\n'.format(line))
+            continue
+
+        name, version, values = line
+        key = (_normalize(name), _normalize(version))
+        values.extend(
+            value for value in hashes.get(key, ()) if value not in values
+        )
+        lines.append(_entry(name, version, values))
+
+    with open(path, 'w') as lock_file:
+
+        lock_file.write(''.join(lines))
+
+    return path
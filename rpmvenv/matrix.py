@@ -0,0 +1,130 @@
+"""Expansion of one configuration into a matrix of build variants."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import re
+
+from collections import namedtuple
+from collections.abc import MutableMapping
+
+from confpy.core import option
+
+
+Variant = namedtuple('Variant', ['python', 'buildarch', 'suffix'])
+
+
+def default_suffix(python):
+    """Get the name suffix for a variant from its interpreter.
+
+    For example, 'python3.11' and '/usr/bin/python3.11' both become '-py311'
+    and 'pypy3' becomes '-pypy3'.
+    """
+    if not python:
+
+        return ''
+
+    name = os.path.basename(python)
+    name = re.sub(r'^python', 'py', name)
+    return '-{0}'.format(name.replace('.', ''))
+
+
+class VariantOption(option.Option):
+
+    """Configuration option used to describe a matrix variant."""
+
+    def coerce(self, value):
+        """Convert dict or string values into Variant values.
+
+        Supports dicts with 'python', 'buildarch', and 'suffix' keys or colon
+        delimited strings of the form 'python[:buildarch[:suffix]]'. The
+        suffix defaults to one derived from the python value.
+
+        Args:
+            value (str or dict): The value to coerce.
+
+        Raises:
+            TypeError: If the value is not a dict or string.
+            ValueError: If the value sets neither a python nor a suffix.
+
+        Returns:
+            Variant: The Variant value represented.
+        """
+        if isinstance(value, Variant):
+
+            return value
+
+        if isinstance(value, MutableMapping):
+
+            python = value.get('python') or None
+            buildarch = value.get('buildarch') or None
+            suffix = value.get('suffix')
+
+        elif isinstance(value, str):
+
+            parts = value.split(':')
+            if len(parts) > 3:
+
+                raise ValueError(
+                    'The value {0} has too many fields.'.format(value)
+                )
+
+            parts = parts + [None] * (3 - len(parts))
+            python = parts[0] or None
+            buildarch = parts[1] or None
+            suffix = parts[2]
+
+        else:
+
+            raise TypeError('Could not coerce {0} to a Variant'.format(value))
+
+        if suffix is None:
+
+            suffix = default_suffix(python)
+
+        if not python and not suffix:
+
+            raise ValueError(
+                'The variant {0} needs a python or a suffix.'.format(value)
+            )
+
+        return Variant(python=python, buildarch=buildarch, suffix=suffix)
+
+
+def apply(config, variant):
+    """Apply a variant to a loaded configuration.
+
+    The suffix is appended to the package name and, when python_venv is
+    enabled, to the venv name so that the variants install into separate
+    paths and do not conflict with each other.
+
+    Raises:
+        ValueError: If the variant sets a python but the python_venv
+            extension is not enabled.
+    """
+    if variant.python:
+
+        if config.get('python_venv') is None:
+
+            raise ValueError(
+                'The matrix sets a python but python_venv is not enabled.'
+            )
+
+        config.python_venv.python = variant.python
+
+    if variant.buildarch:
+
+        config.core.buildarch = variant.buildarch
+
+    config.core.name = '{0}{1}'.format(config.core.name, variant.suffix)
+    if config.get('python_venv') is not None:
+
+        config.python_venv.name = '{0}{1}'.format(
+            config.python_venv.name,
+            variant.suffix,
+        )
+
+    return config
@@ -0,0 +1,116 @@
+"""Profiling of SPEC generation.
+
+Each profiled section records its wall time, the peak memory allocated while
+it ran, and a summary of the cProfile stats for the functions it called.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import contextlib
+import json
+import time
+import tracemalloc
+
+
+# The number of functions, by cumulative time, kept for each section.
+FUNCTIONS = 25
+
+
+def _summary(profile, limit=FUNCTIONS):
+    """Get the most expensive functions from a profile."""
+    import pstats
+
+    stats = pstats.Stats(profile)
+    stats.sort_stats('cumulative')
+    functions = []
+    for key in stats.fcn_list[:limit]:
+
+        calls, _, total, cumulative, _ = stats.stats[key]
+        functions.append({
+            'function': '{0}:{1}({2})'.format(*key),
+            'calls': calls,
+            'seconds': total,
+            'cumulative_seconds': cumulative,
+        })
+
+    return functions
+
+
+def _reset_peak():
+    """Reset the peak of the traced memory."""
+    if hasattr(tracemalloc, 'reset_peak'):
+
+        tracemalloc.reset_peak()
+        return
+
+    # Before python 3.9 the peak can only be reset by restarting the trace.
+    tracemalloc.stop()
+    tracemalloc.start()
+
+
+class Profiler(object):
+
+    """Collects profiles of named sections."""
+
+    def __init__(self, limit=FUNCTIONS):
+        """Initialize the profiler.
+
+        Args:
+            limit (int): The number of functions to keep for each section.
+        """
+        self.limit = limit
+        self.sections = []
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """Profile the body of the with statement as the named section."""
+        import cProfile
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+
+            tracemalloc.start()
+
+        _reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+
+            yield
+
+        finally:
+
+            profile.disable()
+            seconds = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+
+                tracemalloc.stop()
+
+            self.sections.append({
+                'name': name,
+                'seconds': seconds,
+                'peak_memory_bytes': max(0, peak - baseline),
+                'functions': _summary(profile, self.limit),
+            })
+
+    def report(self):
+        """Get the profiles as a dict suitable for JSON encoding."""
+        return {
+            'seconds': sum(section['seconds'] for section in self.sections),
+            'sections': list(self.sections),
+        }
+
+    def write(self, path):
+        """Write the report as JSON to the given path."""
+        with open(path, 'w') as report_file:
+
+            json.dump(self.report(), report_file, indent=2)
+            report_file.write('\n')
+
+        return path
@@ -5,13 +5,18 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import glob
+import gzip
 import os
 import shlex
-import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+
+from . import stage
+from . import workspace
 
 
 IGNORED_PATTERNS = (
@@ -21,40 +26,97 @@ IGNORED_PATTERNS = (
     '__pycache__',
 )
 
+# The number of lines of each output stream kept in memory for error reports
+# when rpmbuild output is captured.
+TAIL_LINES = 200
+
+# The rpmbuild stage flag of each build mode. The install mode runs the
+# SPEC up to and including %install and %check and builds no packages. The
+# source RPM which the all mode also builds is not returned.
+BUILD_MODES = collections.OrderedDict((
+    ('all', '-ba'),
+    ('binary', '-bb'),
+    ('source', '-bs'),
+    ('install', '-bi'),
+))
+
 
 class RpmProcessError(subprocess.CalledProcessError):
 
     """An exception thrown during the RPM build process.
 
     This exception extends the subprocess CalledProcessError to add standard
-    out and standard error string fields.
+    out and standard error string fields. When the output was logged then
+    these only contain the last lines of each stream and the log field is the
+    path to the complete output.
     """
 
-    def __init__(self, returncode, cmd, output=None, stdout=None, stderr=None):
+    def __init__(
+            self,
+            returncode,
+            cmd,
+            output=None,
+            stdout=None,
+            stderr=None,
+            log=None,
+    ):
         """Initialize the exception with process information."""
         super(RpmProcessError, self).__init__(returncode, cmd)
         self.output = output or ''
         self.stdout = stdout or ''
         self.stderr = stderr or ''
+        self.log = log
+
+
+class TailStream(object):
+
+    """A text stream which keeps only the last lines written to it.
+
+    Every line is also written to an optional log stream. The lock is shared
+    by the streams which write to the same log.
+    """
+
+    def __init__(self, log=None, lock=None, lines=TAIL_LINES):
+        """Initialize the stream."""
+        self._tail = collections.deque(maxlen=lines)
+        self._log = log
+        self._lock = lock
 
+    def write(self, text):
+        """Keep the text and copy it to the log."""
+        self._tail.append(text)
+        if self._log is not None:
 
-def topdir():
-    """Get the absolute path to a valid rpmbuild %_topdir."""
-    top = tempfile.mkdtemp(prefix='rpmvenv')
-    os.makedirs(os.path.join(top, 'SOURCES'))
-    os.makedirs(os.path.join(top, 'SPECS'))
-    os.makedirs(os.path.join(top, 'BUILD'))
-    os.makedirs(os.path.join(top, 'RPMS'))
-    os.makedirs(os.path.join(top, 'SRPMS'))
-    return top
+            with self._lock:
+
+                self._log.write(text)
+
+    def flush(self):
+        """Do nothing. The log is flushed when it is closed."""
+
+    def getvalue(self):
+        """Get the lines which are kept."""
+        return ''.join(self._tail)
+
+
+def topdir(root=None):
+    """Get the absolute path to a valid rpmbuild %_topdir.
+
+    Args:
+        root (str): The directory in which to create the %_topdir. The
+            default is the system temporary directory.
+    """
+    return workspace.prepare(tempfile.mkdtemp(prefix='rpmvenv', dir=root))
 
 
-def write_spec(top, spec):
+def write_spec(top, spec, *streams):
     """Write a SPEC file to the SOURCES directory.
 
     Args:
         top: The absolute path to the %_topdir.
-        spec: The contents of the SPEC file.
+        spec: The Spec which is streamed into the file as it is rendered.
+        streams: Other text streams which receive the SPEC as it is written,
+            such as an artifacts.SpecDigest.
 
     Returns:
         The absolute path to the SPEC file.
@@ -62,43 +124,139 @@ def write_spec(top, spec):
     path = os.path.join(top, 'SOURCES', 'package.spec')
     with open(path, 'w') as specfile:
 
-        specfile.write(spec)
+        spec.write(specfile, *streams)
 
     return path
 
 
-def copy_source(top, source, name=None):
+def copy_source(
+        top,
+        source,
+        name=None,
+        mode='reflink',
+        jobs=None,
+        use_git=False,
+):
     """Copy the source directory into the SOURCES directory.
 
+    Files matched by a .rpmvenvignore in the source are always skipped.
+
     Args:
         top: The absolute path to the %_topdir.
         source: The absolute path to the source directory.
         name: The name of the directory to place in SOURCES.
+        mode: How to place files in SOURCES. See stage.MODES.
+        jobs: The maximum number of files to copy concurrently.
+        use_git: Copy only the files tracked by git.
 
     Returns:
         The absolute path to the copy.
     """
     name = name or os.path.basename(source)
     path = os.path.join(top, 'SOURCES', name)
-    shutil.copytree(
+    # The index lives outside of SOURCES so that it is never packaged. It
+    # lets a reused %_topdir only re-stage the files which have changed.
+    stage.stage(
         source,
         path,
-        ignore=shutil.ignore_patterns(*IGNORED_PATTERNS),
+        ignore=IGNORED_PATTERNS,
+        mode=mode,
+        jobs=jobs,
+        index=os.path.join(top, '{0}.index'.format(name)),
+        selection=stage.Selection.from_source(source, use_git),
     )
     return path
 
 
-def verbose_popen(cmd):
+def archive_source(top, source, compression, name=None, use_git=False):
+    """Stream the source directory into a tarball in the SOURCES directory.
+
+    Files matched by a .rpmvenvignore in the source are always skipped.
+
+    Args:
+        top: The absolute path to the %_topdir.
+        source: The absolute path to the source directory.
+        compression: The compression format. See stage.COMPRESSIONS.
+        name: The name of the top level directory in the archive.
+        use_git: Archive only the files tracked by git.
+
+    Returns:
+        The absolute path to the archive.
+    """
+    name = name or os.path.basename(source)
+    return stage.archive(
+        source,
+        os.path.join(top, 'SOURCES', '{0}.tar.{1}'.format(name, compression)),
+        compression=compression,
+        ignore=IGNORED_PATTERNS,
+        arcname=name,
+        selection=stage.Selection.from_source(source, use_git),
+    )
+
+
+def forward(pipe, stream, on_line=None):
+    """Copy each line from a process pipe to a text stream as it arrives.
+
+    If on_line is given then it is called with each line as well.
+    """
+    for line in iter(pipe.readline, b''):
+
+        line = line.decode('utf8', 'replace')
+        if on_line:
+
+            on_line(line)
+
+        stream.write(line)
+        stream.flush()
+
+    pipe.close()
+
+
+def communicate(proc, stdout, stderr, on_line=None):
+    """Forward the output of a process to text streams until it exits.
+
+    Args:
+        proc (Popen): A process with piped stdout and stderr.
+        stdout: The text stream which receives standard out.
+        stderr: The text stream which receives standard error.
+        on_line (callable): Optionally called with each line of standard out.
+    """
+    readers = (
+        threading.Thread(
+            target=forward,
+            args=(proc.stdout, stdout, on_line),
+        ),
+        threading.Thread(target=forward, args=(proc.stderr, stderr)),
+    )
+    for reader in readers:
+
+        reader.start()
+
+    proc.wait()
+    for reader in readers:
+
+        reader.join()
+
+
+def verbose_popen(cmd, on_line=None):
     """Run a command with streaming output.
 
+    The output is forwarded through sys.stdout and sys.stderr rather than
+    inherited so that it follows any redirection of those streams.
+
     Args:
         cmd (str): A command to run with popen.
+        on_line (callable): Optionally called with each line of standard out.
 
     Raises:
         CalledProcessError: If the returncode is not 0.
     """
-    proc = subprocess.Popen(shlex.split(cmd))
-    proc.wait()
+    proc = subprocess.Popen(
+        shlex.split(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    communicate(proc, sys.stdout, sys.stderr, on_line)
     if proc.returncode != 0:
 
         raise subprocess.CalledProcessError(
@@ -107,11 +265,16 @@ def verbose_popen(cmd):
         )
 
 
-def quiet_popen(cmd):
+def quiet_popen(cmd, on_line=None, log=None):
     """Run a command with captured output.
 
+    Only the last lines of output are kept in memory. All of it is streamed
+    to the log file, if given, as gzip compressed text.
+
     Args:
         cmd (str): A command to run with popen.
+        on_line (callable): Optionally called with each line of standard out.
+        log (str): Optional path of the compressed log file to write.
 
     Raises:
         RpmProcessError: If the returncode is not 0.
@@ -121,19 +284,40 @@ def quiet_popen(cmd):
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
-    out, err = proc.communicate()
+    log_file = gzip.open(log, 'wt') if log else None
+    try:
+
+        lock = threading.Lock()
+        out = TailStream(log_file, lock)
+        err = TailStream(log_file, lock)
+        communicate(proc, out, err, on_line)
+
+    finally:
+
+        if log_file:
+
+            log_file.close()
+
     if proc.returncode != 0:
 
         raise RpmProcessError(
             returncode=proc.returncode,
             cmd=cmd,
-            output=err,
-            stdout=out,
-            stderr=err,
+            output=err.getvalue(),
+            stdout=out.getvalue(),
+            stderr=err.getvalue(),
+            log=log,
         )
 
 
-def build(specfile, top=None, verbose=False):
+def build(
+        specfile,
+        top=None,
+        verbose=False,
+        on_line=None,
+        mode='all',
+        buildroot=None,
+):
     """Run rpmbuild with options.
 
     Args:
@@ -142,13 +326,24 @@ def build(specfile, top=None, verbose=False):
             directory which is automatically generated.
         verbose: Whether or not to stream the rpmbuild output in real time
             or only during errors.
+        on_line: Optionally called with each line of rpmbuild standard out.
+        mode: The name of the build mode from BUILD_MODES.
+        buildroot: The absolute path of the buildroot, which overrides the
+            BuildRoot of the SPEC.
+
+    When the output is not streamed it is logged to rpmbuild.log.gz in the
+    %_topdir.
 
     Returns:
-        The absolute path to the new RPM.
+        A tuple of the absolute paths to the new RPMs, which is more than one
+        when the SPEC has subpackages. Only the source RPM is returned in the
+        source mode and nothing in the install mode.
     """
     top = top or topdir()
-    cmd = "rpmbuild -ba --define='_topdir {0}' {1}".format(
+    cmd = "rpmbuild {0} --define='_topdir {1}' {2}{3}".format(
+        BUILD_MODES[mode],
         top,
+        "--buildroot='{0}' ".format(buildroot) if buildroot else '',
         specfile,
     ).encode('ascii')
     # PY3 shlex only works with unicode strings. Convert as needed.
@@ -158,10 +353,14 @@ def build(specfile, top=None, verbose=False):
 
     if not verbose:
 
-        quiet_popen(cmd)
+        quiet_popen(cmd, on_line, os.path.join(top, 'rpmbuild.log.gz'))
 
     else:
 
-        verbose_popen(cmd)
+        verbose_popen(cmd, on_line)
+
+    if mode == 'source':
+
+        return tuple(sorted(glob.glob(os.path.join(top, 'SRPMS', '*.rpm'))))
 
-    return glob.glob(os.path.join(top, 'RPMS', '**', '*.rpm')).pop()
+    return tuple(sorted(glob.glob(os.path.join(top, 'RPMS', '**', '*.rpm'))))
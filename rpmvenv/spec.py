@@ -19,11 +19,16 @@ class Blocks(object):
     def __init__(self):
         """Initialize the blocks container."""
         self._blocks = {}
+        self._arguments = {}
 
     def get(self, name):
         """Get the block content by name."""
         return self._blocks.setdefault(name, [])
 
+    def arguments(self, name):
+        """Get the arguments written after the block name in its header."""
+        return self._arguments.setdefault(name, [])
+
     def add(self, name, line):
         """Add a line to a block by name."""
         return self.get(name).append(line)
@@ -100,6 +105,18 @@ class Spec(object):
         """Generate a string representation of the SPEC file."""
         return template.get('spec').render(spec=self)
 
+    def stream(self):
+        """Generate the SPEC file in chunks without holding all of it."""
+        return template.get('spec').generate(spec=self)
+
+    def write(self, *streams):
+        """Write the SPEC file to each text stream as it is rendered."""
+        for chunk in self.stream():
+
+            for stream in streams:
+
+                stream.write(chunk)
+
     def __repr__(self):
         """Generate a readable representation of the SPEC file."""
         return str(self)
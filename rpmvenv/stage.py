@@ -0,0 +1,591 @@
+"""Tools for staging a source tree into the rpmbuild SOURCES directory."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import fnmatch
+import json
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+
+try:
+
+    import fcntl
+
+except ImportError:  # pragma: no cover
+
+    fcntl = None
+
+
+# The ioctl request number for FICLONE from linux/fs.h. Filesystems such as
+# btrfs and xfs use this to share extents between two files until one of them
+# is written.
+FICLONE = 0x40049409
+
+MODES = (
+    'copy',
+    'reflink',
+    'hardlink',
+    'clone',
+)
+
+# Compression formats for source archives. The zst format is written through
+# the zstd command because the tarfile module does not support it.
+COMPRESSIONS = (
+    'gz',
+    'bz2',
+    'xz',
+    'zst',
+)
+
+# The name of the file, in the root of a source tree, which lists patterns of
+# files to leave out of the staged source. It follows gitignore semantics.
+IGNORE_FILE = '.rpmvenvignore'
+
+
+def _translate(pattern):
+    """Convert a gitignore style glob into a regex string."""
+    result = []
+    position = 0
+    while position < len(pattern):
+
+        char = pattern[position]
+        if pattern.startswith('**/', position):
+
+            result.append('(?:.*/)?')
+            position += 3
+            continue
+
+        if pattern.startswith('/**', position) and (
+                position + 3 == len(pattern)
+        ):
+
+            result.append('/.*')
+            position += 3
+            continue
+
+        if pattern.startswith('**', position):
+
+            result.append('.*')
+            position += 2
+            continue
+
+        if char == '*':
+
+            result.append('[^/]*')
+
+        elif char == '?':
+
+            result.append('[^/]')
+
+        elif char == '[' and ']' in pattern[position + 2:]:
+
+            end = pattern.index(']', position + 2)
+            content = pattern[position + 1:end]
+            if content.startswith('!'):
+
+                content = '^' + content[1:]
+
+            result.append('[{0}]'.format(content.replace('\\', '\\\\')))
+            position = end
+
+        elif char == '\\' and position + 1 < len(pattern):
+
+            position += 1
+            result.append(re.escape(pattern[position]))
+
+        else:
+
+            result.append(re.escape(char))
+
+        position += 1
+
+    return ''.join(result)
+
+
+class IgnoreRules(object):
+
+    """A set of patterns which follow gitignore semantics."""
+
+    def __init__(self, lines=()):
+        """Initialize the rules from the lines of an ignore file."""
+        self._rules = []
+        for line in lines:
+
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+
+                continue
+
+            if not line.endswith('\\ '):
+
+                line = line.rstrip()
+
+            negate = line.startswith('!')
+            if negate:
+
+                line = line[1:]
+
+            if line.startswith('\\#') or line.startswith('\\!'):
+
+                line = line[1:]
+
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            # Patterns with a separator are relative to the root. All others
+            # match a name at any depth.
+            anchored = '/' in line
+            regex = _translate(line.lstrip('/'))
+            if not anchored:
+
+                regex = '(?:.*/)?' + regex
+
+            self._rules.append(
+                (re.compile('^{0}$'.format(regex)), negate, dir_only)
+            )
+
+    @classmethod
+    def from_file(cls, path):
+        """Load rules from a file. Missing files produce no rules."""
+        if not os.path.isfile(path):
+
+            return cls()
+
+        with open(path, 'r') as ignore_file:
+
+            return cls(ignore_file.readlines())
+
+    def __bool__(self):
+        """Get whether there are any rules."""
+        return bool(self._rules)
+
+    __nonzero__ = __bool__
+
+    def ignored(self, path, is_dir=False):
+        """Get whether a path, relative to the root, is ignored."""
+        path = path.replace(os.sep, '/')
+        result = False
+        for regex, negate, dir_only in self._rules:
+
+            if dir_only and not is_dir:
+
+                continue
+
+            if regex.match(path):
+
+                result = not negate
+
+        return result
+
+
+def git_files(source):
+    """Get the files under source which are tracked by git.
+
+    Raises:
+        CalledProcessError: If source is not within a git work tree.
+
+    Returns:
+        frozenset of str: Paths relative to source.
+    """
+    output = subprocess.check_output(
+        ('git', 'ls-files', '-z', '--cached', '--recurse-submodules'),
+        cwd=source,
+    )
+    return frozenset(
+        os.path.normpath(path.decode('utf8'))
+        for path in output.split(b'\0') if path
+    )
+
+
+class Selection(object):
+
+    """Decides which paths of a source tree are staged."""
+
+    def __init__(self, rules=None, files=None):
+        """Initialize the selection.
+
+        Args:
+            rules (IgnoreRules): Optional rules for paths to leave out.
+            files (iter of str): Optional relative paths of the only files to
+                include, such as those tracked by git.
+        """
+        self._rules = rules
+        self._files = frozenset(files) if files is not None else None
+        self._dirs = None
+        if self._files is not None:
+
+            self._dirs = set()
+            for path in self._files:
+
+                path = os.path.dirname(path)
+                while path and path not in self._dirs:
+
+                    self._dirs.add(path)
+                    path = os.path.dirname(path)
+
+    @classmethod
+    def from_source(cls, source, use_git=False):
+        """Create a selection from the ignore file and, optionally, git."""
+        return cls(
+            rules=IgnoreRules.from_file(os.path.join(source, IGNORE_FILE)),
+            files=git_files(source) if use_git else None,
+        )
+
+    def includes(self, path, is_dir=False):
+        """Get whether a relative path should be staged."""
+        if self._rules and self._rules.ignored(path, is_dir):
+
+            return False
+
+        if self._files is None:
+
+            return True
+
+        return path in (self._dirs if is_dir else self._files)
+
+
+def reflink(src, dst):
+    """Clone the contents of src into dst using the FICLONE ioctl.
+
+    Args:
+        src (str): The path of the file to clone.
+        dst (str): The path of the new file.
+
+    Raises:
+        OSError: If the filesystem, or platform, does not support reflinks.
+    """
+    if fcntl is None:
+
+        raise OSError('Reflinks are not supported on this platform.')
+
+    with open(src, 'rb') as src_file:
+
+        try:
+
+            with open(dst, 'wb') as dst_file:
+
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+
+        except (IOError, OSError):
+
+            os.unlink(dst)
+            raise
+
+    shutil.copystat(src, dst)
+
+
+def stage_file(src, dst, mode='reflink'):
+    """Place a single file at dst using the cheapest supported method.
+
+    Args:
+        src (str): The path of the source file.
+        dst (str): The path at which to stage the file.
+        mode (str): One of MODES. Both 'reflink' and 'hardlink' fall back to
+            a regular copy when the filesystem does not support them. The
+            'clone' mode tries a reflink, then a hardlink, and then a copy.
+    """
+    # The destination may be a hardlink to the source from a previous run.
+    # Writing through it would modify the original file so it is always
+    # replaced rather than overwritten.
+    if os.path.lexists(dst):
+
+        os.unlink(dst)
+
+    if mode in ('reflink', 'clone'):
+
+        try:
+
+            reflink(src, dst)
+            return None
+
+        except (IOError, OSError):
+
+            pass
+
+    if mode in ('hardlink', 'clone'):
+
+        try:
+
+            os.link(src, dst)
+            return None
+
+        except OSError:
+
+            pass
+
+    shutil.copy2(src, dst)
+    return None
+
+
+def scan(source, ignore=(), selection=None):
+    """Get the files and directories which make up a source tree.
+
+    Args:
+        source (str): The absolute path to the source directory.
+        ignore (iter of str): Glob patterns matched against each base name.
+            Matching files and directories are skipped entirely.
+        selection (Selection): Optional filter of relative paths.
+
+    Returns:
+        tuple: A tuple of the relative directory paths and a mapping of
+            relative file path to a (size, mtime, inode) signature.
+    """
+    dirs = []
+    files = {}
+    pending = ['']
+    while pending:
+
+        current = pending.pop()
+        for entry in os.scandir(os.path.join(source, current)):
+
+            if any(fnmatch.fnmatch(entry.name, pat) for pat in ignore):
+
+                continue
+
+            path = os.path.join(current, entry.name)
+            is_dir = entry.is_dir()
+            if selection and not selection.includes(path, is_dir):
+
+                continue
+
+            if is_dir:
+
+                dirs.append(path)
+                pending.append(path)
+                continue
+
+            stat = entry.stat()
+            files[path] = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    return dirs, files
+
+
+def load_index(path):
+    """Load a staging index written by a previous call to stage.
+
+    Returns:
+        dict: A mapping of relative file path to signature. The mapping is
+            empty if there is no index or it cannot be read.
+    """
+    if not path or not os.path.exists(path):
+
+        return {}
+
+    try:
+
+        with open(path, 'r') as index_file:
+
+            return json.load(index_file)
+
+    except (IOError, OSError, ValueError):
+
+        return {}
+
+
+def write_index(path, files):
+    """Persist the signatures of a staged tree."""
+    tmp = '{0}.tmp'.format(path)
+    with open(tmp, 'w') as index_file:
+
+        json.dump(files, index_file)
+
+    os.rename(tmp, path)
+
+
+def prune(destination, dirs, files):
+    """Remove anything from a staged tree that is not part of the source.
+
+    This covers files deleted from the source since the last run as well as
+    any build output written into the staged tree by a previous rpmbuild.
+    """
+    dirs = set(dirs)
+    pending = ['']
+    while pending:
+
+        current = pending.pop()
+        for entry in os.scandir(os.path.join(destination, current)):
+
+            path = os.path.join(current, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+
+                if path in dirs:
+
+                    pending.append(path)
+                    continue
+
+                shutil.rmtree(entry.path)
+                continue
+
+            if path not in files:
+
+                os.unlink(entry.path)
+
+
+def stage(
+        source,
+        destination,
+        ignore=(),
+        mode='reflink',
+        jobs=None,
+        index=None,
+        selection=None,
+):
+    """Stage a source tree into a destination directory.
+
+    Files are reflinked, hardlinked, or copied depending on the mode and what
+    the filesystem supports. Copies run in parallel. If an index path is given
+    and the destination already exists then only the files whose signature
+    changed since the last run are staged again and files which no longer
+    exist in the source are removed.
+
+    Args:
+        source (str): The absolute path to the source directory.
+        destination (str): The absolute path to the staged directory.
+        ignore (iter of str): Glob patterns of base names to skip.
+        mode (str): One of MODES.
+        jobs (int): The maximum number of files to stage concurrently. The
+            default is chosen by concurrent.futures.
+        index (str): Optional path to a file used to track the staged tree
+            between runs.
+        selection (Selection): Optional filter of relative paths.
+
+    Returns:
+        str: The destination path.
+    """
+    if mode not in MODES:
+
+        raise ValueError(
+            'Unknown staging mode {0}. Choices are {1}.'.format(mode, MODES)
+        )
+
+    dirs, files = scan(source, ignore, selection)
+
+    previous = {}
+    if os.path.isdir(destination):
+
+        previous = load_index(index)
+        prune(destination, dirs, files)
+
+    else:
+
+        os.makedirs(destination)
+
+    for path in dirs:
+
+        target = os.path.join(destination, path)
+        if not os.path.isdir(target):
+
+            os.makedirs(target)
+
+    changed = tuple(
+        path for path, signature in files.items()
+        if previous.get(path) != signature
+        or not os.path.lexists(os.path.join(destination, path))
+    )
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+
+        tuple(pool.map(
+            lambda path: stage_file(
+                os.path.join(source, path),
+                os.path.join(destination, path),
+                mode,
+            ),
+            changed,
+        ))
+
+    if index:
+
+        write_index(index, files)
+
+    return destination
+
+
+def archive(
+        source,
+        path,
+        compression='gz',
+        ignore=(),
+        arcname=None,
+        selection=None,
+):
+    """Stream a source tree into a compressed tar archive.
+
+    Entries are written one at a time straight into the compressor so the
+    archive is never held in memory and no intermediate copy is made.
+
+    Args:
+        source (str): The absolute path to the source directory.
+        path (str): The path of the archive to write.
+        compression (str): One of COMPRESSIONS.
+        ignore (iter of str): Glob patterns of base names to skip.
+        arcname (str): The name of the top level directory in the archive.
+            The default is the base name of the source.
+        selection (Selection): Optional filter of relative paths.
+
+    Returns:
+        str: The archive path.
+
+    Raises:
+        CalledProcessError: If the zstd command fails.
+    """
+    if compression not in COMPRESSIONS:
+
+        raise ValueError(
+            'Unknown compression {0}. Choices are {1}.'.format(
+                compression,
+                COMPRESSIONS,
+            )
+        )
+
+    arcname = arcname or os.path.basename(source)
+    dirs, files = scan(source, ignore, selection)
+    members = [''] + sorted(dirs) + sorted(files)
+
+    proc = None
+    if compression == 'zst':
+
+        proc = subprocess.Popen(
+            ('zstd', '--quiet', '--force', '-T0', '-o', path),
+            stdin=subprocess.PIPE,
+        )
+        tar = tarfile.open(fileobj=proc.stdin, mode='w|', dereference=True)
+
+    else:
+
+        tar = tarfile.open(
+            path,
+            mode='w|{0}'.format(compression),
+            dereference=True,
+        )
+
+    try:
+
+        for member in members:
+
+            tar.add(
+                os.path.join(source, member),
+                arcname=os.path.join(arcname, member).rstrip(os.sep),
+                recursive=False,
+            )
+
+    finally:
+
+        tar.close()
+        if proc:
+
+            proc.stdin.close()
+            if proc.wait() != 0:
+
+                raise subprocess.CalledProcessError(
+                    returncode=proc.returncode,
+                    cmd='zstd',
+                )
+
+    return path
@@ -7,12 +7,61 @@ from __future__ import unicode_literals
 
 import os
 
-import jinja2
+from . import cache
 
 
-ENV = jinja2.Environment(
-    loader=jinja2.PackageLoader('rpmvenv', 'templates'),
-)
+# The directory of the built-in templates.
+BUILTIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# The jinja2 environment for each template directory. Each is created on
+# first use so that importing rpmvenv does not import jinja2 and then reused
+# so that a template is only compiled once in a process.
+ENVIRONMENTS = {}
+
+
+def bytecode_cache():
+    """Get the on-disk cache of compiled templates.
+
+    Compiled templates are stored in the rpmvenv cache directory so that
+    later processes skip the compile. The cache is keyed by the template
+    source so that changed templates are compiled again.
+
+    Returns:
+        jinja2.FileSystemBytecodeCache: The cache or None if the cache
+            directory cannot be created.
+    """
+    import jinja2
+
+    directory = os.path.join(cache.directory(), 'templates')
+    try:
+
+        if not os.path.isdir(directory):
+
+            os.makedirs(directory)
+
+    except OSError:
+
+        return None
+
+    return jinja2.FileSystemBytecodeCache(directory)
+
+
+def environment(directory=BUILTIN):
+    """Get the jinja2 environment for a directory of templates."""
+    env = ENVIRONMENTS.get(directory)
+    if env is None:
+
+        import jinja2
+
+        # The templates are loaded from the package directory rather than
+        # with a PackageLoader because some jinja2 versions import
+        # pkg_resources to support it.
+        env = ENVIRONMENTS[directory] = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(directory),
+            bytecode_cache=bytecode_cache(),
+        )
+
+    return env
 
 
 def get(name):
@@ -30,14 +79,14 @@ def get(name):
     Raises:
         jinja2.TemplateNotFound: If no template can be resolved.
     """
+    import jinja2
+
     try:
 
-        return ENV.get_template(name)
+        return environment().get_template(name)
 
     except jinja2.TemplateNotFound:
 
-        package_dir = os.path.dirname(os.path.abspath(name))
-        name = os.path.basename(name)
-        return jinja2.Environment(
-            loader=jinja2.FileSystemLoader(package_dir),
-        ).get_template(name)
+        return environment(
+            os.path.dirname(os.path.abspath(name)),
+        ).get_template(os.path.basename(name))
@@ -0,0 +1,289 @@
+"""Per-phase timing of rpmbuild runs.
+
+The SPEC is instrumented with lines which echo a marker and a timestamp at
+the start and end of each build time block and before each install step. The
+markers are parsed from the rpmbuild output and turned into a report of the
+wall time spent in each phase and step. Time after the end of the install
+block, spent in the rpm brp scripts and in packaging, is reported as its own
+phase. It ends at the marker which begins the clean block, which rpmbuild
+runs once the packages are written, or at the end of rpmbuild. Time spent in
+the check block is not part of it.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import re
+import threading
+import time
+
+
+MARKER = '##rpmvenv-timing##'
+
+# Blocks which run at build time, in the order rpmbuild runs them. Install
+# scriptlets such as %post run on the target system and are never timed.
+PHASES = ('prep', 'build', 'install', 'check', 'clean')
+
+# Blocks which also get a marker before each step.
+STEP_PHASES = ('install',)
+
+# Lines which continue a compound command and must directly follow the
+# lines before them.
+CONTINUATIONS = (
+    'do', 'done', 'elif', 'else', 'esac', 'fi', 'then', ';;', '}', ')',
+)
+
+_MARKER_LINE = re.compile(
+    r'^{0} (?P<phase>\S+) (?P<step>\S+) (?P<time>[0-9.]+)$'.format(
+        re.escape(MARKER),
+    )
+)
+_HEREDOC = re.compile(r'<<-?\s*[\'"]?(?P<delimiter>\w+)[\'"]?')
+
+
+def marker(phase, step):
+    """Get a SPEC line which echoes a marker for a phase and step.
+
+    The percent signs are doubled so that rpm does not treat the date format
+    as macros.
+    """
+    return 'echo "{0} {1} {2} $(date +%%s.%%N)"'.format(MARKER, phase, step)
+
+
+def _steps(lines):
+    """Get the positions of the lines which may be preceded by a marker."""
+    heredoc = None
+    case_depth = 0
+    continued = False
+    for position, line in enumerate(lines):
+
+        stripped = line.strip()
+        if heredoc is not None:
+
+            if stripped == heredoc:
+
+                heredoc = None
+
+            continue
+
+        first = stripped.split(' ', 1)[0]
+        if (
+                stripped and
+                not stripped.startswith('#') and
+                not continued and
+                not case_depth and
+                first not in CONTINUATIONS
+        ):
+
+            yield position
+
+        if first == 'case':
+
+            case_depth += 1
+
+        if first == 'esac' or stripped.endswith(' esac'):
+
+            case_depth = max(0, case_depth - 1)
+
+        match = _HEREDOC.search(line)
+        if match and not stripped.startswith('#'):
+
+            heredoc = match.group('delimiter')
+
+        continued = stripped.endswith('\\')
+
+
+class Recorder(object):
+
+    """Instruments a SPEC and collects the timings of a build."""
+
+    def __init__(self):
+        """Initialize an empty recorder."""
+        self.steps = {}
+        self.events = []
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def instrument(self, spec):
+        """Get a copy of the spec with timing markers added.
+
+        Args:
+            spec (Spec): The SPEC to instrument.
+
+        Returns:
+            Spec: The instrumented copy.
+        """
+        spec = spec.copy()
+        blocks = dict(spec.blocks)
+        for phase in PHASES:
+
+            # Getting a missing block would add an empty section to the SPEC.
+            lines = blocks.get(phase)
+            if not lines:
+
+                continue
+
+            timed = [marker(phase, 'begin')]
+            steps = (
+                frozenset(_steps(lines))
+                if phase in STEP_PHASES
+                else frozenset()
+            )
+            for position, line in enumerate(lines):
+
+                if position in steps:
+
+                    step = len(self.steps.setdefault(phase, []))
+                    self.steps[phase].append(line.strip())
+                    timed.append(marker(phase, step))
+
+                timed.append(line)
+
+            timed.append(marker(phase, 'end'))
+            lines[:] = timed
+
+        return spec
+
+    def start(self):
+        """Record the start of the rpmbuild process."""
+        self.started = time.time()
+
+    def stop(self):
+        """Record the end of the rpmbuild process."""
+        self.finished = time.time()
+
+    def feed(self, line):
+        """Record any marker in a line of rpmbuild output."""
+        match = _MARKER_LINE.match(line.strip())
+        if not match:
+
+            return
+
+        with self._lock:
+
+            self.events.append((
+                match.group('phase'),
+                match.group('step'),
+                float(match.group('time')),
+            ))
+
+    @staticmethod
+    def _package(events, finished):
+        """Get the seconds spent in rpm's own work after the install block.
+
+        This is the brp scripts which are appended to %install, file
+        processing, and packaging. It starts at the end marker of the
+        install block and ends at the begin marker of the clean block or at
+        the end of rpmbuild. The time of any block in between, such as
+        %check, is excluded.
+
+        Args:
+            events (list): The sorted events starting with the install end.
+            finished (float): The time at which rpmbuild finished.
+        """
+        started = events[0][2]
+        ended = next(
+            (
+                stamp for phase, step, stamp in events
+                if phase == 'clean' and step == 'begin'
+            ),
+            finished,
+        )
+        excluded = 0.0
+        begun = {}
+        for phase, step, stamp in events[1:]:
+
+            if stamp > ended:
+
+                break
+
+            if step == 'begin':
+
+                begun[phase] = stamp
+
+            elif step == 'end' and phase in begun:
+
+                excluded += stamp - begun.pop(phase)
+
+        return ended - started - excluded
+
+    def report(self):
+        """Get the timings as a dict suitable for JSON encoding.
+
+        Returns:
+            dict: The total time and a list of phases. Each phase has a name,
+                the seconds spent in it, and for step phases the seconds
+                spent in each step.
+        """
+        events = sorted(self.events, key=lambda event: event[2])
+        finished = self.finished or (events[-1][2] if events else 0)
+        started = self.started or (events[0][2] if events else finished)
+        phases = []
+        if events:
+
+            phases.append({
+                'name': 'startup',
+                'seconds': max(0.0, events[0][2] - started),
+            })
+
+        for position, (phase, step, stamp) in enumerate(events):
+
+            following = (
+                events[position + 1][2]
+                if position + 1 < len(events)
+                else finished
+            )
+            if step == 'begin':
+
+                ends = tuple(
+                    event[2] for event in events[position:]
+                    if event[0] == phase and event[1] == 'end'
+                )
+                phases.append({
+                    'name': phase,
+                    'seconds': (ends[0] if ends else finished) - stamp,
+                })
+                if phase in self.steps:
+
+                    phases[-1]['steps'] = []
+
+                continue
+
+            if step == 'end':
+
+                if phase == 'install':
+
+                    phases.append({
+                        'name': 'package',
+                        'seconds': self._package(events[position:], finished),
+                    })
+
+                continue
+
+            if phases and phases[-1]['name'] == phase and (
+                    'steps' in phases[-1]
+            ):
+
+                phases[-1]['steps'].append({
+                    'index': int(step),
+                    'command': self.steps[phase][int(step)],
+                    'seconds': following - stamp,
+                })
+
+        return {
+            'seconds': finished - started,
+            'phases': phases,
+        }
+
+    def write(self, path):
+        """Write the report as JSON to the given path."""
+        with open(path, 'w') as report_file:
+
+            json.dump(self.report(), report_file, indent=2)
+            report_file.write('\n')
+
+        return path
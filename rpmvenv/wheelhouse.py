@@ -0,0 +1,107 @@
+"""Functions for building a local wheelhouse for offline installs."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import sys
+
+from . import lock
+
+
+# Installing a project from source under --no-index still needs the build
+# backend. These are added to every wheelhouse so that the isolated build
+# environment can be populated without an index.
+BUILD_REQUIREMENTS = (
+    'setuptools',
+    'wheel',
+)
+
+
+def command(
+        path,
+        requirements=(),
+        python=None,
+        pip_flags=(),
+        extra=BUILD_REQUIREMENTS,
+):
+    """Get the pip command which builds a wheelhouse.
+
+    Args:
+        path (str): The directory in which to place the wheels.
+        requirements (iter of str): Paths to requirements files.
+        python (str): The interpreter for which to build the wheels. The
+            default is the current interpreter.
+        pip_flags (iter of str): Additional flags to pass to pip.
+        extra (iter of str): Requirements to build in addition to the
+            requirements files. The default is the build backend.
+
+    Returns:
+        list of str: The command arguments.
+    """
+    cmd = [
+        python or sys.executable,
+        '-m',
+        'pip',
+        'wheel',
+        '--wheel-dir={0}'.format(path),
+    ]
+    for flag in pip_flags:
+
+        cmd.extend(flag.split())
+
+    for requirement in requirements:
+
+        cmd.extend(('-r', requirement))
+
+    cmd.extend(extra)
+    return cmd
+
+
+def build(
+        path,
+        source,
+        requirements=(),
+        python=None,
+        pip_flags=(),
+        lock_file=None,
+        update_lock=False,
+):
+    """Build every requirement into a wheelhouse.
+
+    Requirements paths are resolved relative to the source directory. When a
+    lock file is given the wheels are built from the lock rather than the
+    requirements. If update_lock is also given then the hashes of the built
+    wheels are added to the lock so that they pass the hash check on
+    install. Otherwise the lock file is left as it is.
+
+    Raises:
+        CalledProcessError: If pip fails.
+    """
+    if not os.path.isdir(path):
+
+        os.makedirs(path)
+
+    if not lock_file:
+
+        subprocess.check_call(
+            command(path, requirements, python, pip_flags),
+            cwd=source,
+        )
+        return path
+
+    # The build backend is not in the lock and pip refuses unhashed
+    # requirements alongside hashed ones so it is built separately.
+    subprocess.check_call(
+        command(path, (lock_file,), python, pip_flags, extra=()),
+        cwd=source,
+    )
+    subprocess.check_call(command(path, (), python, pip_flags), cwd=source)
+    if update_lock:
+
+        lock.add_hashes(lock_file, path)
+
+    return path
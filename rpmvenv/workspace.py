@@ -0,0 +1,427 @@
+"""Management of the directories in which rpmbuild runs.
+
+A workspace hands out rpmbuild %_topdir directories below a root directory
+and removes them once the build is done. The build directory of a failed
+build, or only its rpmbuild log, is kept for inspection and only the most
+recent of those are retained. A workspace may also keep a small pool of
+build directories for each source which later builds reuse. A reused directory
+keeps its staged SOURCES, with their staging index, and its BUILD tree so
+that only the files which changed are staged again. Each pooled directory is
+held under an exclusive file lock while it is in use so that concurrent
+rpmvenv processes never share one. The directories which a workspace creates
+are only accessible by the current user.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import contextlib
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+
+try:
+
+    import fcntl
+
+except ImportError:  # pragma: no cover
+
+    fcntl = None
+
+
+POOL_DIR = 'rpmvenv-pool'
+
+# The number of pooled directories kept for each source. Builds beyond it
+# use a new directory which is removed afterwards.
+POOL_SLOTS = 4
+
+SUBDIRS = (
+    'SOURCES',
+    'SPECS',
+    'BUILD',
+    'RPMS',
+    'SRPMS',
+)
+
+# The directories which hold the output of a build and are emptied before a
+# pooled directory is reused.
+OUTPUT_DIRS = (
+    'SPECS',
+    'RPMS',
+    'SRPMS',
+)
+
+LOG_FILE = 'rpmbuild.log.gz'
+
+# Failed builds which are kept, or their logs, are moved into this directory
+# of the workspace root. Only the most recent of them are kept.
+FAILED_DIR = 'rpmvenv-failed'
+FAILED_KEPT = 10
+
+
+def prepare(top):
+    """Create the rpmbuild directories in a %_topdir and empty the output.
+
+    Returns:
+        str: The %_topdir.
+    """
+    for name in SUBDIRS:
+
+        path = os.path.join(top, name)
+        if name in OUTPUT_DIRS and os.path.isdir(path):
+
+            shutil.rmtree(path)
+
+        if not os.path.isdir(path):
+
+            os.makedirs(path)
+
+    log = os.path.join(top, LOG_FILE)
+    if os.path.exists(log):
+
+        os.unlink(log)
+
+    return top
+
+
+def prune(path, kept=FAILED_KEPT):
+    """Remove all but the most recently modified entries of a directory.
+
+    Returns:
+        tuple of str: The paths which were removed.
+    """
+    entries = sorted(
+        (os.path.join(path, name) for name in os.listdir(path)),
+        key=_mtime,
+        reverse=True,
+    )
+    for entry in entries[kept:]:
+
+        if os.path.isdir(entry) and not os.path.islink(entry):
+
+            shutil.rmtree(entry, ignore_errors=True)
+            continue
+
+        try:
+
+            os.unlink(entry)
+
+        except OSError:
+
+            # Another build sharing the workspace removed it first.
+            pass
+
+    return tuple(entries[kept:])
+
+
+def _mtime(path):
+    """Get the modification time of a path which may have been removed."""
+    try:
+
+        return os.path.getmtime(path)
+
+    except OSError:
+
+        return 0
+
+
+def private_dir(path):
+    """Create a directory which only the current user may access.
+
+    Returns:
+        str: The path of the directory.
+
+    Raises:
+        OSError: If the path exists but is not a directory of the current
+            user which is closed to other users, such as one which another
+            user created first.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.lstat(path)
+    if (
+            not stat.S_ISDIR(status.st_mode) or
+            status.st_uid != os.getuid() or
+            status.st_mode & 0o077
+    ):
+
+        raise OSError('{0} is not a private directory.'.format(path))
+
+    return path
+
+
+def default_root():
+    """Get a workspace root in the system temporary directory.
+
+    The root belongs to the current user so that pooled directories are
+    reused between builds. A new private directory is used if it cannot be
+    trusted.
+    """
+    try:
+
+        return private_dir(os.path.join(
+            tempfile.gettempdir(),
+            'rpmvenv-{0}'.format(os.getuid()),
+        ))
+
+    except OSError:
+
+        return tempfile.mkdtemp(prefix='rpmvenv-')
+
+
+def _lock(path):
+    """Take an exclusive lock on a file without waiting for it.
+
+    Returns:
+        file: The open lock file or None if another process holds the lock.
+    """
+    while True:
+
+        try:
+
+            lock_file = open(path, 'a')
+
+        except FileNotFoundError:
+
+            private_dir(os.path.dirname(path))
+            continue
+
+        try:
+
+            if fcntl is not None:
+
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        except (IOError, OSError):
+
+            lock_file.close()
+            return None
+
+        try:
+
+            current = os.stat(path).st_ino
+
+        except OSError:
+
+            current = None
+
+        if current == os.fstat(lock_file.fileno()).st_ino:
+
+            return lock_file
+
+        # The file was removed by Workspace.clean before it was locked so
+        # the lock guards nothing. Lock the file which replaced it instead.
+        _unlock(lock_file)
+
+
+def _unlock(lock_file):
+    """Release and close a file from _lock."""
+    if fcntl is not None:
+
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    lock_file.close()
+
+
+class Workspace(object):
+
+    """Allocate rpmbuild %_topdir directories below a root directory."""
+
+    def __init__(
+            self,
+            root=None,
+            keep_failed=False,
+            reuse=False,
+            slots=POOL_SLOTS,
+    ):
+        """Initialize the workspace.
+
+        Args:
+            root (str): The directory in which to create build directories.
+                The default is a directory of the current user in the system
+                temporary directory.
+            keep_failed (bool): Whether to keep the build directory of a
+                failed build.
+            reuse (bool): Whether to keep a pool of build directories for
+                each source and reuse them between builds.
+            slots (int): The number of pooled directories for each source.
+        """
+        self.root = os.path.abspath(root) if root else default_root()
+        self.keep_failed = keep_failed
+        self.reuse = reuse
+        self.slots = slots
+        if not os.path.isdir(self.root):
+
+            os.makedirs(self.root)
+
+    def mkdtemp(self):
+        """Create a new temporary directory in the workspace root."""
+        return tempfile.mkdtemp(prefix='rpmvenv', dir=self.root)
+
+    @contextlib.contextmanager
+    def _acquire(self, key):
+        """Lock and yield the first free pooled directory for a key.
+
+        None is yielded when every slot is in use or the pool directory
+        cannot be used safely.
+        """
+        try:
+
+            pool = private_dir(os.path.join(self.root, POOL_DIR))
+
+        except OSError:
+
+            yield None
+            return
+
+        pool = os.path.join(
+            pool,
+            hashlib.sha256(key.encode('utf8')).hexdigest()[:16],
+        )
+        for slot in range(self.slots):
+
+            lock_file = _lock(os.path.join(pool, '{0}.lock'.format(slot)))
+            if lock_file is None:
+
+                continue
+
+            try:
+
+                yield os.path.join(pool, str(slot))
+
+            finally:
+
+                _unlock(lock_file)
+
+            return
+
+        yield None
+
+    def clean(self):
+        """Remove the pooled directories which no build is using.
+
+        Returns:
+            int: The number of directories removed.
+        """
+        pool = os.path.join(self.root, POOL_DIR)
+        if not os.path.isdir(pool):
+
+            return 0
+
+        removed = 0
+        for key in os.listdir(pool):
+
+            directory = os.path.join(pool, key)
+            for name in os.listdir(directory):
+
+                if not name.endswith('.lock'):
+
+                    continue
+
+                path = os.path.join(directory, name)
+                lock_file = _lock(path)
+                if lock_file is None:
+
+                    continue
+
+                try:
+
+                    shutil.rmtree(path[:-len('.lock')], ignore_errors=True)
+                    os.unlink(path)
+                    removed += 1
+
+                finally:
+
+                    _unlock(lock_file)
+
+            try:
+
+                os.rmdir(directory)
+
+            except OSError:
+
+                # A build is still using one of its directories.
+                pass
+
+        return removed
+
+    def _keep_failure(self, top, exc):
+        """Move a failed %_topdir, or only its log, into the FAILED_DIR."""
+        failed = private_dir(os.path.join(self.root, FAILED_DIR))
+        log = getattr(exc, 'log', None)
+        if self.keep_failed:
+
+            kept = os.path.join(failed, os.path.basename(top))
+            os.rename(top, kept)
+            os.utime(kept)
+            if log and os.path.dirname(log) == top:
+
+                exc.log = os.path.join(kept, os.path.basename(log))
+
+        elif log and os.path.exists(log):
+
+            descriptor, kept = tempfile.mkstemp(
+                prefix='rpmvenv',
+                suffix='.log.gz',
+                dir=failed,
+            )
+            os.close(descriptor)
+            shutil.move(log, kept)
+            exc.log = kept
+
+        prune(failed)
+
+    @contextlib.contextmanager
+    def topdir(self, key=None):
+        """Provide a %_topdir for one build.
+
+        Args:
+            key (str): Identifies the builds which may share a pooled
+                directory, such as the path to the source. Pooling is only
+                used when the workspace reuses directories and a key is
+                given. A new directory is used when every pooled directory
+                of the key is in use.
+
+        A new directory is removed when the build finishes. When the build
+        fails the directory, or only its rpmbuild log if failed builds are
+        not kept, is moved into the FAILED_DIR of the workspace root and the
+        'log' of the error is updated to point at the new location. Only the
+        FAILED_KEPT most recent entries of the FAILED_DIR are kept. The error
+        of the build is raised even if it cannot be kept.
+        """
+        if self.reuse and key:
+
+            with self._acquire(key) as top:
+
+                if top is not None:
+
+                    yield prepare(top)
+                    return
+
+        top = prepare(self.mkdtemp())
+        try:
+
+            yield top
+
+        except BaseException as exc:
+
+            try:
+
+                self._keep_failure(top, exc)
+
+            except (IOError, OSError):
+
+                # Keeping the failure is best effort and must never hide
+                # the error of the build.
+                pass
+
+            if not self.keep_failed:
+
+                shutil.rmtree(top, ignore_errors=True)
+
+            raise
+
+        shutil.rmtree(top, ignore_errors=True)
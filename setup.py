@@ -27,6 +27,7 @@ setup(
     entry_points={
         "console_scripts": [
             "rpmvenv = rpmvenv.cli:main",
+            "rpmvenv-helper = rpmvenv.helpers:main",
         ],
         "rpmvenv.extensions": [
             "core = rpmvenv.extensions.core:Extension",
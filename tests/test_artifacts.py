@@ -0,0 +1,150 @@
+"""Test suites for the RPM artifact store."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import types
+
+from rpmvenv import artifacts
+
+
+def test_source_digest(tmpdir):
+    """Test that the digest follows content and reuses known hashes."""
+    source = tmpdir.join('source')
+    source.join('pkg', 'module.py').write('a = 1\n', ensure=True)
+    source.join('pkg', 'module.pyc').write('ignored', ensure=True)
+    memo = {}
+    first = artifacts.source_digest(str(source), ('*.pyc',), memo=memo)
+    assert list(memo) == [str(source.join('pkg', 'module.py'))]
+    assert artifacts.source_digest(str(source), ('*.pyc',)) == first
+
+    source.join('pkg', 'module.pyc').write('changed')
+    assert artifacts.source_digest(str(source), ('*.pyc',), memo=memo) == (
+        first
+    )
+    source.join('pkg', 'module.py').write('a = 2\n')
+    assert artifacts.source_digest(str(source), ('*.pyc',), memo=memo) != (
+        first
+    )
+
+
+def test_fingerprint():
+    ext = types.SimpleNamespace(name='core', version='1.0.0')
+    newer = types.SimpleNamespace(name='core', version='1.1.0')
+    key = artifacts.fingerprint('spec', 'source', (ext,), 'python')
+    assert key == artifacts.fingerprint('spec', 'source', (ext,), 'python')
+    assert key != artifacts.fingerprint('spec2', 'source', (ext,), 'python')
+    assert key != artifacts.fingerprint('spec', 'source2', (ext,), 'python')
+    assert key != artifacts.fingerprint('spec', 'source', (newer,), 'python')
+    assert key != artifacts.fingerprint('spec', 'source', (ext,), 'pypy')
+    assert key != artifacts.fingerprint(
+        'spec', 'source', (ext,), 'python', 'binary',
+    )
+
+
+def test_fingerprint_host_paths():
+    """Test that checkouts at different paths share a fingerprint."""
+    spec = 'Source0: {0}\n--cache-dir={0}-cache/strip\n'
+    first = artifacts.fingerprint(
+        spec.format('/ci/a/app'),
+        'source',
+        paths={'source': '/ci/a/app', 'cache_dir': '/ci/a/app-cache'},
+    )
+    assert first == artifacts.fingerprint(
+        spec.format('/ci/b/app'),
+        'source',
+        paths={'source': '/ci/b/app', 'cache_dir': '/ci/b/app-cache'},
+    )
+    assert artifacts.normalize(
+        spec.format('/ci/a/app'),
+        {'source': '/ci/a/app', 'cache_dir': '/ci/a/app-cache'},
+    ) == 'Source0: @source@\n--cache-dir=@cache_dir@/strip\n'
+
+
+def test_store_hashes(tmpdir):
+    """Test that hashes merge under the lock and the oldest are pruned."""
+    store = artifacts.Store(str(tmpdir.join('store')), max_hashes=2)
+    paths = [str(tmpdir.join(str(index)).ensure()) for index in range(3)]
+    store.write_hashes({paths[0]: [1, 'a', 1.0], paths[1]: [1, 'b', 2.0]})
+    store.write_hashes({paths[2]: [1, 'c', 3.0], paths[0]: [1, 'x', 0.5]})
+    assert store.read_hashes() == {
+        paths[1]: [1, 'b', 2.0],
+        paths[2]: [1, 'c', 3.0],
+    }
+
+    os.unlink(paths[1])
+    store.evict()
+    assert store.read_hashes() == {paths[2]: [1, 'c', 3.0]}
+
+
+def test_store_get_put(tmpdir):
+    store = artifacts.Store(str(tmpdir.join('store')))
+    built = tmpdir.join('built', 'pkg-1.0-1.x86_64.rpm')
+    built.write('rpm', ensure=True)
+    destination = tmpdir.mkdir('destination')
+    assert store.get('key', str(destination)) is None
+
+    store.put('key', (str(built),))
+    store.put('key', (str(built),))
+    assert store.get('key', str(destination)) == (
+        str(destination.join('pkg-1.0-1.x86_64.rpm')),
+    )
+    assert destination.join('pkg-1.0-1.x86_64.rpm').read() == 'rpm'
+    assert not any(
+        name.startswith(artifacts.TMP_PREFIX)
+        for name in os.listdir(store.path)
+    )
+
+
+def test_store_get_evicted(tmpdir, monkeypatch):
+    """Test that an entry evicted while it is copied is a miss."""
+    store = artifacts.Store(str(tmpdir.join('store')))
+    for name in ('a.rpm', 'b.rpm'):
+        tmpdir.join('built', name).write('rpm', ensure=True)
+    store.put('key', (
+        str(tmpdir.join('built', 'a.rpm')),
+        str(tmpdir.join('built', 'b.rpm')),
+    ))
+    destination = tmpdir.mkdir('destination')
+    copy2 = artifacts.shutil.copy2
+
+    def evicting(src, dst):
+        result = copy2(src, dst)
+        artifacts.shutil.rmtree(os.path.join(store.path, 'key'))
+        return result
+
+    monkeypatch.setattr(artifacts.shutil, 'copy2', evicting)
+    assert store.get('key', str(destination)) is None
+    assert destination.listdir() == []
+
+
+def test_store_evicts_least_recently_used(tmpdir):
+    store = artifacts.Store(str(tmpdir.join('store')), max_size=10)
+    built = tmpdir.join('pkg.rpm')
+    built.write('12345')
+    store.put('first', (str(built),))
+    store.put('second', (str(built),))
+    os.utime(os.path.join(store.path, 'first'), (0, 0))
+    os.utime(os.path.join(store.path, 'second'), (1, 1))
+    store.get('first', str(tmpdir.mkdir('destination')))
+
+    store.put('third', (str(built),))
+    assert sorted(
+        name for name in os.listdir(store.path) if not name.startswith('.')
+    ) == ['first', 'third']
+
+
+def test_fingerprint_streamed():
+    """Test that a SPEC hashed as it streams matches the rendered SPEC."""
+    paths = {'source': '/ci/a/app'}
+    digest = artifacts.SpecDigest(paths)
+    for chunk in ('Source0: /ci/a', '/app\nline', '\n/ci/a/app'):
+        digest.write(chunk)
+    assert artifacts.fingerprint(digest, 'source') == artifacts.fingerprint(
+        'Source0: /ci/b/app\nline\n/ci/b/app',
+        'source',
+        paths={'source': '/ci/b/app'},
+    )
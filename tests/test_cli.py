@@ -5,6 +5,10 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
+import json
+import os
+
 import pytest
 
 from rpmvenv import cli
@@ -31,3 +35,225 @@ def test_python_cmd_build(
     rc = exc_info.value.code if type(exc_info.value) == SystemExit else \
         exc_info.value
     assert rc == 0
+
+
+def test_find_configs(tmpdir):
+    """Test that directories expand to the config files they contain."""
+    tmpdir.join('b.json').write('{}')
+    tmpdir.join('a.ini').write('')
+    tmpdir.join('notes.txt').write('')
+    tmpdir.mkdir('nested.json')
+    single = str(tmpdir.join('single.json'))
+    assert cli.find_configs((str(tmpdir), single)) == (
+        str(tmpdir.join('a.ini')),
+        str(tmpdir.join('b.json')),
+        single,
+    )
+
+
+def test_prefixed_stream():
+    """Test that only complete lines are written with the prefix."""
+    output = io.StringIO()
+    stream = cli.PrefixedStream(output, '[pkg] ')
+    stream.write('one\ntw')
+    assert output.getvalue() == '[pkg] one\n'
+    stream.write('o\n')
+    stream.write('three')
+    stream.flush()
+    assert output.getvalue() == '[pkg] one\n[pkg] two\n[pkg] three\n'
+
+
+def test_expand_jobs(tmpdir):
+    """Test that each matrix variant becomes a job sharing one source."""
+    tmpdir.join('src', 'setup.py').write('setup', ensure=True)
+    config = str(tmpdir.join('src', 'conf.json'))
+    with open(config, 'w') as handle:
+        json.dump(
+            {'matrix': {'variants': ['python3.9', 'python3.11']}},
+            handle,
+        )
+    plain = str(tmpdir.join('plain.json'))
+    with open(plain, 'w') as handle:
+        json.dump({}, handle)
+
+    jobs = cli.expand_jobs((config, plain))
+    assert [cli.job_name(job) for job in jobs] == [
+        'conf-py39', 'conf-py311', 'plain',
+    ]
+
+    args = {
+        'source': None,
+        'spec': False,
+        'stage_mode': 'copy',
+        'stage_jobs': None,
+        'source_files': 'all',
+    }
+    jobs = cli.stage_shared(jobs, args, str(tmpdir.join('stage')))
+    assert jobs[0].staged == jobs[1].staged
+    assert os.path.isfile(os.path.join(jobs[0].staged, 'setup.py'))
+    assert jobs[2].staged is None
+
+
+def test_human_size():
+    assert cli.human_size(512) == '512.0 B'
+    assert cli.human_size(3 * 1024 * 1024) == '3.0 MiB'
+    assert cli.human_size(5 * 1024 ** 3) == '5.0 GiB'
+
+
+def test_generate_rpm_artifact_cache(tmpdir, monkeypatch, capsys):
+    """Test that a second build with identical inputs skips rpmbuild."""
+    source = tmpdir.join('source')
+    source.join('setup.py').write('', ensure=True)
+    destination = tmpdir.mkdir('destination')
+    builds = []
+
+    def build(specfile, top, verbose, on_line, mode='all', buildroot=None):
+        builds.append(specfile)
+        path = os.path.join(top, 'RPMS', 'x86_64', 'pkg-1.0-1.x86_64.rpm')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as rpm_file:
+            rpm_file.write('rpm')
+        return (path,)
+
+    monkeypatch.setattr(cli.rpmbuild, 'build', build)
+    store = cli.artifacts.Store(str(tmpdir.join('store')))
+    for _ in range(2):
+        paths = cli.generate_rpm(
+            str(source),
+            str(destination),
+            cli.spec.Spec(),
+            store=store,
+        )
+        assert paths == (str(destination.join('pkg-1.0-1.x86_64.rpm')),)
+        destination.join('pkg-1.0-1.x86_64.rpm').remove()
+    assert len(builds) == 1
+
+    source.join('setup.py').write('changed')
+    cli.generate_rpm(
+        str(source),
+        str(destination),
+        cli.spec.Spec(),
+        store=store,
+    )
+    assert len(builds) == 2
+
+    recorder = cli.timing.Recorder()
+    cli.generate_rpm(
+        str(source),
+        str(destination),
+        cli.spec.Spec(),
+        recorder=recorder,
+        store=store,
+    )
+    assert len(builds) == 2
+    assert 'No timings were written' in capsys.readouterr().out
+    assert not destination.join('pkg-1.0-1.x86_64.timings.json').check()
+
+
+def test_generate_rpm_workspace(tmpdir, monkeypatch):
+    """Test that the build directory is removed from the workspace."""
+    source = tmpdir.join('source')
+    source.join('setup.py').write('', ensure=True)
+    destination = tmpdir.mkdir('destination')
+    root = tmpdir.mkdir('workspace')
+
+    def build(specfile, top, verbose, on_line, mode='all', buildroot=None):
+        assert os.path.dirname(top) == str(root)
+        path = os.path.join(top, 'RPMS', 'x86_64', 'pkg-1.0-1.x86_64.rpm')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as rpm_file:
+            rpm_file.write('rpm')
+        return (path,)
+
+    monkeypatch.setattr(cli.rpmbuild, 'build', build)
+    cli.generate_rpm(
+        str(source),
+        str(destination),
+        cli.spec.Spec(),
+        workspace=cli.workspaces.Workspace(str(root)),
+    )
+    assert destination.join('pkg-1.0-1.x86_64.rpm').check()
+    assert root.listdir() == []
+
+
+def test_generate_rpm_install_mode(tmpdir, monkeypatch):
+    """Test that an install only build returns and stores no RPMs."""
+    source = tmpdir.join('source')
+    source.join('setup.py').write('', ensure=True)
+    destination = tmpdir.mkdir('destination')
+    modes = []
+
+    def build(specfile, top, verbose, on_line, mode='all', buildroot=None):
+        modes.append((mode, buildroot))
+        return ()
+
+    monkeypatch.setattr(cli.rpmbuild, 'build', build)
+    store = cli.artifacts.Store(str(tmpdir.join('store')))
+    paths = cli.generate_rpm(
+        str(source),
+        str(destination),
+        cli.spec.Spec(),
+        store=store,
+        mode='install',
+        name='pkg',
+    )
+    assert paths == ()
+    assert modes == [('install', str(destination.join('pkg-buildroot')))]
+    assert store.entries() == []
+
+
+def test_main_package():
+    paths = (
+        '/out/app-1.0-1.src.rpm',
+        '/out/app-debuginfo-1.0-1.x86_64.rpm',
+        '/out/app-deps-0a1b-1.x86_64.rpm',
+        '/out/app-1.0-1.x86_64.rpm',
+    )
+    assert cli.main_package(paths, 'app') == '/out/app-1.0-1.x86_64.rpm'
+    assert cli.main_package(paths, 'other') == paths[1]
+    assert cli.main_package(paths[:1], 'app') == paths[0]
+    assert cli.main_package((), 'app') is None
+
+
+def test_generate_rpm_staged_linked(tmpdir, monkeypatch):
+    """Test that a shared staged source is linked rather than copied."""
+    source = tmpdir.join('source')
+    staged = tmpdir.join('staged', 'source')
+    staged.join('setup.py').write('setup', ensure=True)
+
+    def reflink(src, dst):
+        raise OSError('Reflinks are not supported.')
+
+    def build(specfile, top, verbose, on_line, mode='all', buildroot=None):
+        path = os.path.join(top, 'SOURCES', 'source', 'setup.py')
+        assert os.stat(path).st_ino == staged.join('setup.py').stat().ino
+        return ()
+
+    monkeypatch.setattr(cli.stage, 'reflink', reflink)
+    monkeypatch.setattr(cli.rpmbuild, 'build', build)
+    cli.generate_rpm(
+        str(source),
+        str(tmpdir),
+        cli.spec.Spec(),
+        staged=str(staged),
+        workspace=cli.workspaces.Workspace(str(tmpdir.join('work'))),
+        mode='install',
+    )
+
+
+def test_main_config_named_like_command(tmpdir, monkeypatch):
+    """Test that a config file named after a command is built."""
+    calls = []
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setitem(cli.COMMANDS, 'lock', lambda argv: 'command')
+
+    def build_config(path, args, variant):
+        calls.append(path)
+        raise SystemExit(0)
+
+    monkeypatch.setattr(cli, 'build_config', build_config)
+    assert cli.main(('lock', 'conf.json')) == 'command'
+    tmpdir.join('lock').write('{}')
+    with pytest.raises(SystemExit):
+        cli.main(('lock',))
+    assert calls == [str(tmpdir.join('lock'))]
@@ -0,0 +1,83 @@
+"""Test suites for the single pass configuration loader."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+
+import confpy.api
+import confpy.exc
+import pytest
+
+from rpmvenv import config as lazyconfig
+
+
+COERCED = []
+
+
+class CountingOption(confpy.api.StringOption):
+
+    def coerce(self, value):
+        COERCED.append(value)
+        return super(CountingOption, self).coerce(value)
+
+
+confpy.api.Configuration(
+    lazytest=confpy.api.Namespace(
+        description='Options used by the lazy configuration tests.',
+        counted=CountingOption(),
+        env=confpy.api.StringOption(),
+        flag=confpy.api.StringOption(),
+    ),
+    lazyrequired=confpy.api.Namespace(
+        description='A namespace with a required option.',
+        needed=confpy.api.StringOption(required=True),
+    ),
+)
+
+
+def _write(tmpdir, document):
+    path = tmpdir.join('config.json')
+    path.write(json.dumps(document))
+    return str(path)
+
+
+def test_namespaces_apply_on_access(tmpdir):
+    """Test that values are only coerced once the namespace is used."""
+    del COERCED[:]
+    path = _write(tmpdir, {'lazytest': {
+        'counted': 'file',
+        'env': 'file',
+        'flag': 'file',
+    }})
+    config = lazyconfig.LazyConfiguration(
+        path,
+        env={'RPMVENV_LAZYTEST_ENV': 'env', 'RPMVENV_LAZYTEST_FLAG': 'env'},
+        arguments=('--lazytest_flag', 'cli'),
+    )
+    config.check()
+    assert COERCED == []
+    assert config.lazytest.counted == 'file'
+    assert config.lazytest.env == 'env'
+    assert config.lazytest.flag == 'cli'
+    assert COERCED == ['file']
+    assert config.get('missing') is None
+
+
+def test_check_unknown_names(tmpdir):
+    config = lazyconfig.LazyConfiguration(_write(tmpdir, {'nope': {}}))
+    with pytest.raises(confpy.exc.NamespaceNotRegistered):
+        config.check()
+    config = lazyconfig.LazyConfiguration(
+        _write(tmpdir, {'lazytest': {'nope': 'x'}}),
+    )
+    with pytest.raises(confpy.exc.OptionNotRegistered):
+        config.check()
+
+
+def test_missing_required(tmpdir):
+    config = lazyconfig.LazyConfiguration(_write(tmpdir, {}), env={})
+    with pytest.raises(confpy.exc.MissingRequiredOption):
+        config.lazyrequired
@@ -0,0 +1,71 @@
+"""Test suites for the core Extension."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import types
+
+import pytest
+
+from rpmvenv.spec import Spec
+from rpmvenv.extensions import core
+
+
+@pytest.fixture
+def config():
+    # A plain copy of the option values avoids modifying the global config.
+    values = dict(
+        (name, getattr(core.cfg.core, name))
+        for name, _ in core.cfg.core.options()
+    )
+    values.update(name='pkg', version='1.0', source='/path/to/src')
+    return types.SimpleNamespace(core=types.SimpleNamespace(**values))
+
+
+def test_source_directory(config):
+    spec = Spec()
+    core.Extension.generate(config, spec)
+    assert spec.tags['Source0'] == '/path/to/src'
+    assert spec.macros['rpmvenv_source'] == '%{SOURCE0}'
+    assert '%setup' not in str(spec)
+
+
+def test_source_archive(config):
+    config.core.source_archive = 'zst'
+    spec = Spec()
+    core.Extension.generate(config, spec)
+    assert spec.tags['Source0'] == 'src.tar.zst'
+    assert spec.macros['rpmvenv_source'] == '%{_builddir}/src'
+    assert spec.blocks.prep[0] == '%setup -q -n src'
+
+
+def test_source_archive_invalid():
+    option = dict(core.cfg.core.options())['source_archive']
+    with pytest.raises(ValueError):
+        option.coerce('rar')
+
+
+@pytest.mark.parametrize('settings,expected', (
+    (('zstd', 19, 0), 'w19T0.zstdio'),
+    (('zstd', 3, None), 'w3.zstdio'),
+    (('xz', None, 8), 'w6T8.xzdio'),
+    (('gzip', 1, 4), 'w1.gzdio'),
+))
+def test_payload(config, settings, expected):
+    (
+        config.core.payload_compression,
+        config.core.payload_level,
+        config.core.payload_threads,
+    ) = settings
+    spec = Spec()
+    core.Extension.generate(config, spec)
+    assert spec.globals['_binary_payload'] == expected
+    assert spec.globals['_source_payload'] == expected
+
+
+def test_payload_default(config):
+    spec = Spec()
+    core.Extension.generate(config, spec)
+    assert '_binary_payload' not in spec.globals
@@ -7,6 +7,9 @@ from __future__ import unicode_literals
 
 import itertools
 
+import pytest
+
+from rpmvenv import cache
 from rpmvenv.extensions import loader
 
 
@@ -17,3 +20,36 @@ def test_loader_deterministic_order():
         results = loader.load_extensions(selection)
         results = (result.name for result in results if result.name != "core")
         assert tuple(results) == selection
+
+
+def test_entry_point_index(tmpdir, monkeypatch):
+    """Test that discovery is cached until the environment changes."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    found = loader.entry_points()
+    assert found['core'] == 'rpmvenv.extensions.core:Extension'
+    index = cache.read(loader.INDEX)
+    assert index['fingerprint'] == loader.fingerprint()
+
+    def fail(group):
+        raise AssertionError('The index was not used.')
+
+    monkeypatch.setattr(loader, 'discover', fail)
+    assert loader.entry_points() == found
+
+    monkeypatch.setattr(loader, 'fingerprint', lambda: 'changed')
+    with pytest.raises(AssertionError):
+        loader.entry_points()
+
+
+def test_stale_entry_point_index(tmpdir, monkeypatch):
+    """Test that an index pointing at missing code is rebuilt."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    cache.write(loader.INDEX, {
+        'fingerprint': loader.fingerprint(),
+        'groups': {loader.GROUP: {'core': 'rpmvenv.extensions.gone:Nope'}},
+    })
+    extensions = loader.load_extensions(('blocks',))
+    assert [ext.name for ext in extensions] == ['core', 'blocks']
+    assert 'gone' not in cache.read(loader.INDEX)['groups'][loader.GROUP][
+        'core'
+    ]
@@ -0,0 +1,93 @@
+"""Test suites for the file_extras Extension."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import types
+
+from rpmvenv.spec import Spec
+from rpmvenv.extensions.files import extras
+from rpmvenv.extensions.files.option import RpmFile
+
+
+def _file(src, dest, file_type=None, file_attr=None):
+    return RpmFile(
+        src=src,
+        dest=dest,
+        file_type=file_type,
+        file_type_option=None,
+        file_attr=file_attr,
+    )
+
+
+def _config(source, files):
+    return types.SimpleNamespace(
+        core=types.SimpleNamespace(source=source),
+        file_extras=types.SimpleNamespace(files=files),
+    )
+
+
+def test_manifest(tmpdir):
+    spec = Spec()
+    extras.Extension.generate(_config(str(tmpdir), [
+        _file('init', 'etc/init.d/project'),
+        _file('readme', 'usr/share/doc/readme', file_type='doc'),
+    ]), spec)
+    assert spec.blocks.install == [
+        '# Copy every extra file in one pass from this manifest of sources '
+        'and destinations.',
+        'rpmvenv-helper copy --source=%{rpmvenv_source} '
+        "--destination=%{buildroot} <<'RPMVENV_FILE_EXTRAS'",
+        'init\tetc/init.d/project',
+        'readme\tusr/share/doc/readme',
+        'RPMVENV_FILE_EXTRAS',
+    ]
+    assert spec.blocks.files == [
+        '/etc/init.d/project',
+        '%doc /usr/share/doc/readme',
+    ]
+
+
+def test_glob(tmpdir):
+    tmpdir.join('conf', 'a.ini').write('', ensure=True)
+    tmpdir.join('conf', 'sub', 'b.ini').write('', ensure=True)
+    tmpdir.join('conf', 'sub', 'c.txt').write('', ensure=True)
+    tmpdir.join('conf', 'sub-x', '100%.ini').write('', ensure=True)
+    attr = {'permissions': '0600', 'user': '-', 'group': '-'}
+    entries = extras.expand(
+        str(tmpdir),
+        _file('conf/**/*.ini', 'etc/app', file_attr=attr),
+    )
+    assert [(entry.src, entry.dest) for entry in entries] == [
+        ('conf/a.ini', 'etc/app/a.ini'),
+        ('conf/sub-x/100%%.ini', 'etc/app/sub-x/100%%.ini'),
+        ('conf/sub/b.ini', 'etc/app/sub/b.ini'),
+    ]
+    assert all(entry.file_attr == attr for entry in entries)
+
+    entries = extras.expand(str(tmpdir), _file('conf/*', 'etc/app'))
+    assert [(entry.src, entry.dest) for entry in entries] == [
+        ('conf/a.ini', 'etc/app/a.ini'),
+        ('conf/sub', 'etc/app/sub'),
+        ('conf/sub-x', 'etc/app/sub-x'),
+    ]
+
+    entries = extras.expand(str(tmpdir), _file('conf/**', 'etc/app'))
+    assert [(entry.src, entry.dest) for entry in entries] == [
+        ('conf', 'etc/app'),
+    ]
+    assert extras.expand(str(tmpdir), _file('none/*', 'etc/app')) == ()
+
+
+def test_glob_dest_macro(tmpdir):
+    tmpdir.join('conf', '100%.ini').write('', ensure=True)
+    entries = extras.expand(
+        str(tmpdir),
+        _file('conf/*.ini', '%{_sysconfdir}/app'),
+    )
+    assert [(entry.src, entry.dest) for entry in entries] == [
+        ('conf/100%%.ini', '%{_sysconfdir}/app/100%%.ini'),
+    ]
+    assert extras.directive(entries[0]) == '/%{_sysconfdir}/app/100%%.ini'
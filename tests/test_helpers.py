@@ -0,0 +1,375 @@
+"""Test suites for the SPEC helper commands."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import importlib.util
+import marshal
+import os
+import shutil
+import struct
+import subprocess
+import sys
+
+import pytest
+
+from rpmvenv.helpers import copy
+from rpmvenv.helpers import dedup
+from rpmvenv.helpers import postprocess
+from rpmvenv.helpers import precompile
+from rpmvenv.helpers import split
+from rpmvenv.helpers import strip
+from rpmvenv.helpers import venvcache
+
+
+def _fake_venv(path):
+    os.makedirs(os.path.join(path, 'bin'))
+    os.makedirs(os.path.join(path, 'lib', 'site-packages'))
+    with open(os.path.join(path, 'bin', 'activate'), 'w') as handle:
+        handle.write('VIRTUAL_ENV="{0}"\n'.format(path))
+    with open(os.path.join(path, 'bin', 'tool'), 'w') as handle:
+        handle.write('#!{0}/bin/python\nprint(1)\n'.format(path))
+    pth = os.path.join(path, 'lib', 'site-packages', 'pkg.pth')
+    with open(pth, 'w') as handle:
+        handle.write('{0}/lib/src\n'.format(path))
+    os.symlink('lib', os.path.join(path, 'lib64'))
+
+
+def test_venv_cache_roundtrip(tmpdir):
+    cache = str(tmpdir.join('cache'))
+    origin = str(tmpdir.join('origin'))
+    _fake_venv(origin)
+    assert venvcache.restore(cache, origin, ('a', 'b')) == -1
+    assert venvcache.save(cache, origin, 'a')
+    assert not venvcache.save(cache, origin, 'a')
+
+    dest = str(tmpdir.join('dest'))
+    os.makedirs(dest)
+    assert venvcache.restore(cache, dest, ('a', 'b')) == 0
+    assert os.path.islink(os.path.join(dest, 'lib64'))
+    with open(os.path.join(dest, 'bin', 'tool')) as handle:
+        assert handle.readline().strip() == '#!{0}/bin/python'.format(dest)
+    with open(os.path.join(dest, 'bin', 'activate')) as handle:
+        assert dest in handle.read()
+    pth = os.path.join(dest, 'lib', 'site-packages', 'pkg.pth')
+    with open(pth) as handle:
+        assert handle.read().strip() == '{0}/lib/src'.format(dest)
+
+
+def _elf(e_type, size=64):
+    """Get the start of a 64 bit little endian ELF file of a type."""
+    ident = b'\x7fELF\x02\x01\x01' + b'\0' * 9
+    return (ident + struct.pack('<H', e_type)).ljust(size, b'\0')
+
+
+def test_strip_skips_relocatable_and_truncated(tmpdir):
+    """Test that only intact executables and shared objects are stripped."""
+    root = tmpdir.mkdir('lib')
+    root.join('module.o').write_binary(_elf(1))
+    root.join('truncated.so').write_binary(_elf(strip.ET_DYN, 24))
+
+    assert not strip.is_strippable(str(root.join('module.o')))
+    assert strip.is_strippable(str(root.join('truncated.so')))
+    assert strip.section_names(str(root.join('truncated.so'))) is None
+    assert strip.strip(str(root), command='false') == {
+        'skipped': 1, 'cached': 0, 'stripped': 0,
+    }
+
+
+@pytest.mark.skipif(
+    not (shutil.which('gcc') and shutil.which('strip')),
+    reason='Requires gcc and strip.',
+)
+def test_strip(tmpdir):
+    """Test that ELF objects are found by header and stripped once."""
+    root = tmpdir.join('lib')
+    libs = root.join('pkg', '.libs')
+    libs.ensure(dir=True)
+    source = tmpdir.join('lib.c')
+    source.write('int answer(void) { return 42; }\n')
+    original = str(tmpdir.join('original.so'))
+    subprocess.check_call(
+        ('gcc', '-g', '-shared', '-fPIC', '-o', original, str(source)),
+    )
+    library = str(libs.join('libanswer.so.1'))
+    shutil.copy(original, library)
+    root.join('fake.so').write('not an elf file')
+    cache = str(tmpdir.join('cache'))
+
+    assert strip.is_elf(library)
+    assert strip.needs_strip(library)
+    assert strip.strip(str(root), cache_dir=cache) == {
+        'skipped': 0, 'cached': 0, 'stripped': 1,
+    }
+    assert not strip.needs_strip(library)
+    stripped = open(library, 'rb').read()
+    assert strip.strip(str(root), cache_dir=cache)['skipped'] == 1
+
+    shutil.copy(original, library)
+    os.chmod(library, 0o751)
+    assert strip.strip(str(root), cache_dir=cache)['cached'] == 1
+    assert open(library, 'rb').read() == stripped
+    assert os.stat(library).st_mode & 0o777 == 0o751
+
+
+def test_precompile(tmpdir, capfd):
+    """Test that bytecode records the install path and is reused."""
+    venv = tmpdir.join('venv')
+    package = venv.join('lib', 'python', 'site-packages', 'pkg')
+    package.ensure(dir=True)
+    package.join('mod.py').write('def value():\n    return 1\n')
+    package.join('broken.py').write('def broken(:\n')
+    cache = str(tmpdir.join('cache'))
+    args = precompile.add_parser(argparse.ArgumentParser()).parse_args((
+        '--python={0}'.format(sys.executable),
+        '--install-dir=/opt/app',
+        '--optimize=0',
+        '--optimize=2',
+        '--cache-dir={0}'.format(cache),
+        str(venv),
+    ))
+    assert precompile.command(args)[1] == '-I'
+
+    assert precompile.run(args) == 0
+    out = capfd.readouterr().out
+    assert 'Compiled 2 files, 0 from cache, and skipped 2.' in out
+    source = str(package.join('mod.py'))
+    pyc = importlib.util.cache_from_source(source)
+    with open(pyc, 'rb') as handle:
+        data = handle.read()
+    # Flags of 1 mark a hash based pyc which is never checked.
+    assert struct.unpack('<I', data[4:8])[0] == 1
+    code = marshal.loads(data[16:])
+    assert code.co_filename == '/opt/app/lib/python/site-packages/pkg/mod.py'
+    assert os.path.isfile(
+        importlib.util.cache_from_source(source, optimization=2)
+    )
+
+    os.unlink(pyc)
+    assert precompile.run(args) == 0
+    out = capfd.readouterr().out
+    assert 'Compiled 2 files, 2 from cache, and skipped 2.' in out
+    with open(pyc, 'rb') as handle:
+        assert handle.read() == data
+
+
+def _tree(path):
+    result = {}
+    for current, dirs, files in os.walk(path):
+        for name in dirs + files:
+            full = os.path.join(current, name)
+            rel = os.path.relpath(full, path)
+            if os.path.islink(full):
+                result[rel] = 'link:' + os.readlink(full)
+            elif os.path.isfile(full):
+                with open(full, 'rb') as handle:
+                    result[rel] = (handle.read(), os.stat(full).st_mode)
+            else:
+                result[rel] = 'dir'
+    return result
+
+
+def test_postprocess_matches_relocate(tmpdir):
+    """Test that the single pass matches the separate steps."""
+    trees = []
+    for name in ('expected', 'actual'):
+        path = str(tmpdir.join(name, 'venv'))
+        _fake_venv(path)
+        site = os.path.join(path, 'lib', 'site-packages')
+        os.makedirs(os.path.join(site, 'pkg-1.0.dist-info'))
+        with open(os.path.join(site, 'pkg-1.0.dist-info', 'RECORD'), 'w'):
+            pass
+        os.makedirs(os.path.join(site, '__pycache__'))
+        script = os.path.join(path, 'bin', 'long')
+        with open(script, 'w') as handle:
+            handle.write(
+                "#!/bin/sh\n'''exec' {0}/bin/python \"$0\" \"$@\"\n"
+                "' '''\nprint(1)\n".format(path)
+            )
+        os.chmod(script, 0o755)
+        with open(os.path.join(path, 'bin', 'other'), 'w') as handle:
+            handle.write('#!/bin/bash\necho python\n')
+        # A RECORD outside of the venv is removed from the whole buildroot.
+        tmpdir.join(name, 'opt', 'pkg-1.0.dist-info', 'RECORD').write(
+            '', ensure=True,
+        )
+        trees.append(path)
+
+    expected, actual = trees
+    subprocess.check_call(
+        (
+            'find', os.path.dirname(expected), '-name', 'RECORD',
+            '-exec', 'rm', '-rf', '{}', ';',
+        ),
+    )
+    shutil.rmtree(
+        os.path.join(expected, 'lib', 'site-packages', '__pycache__'),
+    )
+    venvcache.venvctrl.VirtualEnvironment(expected).relocate('/opt/app')
+
+    counts = postprocess.postprocess(
+        actual,
+        '/opt/app',
+        remove_pycache=True,
+        buildroot=os.path.dirname(actual),
+    )
+    assert counts == {
+        'pycache': 1, 'record': 2, 'shebang': 2, 'pth': 1, 'stripped': 0,
+    }
+    assert _tree(os.path.dirname(actual)) == _tree(os.path.dirname(expected))
+    with open(os.path.join(actual, 'bin', 'tool')) as handle:
+        assert handle.readline() == '#!/opt/app/bin/python\n'
+
+
+def test_dedup(tmpdir):
+    """Test that identical files with the same mode are hardlinked."""
+    root = tmpdir.join('venv')
+    for rel, content, mode in (
+            ('a.libs/lib.so', 'binary', 0o755),
+            ('b.libs/lib.so', 'binary', 0o755),
+            ('c.libs/lib.so', 'binary', 0o644),
+            ('LICENSE', 'license', 0o644),
+            ('pkg/LICENSE', 'license', 0o644),
+            ('pkg/other', 'licence', 0o644),
+            ('empty', '', 0o644),
+            ('pkg/empty', '', 0o644),
+    ):
+        path = root.join(rel)
+        path.write(content, ensure=True)
+        path.chmod(mode)
+
+    counts = dedup.dedup(str(root))
+    assert counts == {'linked': 2, 'saved': len('binary') + len('license')}
+    assert root.join('a.libs/lib.so').stat().ino == (
+        root.join('b.libs/lib.so').stat().ino
+    )
+    assert root.join('a.libs/lib.so').stat().ino != (
+        root.join('c.libs/lib.so').stat().ino
+    )
+    assert root.join('LICENSE').stat().ino == (
+        root.join('pkg/LICENSE').stat().ino
+    )
+    assert root.join('pkg/other').stat().nlink == 1
+    assert root.join('empty').stat().nlink == 1
+    assert dedup.dedup(str(root)) == {'linked': 0, 'saved': 0}
+
+
+def test_dedup_split(tmpdir):
+    """Test that files are not linked across the deps and app packages."""
+    root = tmpdir.join('venv')
+    root.join('deps', 'LICENSE').write('license', ensure=True)
+    root.join('deps', 'COPYING').write('license')
+    snapshot = str(tmpdir.join('deps.json'))
+    split.snapshot(str(root), snapshot)
+    root.join('app', 'LICENSE').write('license', ensure=True)
+    root.join('app', 'COPYING').write('license')
+
+    counts = dedup.dedup(str(root), snapshot=snapshot)
+    assert counts == {'linked': 2, 'saved': 2 * len('license')}
+    assert root.join('deps', 'LICENSE').stat().ino == (
+        root.join('deps', 'COPYING').stat().ino
+    )
+    assert root.join('app', 'LICENSE').stat().ino == (
+        root.join('app', 'COPYING').stat().ino
+    )
+    assert root.join('app', 'LICENSE').stat().ino != (
+        root.join('deps', 'LICENSE').stat().ino
+    )
+
+
+def test_split(tmpdir):
+    """Test that paths installed after the snapshot belong to the app."""
+    venv = tmpdir.join('venv')
+    site = venv.join('lib', 'site-packages')
+    site.join('numpy', '__init__.py').write('', ensure=True)
+    site.join('my file.txt').write('', ensure=True)
+    snapshot = str(tmpdir.join('deps.json'))
+    split.snapshot(str(venv), snapshot)
+
+    site.join('app', '__init__.py').write('', ensure=True)
+    site.join('numpy', '__pycache__', '__init__.cpython-39.pyc').write(
+        '',
+        ensure=True,
+    )
+    site.join('app', '__pycache__', '__init__.cpython-39.pyc').write(
+        '',
+        ensure=True,
+    )
+    app = tmpdir.join('app.files')
+    deps = tmpdir.join('deps.files')
+    counts = split.lists(
+        str(venv), snapshot, '/opt/venv', str(app), str(deps),
+    )
+    assert counts == {'deps': 3, 'app': 2}
+    assert deps.read().splitlines() == [
+        '%dir /opt/venv',
+        '%dir /opt/venv/lib',
+        '%dir /opt/venv/lib/site-packages',
+        '%dir /opt/venv/lib/site-packages/numpy',
+        '%dir /opt/venv/lib/site-packages/numpy/__pycache__',
+        '"/opt/venv/lib/site-packages/my file.txt"',
+        '/opt/venv/lib/site-packages/numpy/__init__.py',
+        '/opt/venv/lib/site-packages/numpy/__pycache__/'
+        '__init__.cpython-39.pyc',
+    ]
+    assert app.read().splitlines() == [
+        '%dir /opt/venv/lib/site-packages/app',
+        '%dir /opt/venv/lib/site-packages/app/__pycache__',
+        '/opt/venv/lib/site-packages/app/__init__.py',
+        '/opt/venv/lib/site-packages/app/__pycache__/__init__.cpython-39.pyc',
+    ]
+
+    split.lists(str(venv), snapshot, '/opt/venv', str(app))
+    assert not site.join('numpy', '__init__.py').check()
+    assert site.join('app', '__init__.py').check()
+
+
+def test_copy(tmpdir):
+    """Test that manifest entries are copied as cp -R would copy them."""
+    source = tmpdir.join('source')
+    source.join('init').write('init', ensure=True)
+    source.join('init').chmod(0o755)
+    source.join('conf', 'sub', 'a.ini').write('a', ensure=True)
+    source.join('conf', 'link').mksymlinkto('sub/a.ini')
+    buildroot = tmpdir.mkdir('buildroot')
+    buildroot.join('opt', 'existing').ensure(dir=True)
+    entries = copy.parse((
+        'init\tetc/init.d/project\n',
+        'conf\t/etc/app\n',
+        'init\topt/existing\n',
+        '\n',
+    ))
+
+    assert copy.copy(str(source), str(buildroot), entries) == 3
+    assert buildroot.join('etc', 'init.d', 'project').read() == 'init'
+    assert buildroot.join('etc', 'init.d', 'project').stat().mode & 0o777 == (
+        0o755
+    )
+    assert buildroot.join('etc', 'app', 'sub', 'a.ini').read() == 'a'
+    assert buildroot.join('etc', 'app', 'link').readlink() == 'sub/a.ini'
+    assert buildroot.join('opt', 'existing', 'init').read() == 'init'
+    with pytest.raises(ValueError):
+        copy.parse(('no tab here',))
+
+
+def test_copy_overlapping(tmpdir):
+    """Test that overlapping entries are copied in manifest order."""
+    source = tmpdir.join('source')
+    source.join('conf', 'a.yml').write('a', ensure=True)
+    source.join('extra.yml').write('extra')
+    buildroot = tmpdir.mkdir('buildroot')
+    entries = copy.parse((
+        'conf\tetc/app\n',
+        'extra.yml\tetc/app/extra.yml\n',
+        'extra.yml\topt/extra.yml\n',
+    ))
+    assert [len(group) for group in copy.groups(entries)] == [2, 1]
+
+    assert copy.copy(str(source), str(buildroot), entries) == 3
+    assert buildroot.join('etc', 'app', 'a.yml').read() == 'a'
+    assert buildroot.join('etc', 'app', 'extra.yml').read() == 'extra'
+    assert not buildroot.join('etc', 'app', 'conf').check()
+    assert buildroot.join('opt', 'extra.yml').read() == 'extra'
@@ -0,0 +1,92 @@
+"""Test suites for the lock file generator."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+
+import pytest
+
+from rpmvenv import lock
+
+
+def test_lock_command():
+    cmd = lock.command(
+        '/tmp/report.json',
+        requirements=('requirements.txt', 'dev.txt'),
+        python='python3.9',
+        pip_flags=('--index-url https://pypi.example.org',),
+    )
+    assert cmd[:8] == [
+        'python3.9', '-m', 'pip', 'install', '--dry-run',
+        '--ignore-installed', '--quiet', '--report=/tmp/report.json',
+    ]
+    assert cmd[8:10] == ['--index-url', 'https://pypi.example.org']
+    assert cmd[10:] == ['-r', 'requirements.txt', '-r', 'dev.txt']
+
+
+def test_lock_render():
+    content = lock.render({'install': [
+        {
+            'metadata': {'name': 'six', 'version': '1.17.0'},
+            'download_info': {'archive_info': {'hash': 'sha256=abc'}},
+        },
+        {
+            'metadata': {'name': 'Attrs', 'version': '23.1.0'},
+            'download_info': {'archive_info': {
+                'hash': 'sha256=def',
+                'hashes': {'sha256': 'def'},
+            }},
+        },
+    ]})
+    assert content == lock.HEADER + (
+        'Attrs==23.1.0 \\\n'
+        '    --hash=sha256:def\n'
+        'six==1.17.0 \\\n'
+        '    --hash=sha256:abc\n'
+    )
+
+
+def test_lock_render_requires_hashes():
+    with pytest.raises(ValueError) as info:
+        lock.render({'install': [
+            {
+                'metadata': {'name': 'pkg', 'version': '1.0'},
+                'download_info': {'vcs_info': {'vcs': 'git'}},
+            },
+        ]})
+    assert 'pkg' in str(info.value)
+
+
+def test_lock_add_hashes(tmpdir):
+    tmpdir.join('wheels', 'PyYAML-6.0-cp39-cp39-linux_x86_64.whl').write(
+        b'wheel', ensure=True,
+    )
+    tmpdir.join('wheels', 'six-1.17.0-py2.py3-none-any.whl').write(b'six')
+    path = str(tmpdir.join('requirements.lock'))
+    with open(path, 'w') as lock_file:
+        lock_file.write(lock.HEADER + (
+            'pyyaml==6.0 \\\n'
+            '    --hash=sha256:abc\n'
+            'six==1.17.0 \\\n'
+            '    --hash=sha256:{0}\n'
+        ).format(hashlib.sha256(b'six').hexdigest()))
+    assert lock.missing_hashes(path, str(tmpdir.join('wheels'))) == (
+        'pyyaml==6.0',
+    )
+    lock.add_hashes(path, str(tmpdir.join('wheels')))
+    assert lock.missing_hashes(path, str(tmpdir.join('wheels'))) == ()
+    lock.add_hashes(path, str(tmpdir.join('wheels')))
+    with open(path) as lock_file:
+        assert lock_file.read() == lock.HEADER + (
+            'pyyaml==6.0 \\\n'
+            '    --hash=sha256:abc \\\n'
+            '    --hash=sha256:{0}\n'
+            'six==1.17.0 \\\n'
+            '    --hash=sha256:{1}\n'
+        ).format(
+            hashlib.sha256(b'wheel').hexdigest(),
+            hashlib.sha256(b'six').hexdigest(),
+        )
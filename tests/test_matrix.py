@@ -0,0 +1,74 @@
+"""Test suites for the build matrix."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import types
+
+import pytest
+
+from rpmvenv import matrix
+
+
+def test_default_suffix():
+    assert matrix.default_suffix('python3.11') == '-py311'
+    assert matrix.default_suffix('/usr/bin/python3.9') == '-py39'
+    assert matrix.default_suffix('pypy3') == '-pypy3'
+    assert matrix.default_suffix(None) == ''
+
+
+def test_parse_dict():
+    variant = matrix.VariantOption().coerce({
+        'python': 'python3.9',
+        'buildarch': 'x86_64',
+    })
+    assert variant == matrix.Variant('python3.9', 'x86_64', '-py39')
+
+
+def test_parse_colon_delimited():
+    option = matrix.VariantOption()
+    assert option.coerce('python3.11') == matrix.Variant(
+        'python3.11', None, '-py311',
+    )
+    assert option.coerce('python3.11:aarch64:-arm') == matrix.Variant(
+        'python3.11', 'aarch64', '-arm',
+    )
+    assert option.coerce(':noarch:-any') == matrix.Variant(
+        None, 'noarch', '-any',
+    )
+
+
+def test_parse_invalid():
+    option = matrix.VariantOption()
+    with pytest.raises(ValueError):
+        option.coerce({'buildarch': 'x86_64'})
+    with pytest.raises(ValueError):
+        option.coerce('a:b:c:d')
+    with pytest.raises(TypeError):
+        option.coerce(object())
+
+
+class _Config(dict):
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+def test_apply():
+    config = _Config(
+        core=types.SimpleNamespace(name='app', buildarch=None),
+        python_venv=types.SimpleNamespace(name='app', python=None),
+    )
+    matrix.apply(config, matrix.Variant('python3.11', 'x86_64', '-py311'))
+    assert config.core.name == 'app-py311'
+    assert config.core.buildarch == 'x86_64'
+    assert config.python_venv.name == 'app-py311'
+    assert config.python_venv.python == 'python3.11'
+
+    config = _Config(core=types.SimpleNamespace(name='app', buildarch=None))
+    matrix.apply(config, matrix.Variant(None, None, '-any'))
+    assert config.core.name == 'app-any'
+    with pytest.raises(ValueError):
+        matrix.apply(config, matrix.Variant('python3.11', None, '-py311'))
@@ -0,0 +1,72 @@
+"""Test suites for the SPEC generation profiler."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+
+from rpmvenv import cli
+from rpmvenv import profiling
+
+
+class SlowExtension(object):
+
+    name = 'slow'
+
+    @staticmethod
+    def generate(config, spec):
+        spec.tags['Name'] = 'slow'
+        spec.blocks.install.extend(str(line) for line in range(10000))
+        return spec
+
+
+def test_generate_spec_profile(tmpdir):
+    """Test that each extension and the rendering get a section."""
+    profiler = profiling.Profiler(limit=5)
+    specfile = cli.generate_spec(None, (SlowExtension,), profiler=profiler)
+    assert 'Name: slow' in str(specfile)
+    tmpdir.mkdir('SOURCES')
+    with cli.profile_section(profiler, 'render'):
+        cli.rpmbuild.write_spec(str(tmpdir), specfile)
+
+    path = profiler.write(str(tmpdir.join('profile.json')))
+    with open(path) as report_file:
+        report = json.load(report_file)
+    assert [s['name'] for s in report['sections']] == [
+        'extension:slow',
+        'render',
+    ]
+    for section in report['sections']:
+        assert section['seconds'] >= 0
+        assert section['peak_memory_bytes'] > 0
+        assert 0 < len(section['functions']) <= 5
+    functions = report['sections'][0]['functions']
+    assert any('generate' in f['function'] for f in functions)
+
+
+def test_generate_spec_renders_once(tmpdir, monkeypatch):
+    """Test that the SPEC is rendered once for the file and the digest."""
+    renders = []
+    stream = cli.spec.Spec.stream
+
+    def counted(self):
+        renders.append(self)
+        return stream(self)
+
+    monkeypatch.setattr(cli.spec.Spec, 'stream', counted)
+    specfile = cli.generate_spec(
+        None,
+        (SlowExtension,),
+        profiler=profiling.Profiler(),
+    )
+    assert renders == []
+    digest = cli.artifacts.SpecDigest()
+    tmpdir.mkdir('SOURCES')
+    path = cli.rpmbuild.write_spec(str(tmpdir), specfile, digest)
+    assert len(renders) == 1
+    with open(path) as spec_file:
+        assert cli.artifacts.fingerprint(digest, 'source') == (
+            cli.artifacts.fingerprint(spec_file.read(), 'source')
+        )
@@ -0,0 +1,99 @@
+"""Test suites for the rpmbuild process helpers."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gzip
+import os
+import sys
+
+import pytest
+
+from rpmvenv import rpmbuild
+
+
+SCRIPT = (
+    'import sys\n'
+    'for i in range(5000):\n'
+    '    print(i)\n'
+    '    sys.stderr.write("err %d\\n" % i)\n'
+    'sys.exit(3)\n'
+)
+
+
+def test_quiet_popen_logs_output(tmpdir):
+    """Test that only the tail is kept while the log holds everything."""
+    script = tmpdir.join('noisy.py')
+    script.write(SCRIPT)
+    log = str(tmpdir.join('build.log.gz'))
+    lines = []
+    with pytest.raises(rpmbuild.RpmProcessError) as info:
+        rpmbuild.quiet_popen(
+            '{0} {1}'.format(sys.executable, script),
+            on_line=lines.append,
+            log=log,
+        )
+    exc = info.value
+    assert exc.returncode == 3
+    assert exc.log == log
+    assert exc.stdout.splitlines() == [
+        str(i) for i in range(5000 - rpmbuild.TAIL_LINES, 5000)
+    ]
+    assert exc.stderr.splitlines()[-1] == 'err 4999'
+    assert len(lines) == 5000
+    with gzip.open(log, 'rt') as log_file:
+        logged = log_file.read().splitlines()
+    assert len(logged) == 10000
+    assert '0' in logged and 'err 0' in logged
+
+
+@pytest.mark.parametrize('mode,built,returned', (
+    ('all', ('RPMS', 'SRPMS'), ('RPMS',)),
+    ('binary', ('RPMS',), ('RPMS',)),
+    ('source', ('SRPMS',), ('SRPMS',)),
+    ('install', (), ()),
+))
+def test_build_mode(tmpdir, monkeypatch, mode, built, returned):
+    """Test that the mode picks the stage and the packages returned."""
+    top = rpmbuild.topdir(str(tmpdir))
+    commands = []
+
+    def quiet_popen(cmd, on_line, log):
+        commands.append(cmd)
+        if 'RPMS' in built:
+            path = tmpdir.join(os.path.relpath(top, str(tmpdir)), 'RPMS')
+            path.join('x86_64', 'pkg-1.0-1.x86_64.rpm').write('', ensure=True)
+        if 'SRPMS' in built:
+            path = tmpdir.join(os.path.relpath(top, str(tmpdir)), 'SRPMS')
+            path.join('pkg-1.0-1.src.rpm').write('', ensure=True)
+
+    monkeypatch.setattr(rpmbuild, 'quiet_popen', quiet_popen)
+    pkgs = rpmbuild.build('package.spec', top, mode=mode)
+    assert commands[0].startswith(
+        'rpmbuild {0} '.format(rpmbuild.BUILD_MODES[mode]),
+    )
+    assert tuple(
+        os.path.relpath(pkg, top).split(os.sep)[0] for pkg in pkgs
+    ) == returned
+
+
+def test_build_buildroot(tmpdir, monkeypatch):
+    """Test that a given buildroot overrides the one of the SPEC."""
+    commands = []
+    monkeypatch.setattr(
+        rpmbuild,
+        'quiet_popen',
+        lambda cmd, on_line, log: commands.append(cmd),
+    )
+    rpmbuild.build(
+        'package.spec',
+        str(tmpdir),
+        mode='install',
+        buildroot='/out/pkg-buildroot',
+    )
+    assert commands == [
+        "rpmbuild -bi --define='_topdir {0}' "
+        "--buildroot='/out/pkg-buildroot' package.spec".format(tmpdir),
+    ]
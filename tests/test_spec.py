@@ -5,6 +5,8 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
+
 from rpmvenv import spec
 
 
@@ -57,3 +59,25 @@ test1""" in str(specfile)
     assert """%test2
 test2
 test2""" in str(specfile)
+
+
+def test_spec_block_arguments():
+    """Test if block arguments are written in the block header."""
+    specfile = spec.Spec()
+    specfile.blocks.get('files deps').append('/test')
+    specfile.blocks.arguments('files deps').extend(('-f', 'deps.files'))
+
+    assert """%files deps -f deps.files
+/test""" in str(specfile)
+
+
+def test_spec_stream():
+    """Test if the streamed SPEC matches the rendered SPEC."""
+    specfile = spec.Spec()
+    specfile.tags['Name'] = 'test'
+    specfile.blocks.install.extend('line{0}'.format(i) for i in range(100))
+    stream = io.StringIO()
+    specfile.write(stream)
+
+    assert stream.getvalue() == str(specfile)
+    assert len(tuple(specfile.stream())) > 1
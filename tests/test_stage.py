@@ -0,0 +1,187 @@
+"""Test suites for the source staging tools."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import tarfile
+
+import pytest
+
+from rpmvenv import stage
+
+
+def _write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as handle:
+        handle.write(content)
+
+
+def _read(path):
+    with open(path, 'r') as handle:
+        return handle.read()
+
+
+@pytest.fixture
+def source(tmpdir):
+    path = str(tmpdir.join('src'))
+    _write(os.path.join(path, 'setup.py'), 'setup')
+    _write(os.path.join(path, 'pkg', '__init__.py'), 'init')
+    _write(os.path.join(path, 'pkg', 'mod.pyc'), 'compiled')
+    os.makedirs(os.path.join(path, 'empty'))
+    return path
+
+
+@pytest.mark.parametrize('mode', stage.MODES)
+def test_stage_copies_tree(source, tmpdir, mode):
+    """Test that every mode produces the same staged tree."""
+    dest = str(tmpdir.join('dest'))
+    stage.stage(source, dest, ignore=('*.pyc',), mode=mode)
+    assert _read(os.path.join(dest, 'setup.py')) == 'setup'
+    assert _read(os.path.join(dest, 'pkg', '__init__.py')) == 'init'
+    assert not os.path.exists(os.path.join(dest, 'pkg', 'mod.pyc'))
+    assert os.path.isdir(os.path.join(dest, 'empty'))
+
+
+def test_stage_unknown_mode(source, tmpdir):
+    with pytest.raises(ValueError):
+        stage.stage(source, str(tmpdir.join('dest')), mode='teleport')
+
+
+def test_stage_incremental(source, tmpdir):
+    """Test that a restage only touches changed files and prunes others."""
+    dest = str(tmpdir.join('dest'))
+    index = str(tmpdir.join('index'))
+    stage.stage(source, dest, index=index)
+
+    # Build output written into the staged tree and files removed from the
+    # source must not survive the next run.
+    _write(os.path.join(dest, 'build', 'lib', 'out.py'), 'out')
+    _write(os.path.join(dest, 'stray.txt'), 'stray')
+    os.unlink(os.path.join(source, 'setup.py'))
+    _write(os.path.join(source, 'pkg', '__init__.py'), 'changed')
+    untouched = os.stat(os.path.join(dest, 'pkg', 'mod.pyc')).st_ino
+
+    stage.stage(source, dest, index=index)
+    assert not os.path.exists(os.path.join(dest, 'build'))
+    assert not os.path.exists(os.path.join(dest, 'stray.txt'))
+    assert not os.path.exists(os.path.join(dest, 'setup.py'))
+    assert _read(os.path.join(dest, 'pkg', '__init__.py')) == 'changed'
+    assert os.stat(os.path.join(dest, 'pkg', 'mod.pyc')).st_ino == untouched
+
+
+def test_stage_hardlink_is_replaced(source, tmpdir):
+    """Test that restaging never writes through a hardlink to the source."""
+    dest = str(tmpdir.join('dest'))
+    stage.stage(source, dest, mode='hardlink')
+    stage.stage(source, dest, mode='copy')
+    _write(os.path.join(dest, 'setup.py'), 'modified')
+    assert _read(os.path.join(source, 'setup.py')) == 'setup'
+
+
+@pytest.mark.parametrize('compression', ('gz', 'bz2', 'xz'))
+def test_archive(source, tmpdir, compression):
+    """Test that the archive holds the tree under a single directory."""
+    path = str(tmpdir.join('src.tar.' + compression))
+    stage.archive(source, path, compression, ignore=('*.pyc',), arcname='pkg')
+    with tarfile.open(path) as tar:
+        names = sorted(tar.getnames())
+        assert names == [
+            'pkg',
+            'pkg/empty',
+            'pkg/pkg',
+            'pkg/pkg/__init__.py',
+            'pkg/setup.py',
+        ]
+        content = tar.extractfile('pkg/setup.py').read()
+        assert content == b'setup'
+
+
+def test_archive_unknown_compression(source, tmpdir):
+    with pytest.raises(ValueError):
+        stage.archive(source, str(tmpdir.join('src.tar')), 'lz4')
+
+
+@pytest.mark.parametrize('pattern,path,is_dir,ignored', (
+    ('*.log', 'debug.log', False, True),
+    ('*.log', 'logs/debug.log', False, True),
+    ('/build', 'build', True, True),
+    ('/build', 'pkg/build', True, False),
+    ('docs/', 'docs', True, True),
+    ('docs/', 'docs', False, False),
+    ('pkg/*.txt', 'pkg/a.txt', False, True),
+    ('pkg/*.txt', 'pkg/sub/a.txt', False, False),
+    ('**/fixtures', 'a/b/fixtures', True, True),
+    ('**/fixtures', 'fixtures', True, True),
+    ('data/**', 'data/a/b.csv', False, True),
+    ('a/**/z', 'a/z', False, True),
+    ('a/**/z', 'a/b/c/z', False, True),
+    ('file[0-9].txt', 'file1.txt', False, True),
+    ('file[!0-9].txt', 'file1.txt', False, False),
+    ('\\#notes', '#notes', False, True),
+))
+def test_ignore_rules(pattern, path, is_dir, ignored):
+    """Test the gitignore pattern semantics."""
+    rules = stage.IgnoreRules(('# comment', '', pattern))
+    assert rules.ignored(path, is_dir) is ignored
+
+
+def test_ignore_rules_negation():
+    """Test that the last matching pattern decides."""
+    rules = stage.IgnoreRules(('*.txt', '!keep.txt'))
+    assert rules.ignored('drop.txt')
+    assert not rules.ignored('keep.txt')
+    assert not stage.IgnoreRules()
+
+
+def test_stage_ignore_file(source, tmpdir):
+    """Test that the ignore file in the source root is applied."""
+    _write(os.path.join(source, stage.IGNORE_FILE), 'pkg/\n')
+    dest = str(tmpdir.join('dest'))
+    stage.stage(
+        source,
+        dest,
+        selection=stage.Selection.from_source(source),
+    )
+    assert os.path.isfile(os.path.join(dest, 'setup.py'))
+    assert not os.path.exists(os.path.join(dest, 'pkg'))
+
+
+def test_stage_git_files(source, tmpdir):
+    """Test that only tracked files are staged in git mode."""
+    subprocess.check_call(('git', 'init', '-q'), cwd=source)
+    subprocess.check_call(('git', 'add', 'setup.py', 'pkg'), cwd=source)
+    _write(os.path.join(source, 'untracked.txt'), 'untracked')
+    dest = str(tmpdir.join('dest'))
+    stage.stage(
+        source,
+        dest,
+        selection=stage.Selection.from_source(source, use_git=True),
+    )
+    assert os.path.isfile(os.path.join(dest, 'setup.py'))
+    assert os.path.isfile(os.path.join(dest, 'pkg', 'mod.pyc'))
+    assert not os.path.exists(os.path.join(dest, 'untracked.txt'))
+    assert not os.path.exists(os.path.join(dest, 'empty'))
+    assert not os.path.exists(os.path.join(dest, '.git'))
+
+
+def test_git_files_outside_repo(tmpdir):
+    with pytest.raises(subprocess.CalledProcessError):
+        stage.git_files(str(tmpdir))
+
+
+def test_stage_file_clone(tmpdir, monkeypatch):
+    """Test that clone falls back to a hardlink without reflinks."""
+    src = tmpdir.join('src')
+    src.write('content')
+
+    def reflink(src, dst):
+        raise OSError('Reflinks are not supported.')
+
+    monkeypatch.setattr(stage, 'reflink', reflink)
+    stage.stage_file(str(src), str(tmpdir.join('dst')), mode='clone')
+    assert tmpdir.join('dst').stat().ino == src.stat().ino
@@ -0,0 +1,24 @@
+"""Test suites for the template loader."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+from rpmvenv import template
+
+
+def test_external_templates_are_cached(tmpdir, monkeypatch):
+    """Test that external environments are reused and compiled to disk."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('cache')))
+    monkeypatch.setattr(template, 'ENVIRONMENTS', {})
+    path = tmpdir.join('templates', 'custom')
+    path.write('Name: {{ name }}', ensure=True)
+
+    first = template.get(str(path))
+    assert first.render(name='test') == 'Name: test'
+    assert template.get(str(path)) is first
+    assert template.get('spec').environment is template.environment()
+    assert os.listdir(str(tmpdir.join('cache', 'rpmvenv', 'templates')))
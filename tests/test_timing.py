@@ -0,0 +1,129 @@
+"""Test suites for the rpmbuild timing instrumentation."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import subprocess
+
+from rpmvenv import spec as specfile
+from rpmvenv import timing
+
+
+def _spec():
+    spec = specfile.Spec()
+    spec.blocks.prep.append('mkdir -p build')
+    spec.blocks.install.extend((
+        '# A comment is never a step.',
+        'if [ -n "$HOME" ]; then',
+        'true',
+        'fi',
+        'echo one \\',
+        '    two',
+        'cat > /dev/null <<EOF',
+        'not a command',
+        'EOF',
+        'case "$HOME" in',
+        '    *) true ;;',
+        'esac',
+    ))
+    spec.blocks.files.append('/usr/bin/tool')
+    return spec
+
+
+def test_instrument():
+    """Test that markers only land where a shell command can begin."""
+    recorder = timing.Recorder()
+    original = _spec()
+    spec = recorder.instrument(original)
+    assert original.blocks.install[0] == '# A comment is never a step.'
+    assert spec.blocks.files == ['/usr/bin/tool']
+    assert 'build' not in dict(spec.blocks)
+    assert 'check' not in dict(spec.blocks)
+    assert spec.blocks.prep == [
+        timing.marker('prep', 'begin'),
+        'mkdir -p build',
+        timing.marker('prep', 'end'),
+    ]
+    assert recorder.steps['install'] == [
+        'if [ -n "$HOME" ]; then',
+        'true',
+        'echo one \\',
+        'cat > /dev/null <<EOF',
+        'case "$HOME" in',
+    ]
+    # The instrumented block must still be a valid script.
+    script = '\n'.join(spec.blocks.install).replace('%%', '%')
+    output = subprocess.check_output(('sh', '-c', script))
+    for line in output.decode('utf8').splitlines():
+        recorder.feed(line)
+    assert [event[:2] for event in recorder.events] == [
+        ('install', 'begin'),
+        ('install', '0'),
+        ('install', '1'),
+        ('install', '2'),
+        ('install', '3'),
+        ('install', '4'),
+        ('install', 'end'),
+    ]
+
+
+def test_report():
+    """Test that the report covers phases, steps, and packaging time."""
+    recorder = timing.Recorder()
+    recorder.instrument(_spec())
+    recorder.started = 100.0
+    for line in (
+            'Executing(%prep): /bin/sh -e /var/tmp/rpm-tmp.1',
+            '{0} prep begin 101.0'.format(timing.MARKER),
+            '+ echo \'{0} prep end 102.0\''.format(timing.MARKER),
+            '{0} prep end 102.0'.format(timing.MARKER),
+            '{0} install begin 103.0'.format(timing.MARKER),
+            '{0} install 0 103.0'.format(timing.MARKER),
+            '{0} install 1 104.0'.format(timing.MARKER),
+            '{0} install 2 106.0'.format(timing.MARKER),
+            '{0} install 3 106.5'.format(timing.MARKER),
+            '{0} install 4 107.0'.format(timing.MARKER),
+            '{0} install end 108.0'.format(timing.MARKER),
+    ):
+        recorder.feed(line)
+    recorder.finished = 115.0
+    report = recorder.report()
+    assert report['seconds'] == 15.0
+    assert [(p['name'], p['seconds']) for p in report['phases']] == [
+        ('startup', 1.0),
+        ('prep', 1.0),
+        ('install', 5.0),
+        ('package', 7.0),
+    ]
+    steps = report['phases'][2]['steps']
+    assert [step['seconds'] for step in steps] == [1.0, 2.0, 0.5, 0.5, 1.0]
+    assert steps[1]['command'] == 'true'
+
+
+def test_report_package_ends_at_clean():
+    """Test that packaging time skips %check and ends before %clean."""
+    recorder = timing.Recorder()
+    recorder.started = 100.0
+    for phase, step, stamp in (
+            ('install', 'begin', 101.0),
+            ('install', 'end', 103.0),
+            ('check', 'begin', 104.0),
+            ('check', 'end', 107.0),
+            ('clean', 'begin', 110.0),
+            ('clean', 'end', 110.5),
+    ):
+        recorder.feed('{0} {1} {2} {3}'.format(
+            timing.MARKER, phase, step, stamp,
+        ))
+    recorder.finished = 111.0
+    assert [
+        (p['name'], p['seconds']) for p in recorder.report()['phases']
+    ] == [
+        ('startup', 1.0),
+        ('install', 2.0),
+        ('package', 4.0),
+        ('check', 3.0),
+        ('clean', 0.5),
+    ]
@@ -6,11 +6,32 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import copy
+import types
 
 from rpmvenv.spec import Spec
+from rpmvenv.extensions import core
 from rpmvenv.extensions.python import venv
 
 
+def _config():
+    """Get a configuration with fresh copies of the namespaces.
+
+    The registered namespaces are shared by the whole process so each test
+    changes its own copies rather than the originals. The copies start from
+    the defaults because a deep copy of the Configuration, which some tests
+    use, still changes the shared namespaces.
+    """
+    config = types.SimpleNamespace(
+        core=copy.deepcopy(core.cfg.core),
+        python_venv=copy.deepcopy(venv.cfg.python_venv),
+    )
+    for namespace in (config.core, config.python_venv):
+        for _, option in namespace.options():
+            if option.default is not None:
+                option.value = option.default
+    return config
+
+
 def test_use_pip_install_off():
     ext = venv.Extension()
     config = copy.deepcopy(venv.cfg)
@@ -46,3 +67,263 @@ class TestRemovePycache:
         spec = Spec()
         ext.generate(config, spec)
         assert self.cmd in str(spec)
+
+
+class TestVenvCache:
+
+    def _generate(self, tmpdir):
+        ext = venv.Extension()
+        config = _config()
+        config.python_venv.cache_dir = str(tmpdir.join('cache'))
+        config.python_venv.requirements = ('requirements.txt', 'dev.txt')
+        spec = Spec()
+        ext.generate(config, spec)
+        return venv.layer_keys(config, spec), str(spec)
+
+    def test_cache_off(self):
+        ext = venv.Extension()
+        config = _config()
+        spec = Spec()
+        ext.generate(config, spec)
+        assert 'venv_cache' not in str(spec)
+        assert '%{venv_cmd} %{venv_dir}' in str(spec)
+
+    def test_cache_layers(self, tmpdir):
+        keys, content = self._generate(tmpdir)
+        assert len(keys) == 3
+        assert 'restore --destination=%{{venv_dir}} {0}'.format(
+            ' '.join(keys)
+        ) in content
+        for position, key in enumerate(keys):
+            assert 'save --source=%{{venv_dir}} {0}'.format(key) in content
+            assert 'if [ "$venv_layer" -lt {0} ]; then'.format(
+                position
+            ) in content
+
+    def test_cache_restore_failure(self, tmpdir):
+        _, content = self._generate(tmpdir)
+        assert ') || venv_layer=-1\nvenv_layer=${venv_layer:--1}\n' in content
+        assert 'then\nrm -rf %{venv_dir}\n%{venv_cmd} %{venv_dir}' in content
+
+    def test_cache_keys_follow_pip_inputs(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(str(tmpdir))
+        tmpdir.join('constraints.txt').write('six==1.0\n')
+        ext = venv.Extension()
+
+        def keys(**options):
+            config = _config()
+            config.python_venv.cache_dir = str(tmpdir.join('cache'))
+            config.python_venv.requirements = ()
+            config.python_venv.wheelhouse = 'wheels'
+            config.python_venv.pip_flags = ('-c constraints.txt',)
+            for option, value in options.items():
+                setattr(config.python_venv, option, value)
+            spec = Spec()
+            ext.generate(config, spec)
+            return venv.layer_keys(config, spec)
+
+        first = keys()
+        assert keys() == first
+        assert keys(pip_flags=('--constraint=constraints.txt',)) != first
+        tmpdir.join('constraints.txt').write('six==1.1\n')
+        second = keys()
+        assert second != first
+        tmpdir.join('wheels', 'six-1.1-py3-none-any.whl').write(
+            '',
+            ensure=True,
+        )
+        assert keys() != second
+
+    def test_cache_keys_follow_requirements(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(str(tmpdir))
+        tmpdir.join('requirements.txt').write('six==1.0\n')
+        tmpdir.join('dev.txt').write('pytest\n')
+        first, _ = self._generate(tmpdir)
+        tmpdir.join('dev.txt').write('pytest==7.0\n')
+        second, _ = self._generate(tmpdir)
+        assert first[:2] == second[:2]
+        assert first[2] != second[2]
+
+
+def test_wheelhouse(tmpdir):
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.wheelhouse = str(tmpdir.join('wheels'))
+    spec = Spec()
+    ext.generate(config, spec)
+    assert '--no-index --find-links={0}'.format(
+        tmpdir.join('wheels')
+    ) in spec.macros['venv_pip']
+
+
+def test_precompile(tmpdir):
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.precompile = True
+    config.python_venv.precompile_optimize = (0, 1)
+    config.python_venv.cache_dir = str(tmpdir.join('cache'))
+    spec = Spec()
+    ext.generate(config, spec)
+    line = spec.blocks.install[-1]
+    assert line.startswith('rpmvenv-helper precompile')
+    assert '--install-dir=/%{venv_install_dir}' in line
+    assert '--optimize=0 --optimize=1' in line
+    assert '--cache-dir={0}'.format(tmpdir.join('cache', 'precompile')) in line
+    assert spec.blocks.install.index(line) > [
+        index for index, value in enumerate(spec.blocks.install)
+        if value.startswith('venvctrl-relocate')
+    ][0]
+
+
+def test_postprocess(tmpdir):
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.postprocess = True
+    config.python_venv.remove_pycache = True
+    config.python_venv.cache_dir = str(tmpdir.join('cache'))
+    spec = Spec()
+    ext.generate(config, spec)
+    lines = [
+        line for line in spec.blocks.install
+        if line.startswith('rpmvenv-helper postprocess')
+    ]
+    assert len(lines) == 1
+    assert '--destination=/%{venv_install_dir}' in lines[0]
+    assert '--buildroot=%{buildroot}' in lines[0]
+    assert '--remove-pycache' in lines[0]
+    assert '--strip --strip-cache-dir={0}'.format(
+        tmpdir.join('cache', 'strip')
+    ) in lines[0]
+    assert not any(
+        line.startswith(('venvctrl-relocate', 'rpmvenv-helper strip', 'find'))
+        for line in spec.blocks.install
+    )
+
+
+def test_dedup():
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.dedup = True
+    config.python_venv.precompile = True
+    spec = Spec()
+    ext.generate(config, spec)
+    assert spec.blocks.install[-1] == 'rpmvenv-helper dedup %{venv_dir}'
+
+
+def test_split_deps(tmpdir):
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.split_deps = True
+    config.python_venv.requirements = ()
+    config.python_venv.name = 'app'
+    config.core.name = 'app'
+    config.core.release = '1%{?dist}'
+    config.core.destination = str(tmpdir)
+    spec = Spec()
+    spec.tags['Requires'] = 'python3'
+    ext.generate(config, spec)
+    version = venv.deps_version(config)
+    tmpdir.join('app-deps-{0}-1.el9.x86_64.rpm'.format(version)).write('')
+    skipped = Spec()
+    ext.generate(config, skipped)
+    assert spec.tags['Requires'] == (
+        'python3, %{{name}}-deps = {0}-%{{release}}'.format(version)
+    )
+    assert 'Version: {0}'.format(version) in spec.blocks.get('package deps')
+    assert spec.blocks.arguments('files') == [
+        '-f', '%{_builddir}/rpmvenv-app.files',
+    ]
+    assert spec.blocks.files == []
+    snapshot = spec.blocks.install.index(
+        'rpmvenv-helper split snapshot '
+        '--output=%{_builddir}/rpmvenv-deps.json %{venv_dir}'
+    )
+    assert spec.blocks.install[snapshot + 1] == 'cd %{rpmvenv_source}'
+    assert '--deps=%{_builddir}/rpmvenv-deps.files' in (
+        spec.blocks.install[-1]
+    )
+
+    config.python_venv.dedup = True
+    deduped = Spec()
+    ext.generate(config, deduped)
+    assert (
+        'rpmvenv-helper dedup --snapshot=%{_builddir}/rpmvenv-deps.json '
+        '%{venv_dir}'
+    ) in deduped.blocks.install
+
+    assert 'package deps' not in dict(skipped.blocks)
+    assert skipped.blocks.install[-1].startswith('rpmvenv-helper split lists')
+    assert '--deps' not in skipped.blocks.install[-1]
+
+
+def test_deps_version(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    config = _config()
+    config.python_venv.name = 'app'
+    version = venv.deps_version(config)
+    assert version == venv.deps_version(config)
+    for option, value in (
+            ('name', 'other'),
+            ('path', '/opt/python'),
+            ('strip_binaries', False),
+            ('remove_pycache', True),
+            ('postprocess', True),
+            ('precompile', True),
+            ('wheelhouse', 'wheels'),
+    ):
+        changed = _config()
+        changed.python_venv.name = 'app'
+        setattr(changed.python_venv, option, value)
+        assert venv.deps_version(changed) != version, option
+    empty = venv.deps_version(changed)
+    tmpdir.join('wheels', 'six-1.0-py3-none-any.whl').write('', ensure=True)
+    assert venv.deps_version(changed) != empty
+
+
+def test_installer_uv(monkeypatch):
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.installer = 'uv'
+    config.python_venv.python = 'python3.9'
+    monkeypatch.setattr(venv.shutil, 'which', lambda cmd: '/bin/uv')
+    spec = Spec()
+    ext.generate(config, spec)
+    monkeypatch.setattr(venv.shutil, 'which', lambda cmd: None)
+    fallback = Spec()
+    ext.generate(config, fallback)
+    assert spec.macros['venv_cmd'] == 'uv venv --seed --python=python3.9'
+    assert spec.macros['venv_pip'].startswith(
+        'uv pip install --python=%{venv_python} --link-mode=copy'
+    )
+    assert fallback.macros['venv_cmd'].startswith('virtualenv --always-copy')
+    assert fallback.macros['venv_pip'].startswith(
+        '%{venv_python} %{venv_bin}/pip install'
+    )
+
+
+def test_lock():
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.lock = 'requirements.lock'
+    config.python_venv.requirements = ('requirements.txt', 'dev.txt')
+    config.python_venv.use_pip_install = True
+    spec = Spec()
+    ext.generate(config, spec)
+    installs = [
+        line for line in spec.blocks.install
+        if line.startswith('%{venv_pip}')
+    ]
+    assert installs == [
+        '%{venv_pip} --no-deps --require-hashes -r requirements.lock',
+        '%{venv_pip} --no-deps .',
+    ]
+
+
+def test_lock_without_pip_install():
+    ext = venv.Extension()
+    config = _config()
+    config.python_venv.lock = 'requirements.lock'
+    spec = Spec()
+    ext.generate(config, spec)
+    assert '%{venv_pip} --no-deps .' in spec.blocks.install
+    assert '%{venv_python} setup.py install' not in spec.blocks.install
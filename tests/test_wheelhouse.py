@@ -0,0 +1,57 @@
+"""Test suites for the wheelhouse builder."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from rpmvenv import wheelhouse
+
+
+def test_wheelhouse_command():
+    cmd = wheelhouse.command(
+        '/tmp/wheels',
+        requirements=('requirements.txt', 'dev.txt'),
+        python='python3.9',
+        pip_flags=('--index-url https://pypi.example.org',),
+    )
+    assert cmd[:5] == [
+        'python3.9', '-m', 'pip', 'wheel', '--wheel-dir=/tmp/wheels',
+    ]
+    assert cmd[5:7] == ['--index-url', 'https://pypi.example.org']
+    assert cmd[7:11] == ['-r', 'requirements.txt', '-r', 'dev.txt']
+    assert tuple(cmd[11:]) == wheelhouse.BUILD_REQUIREMENTS
+
+
+def test_wheelhouse_build_lock(tmpdir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        wheelhouse.subprocess,
+        'check_call',
+        lambda cmd, cwd: calls.append(cmd),
+    )
+    monkeypatch.setattr(
+        wheelhouse.lock,
+        'add_hashes',
+        lambda path, wheels: calls.append((path, wheels)),
+    )
+    path = str(tmpdir.join('wheels'))
+    wheelhouse.build(
+        path,
+        str(tmpdir),
+        requirements=('requirements.txt',),
+        lock_file='requirements.lock',
+    )
+    assert calls[0][-2:] == ['-r', 'requirements.lock']
+    assert tuple(calls[1][-2:]) == wheelhouse.BUILD_REQUIREMENTS
+    assert '-r' not in calls[1]
+    assert len(calls) == 2
+
+    wheelhouse.build(
+        path,
+        str(tmpdir),
+        requirements=('requirements.txt',),
+        lock_file='requirements.lock',
+        update_lock=True,
+    )
+    assert calls[4] == ('requirements.lock', path)
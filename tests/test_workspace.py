@@ -0,0 +1,130 @@
+"""Test suites for the build workspace."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+import pytest
+
+from rpmvenv import workspace
+
+
+class BuildError(Exception):
+
+    def __init__(self, log):
+        super(BuildError, self).__init__(log)
+        self.log = log
+
+
+def test_topdir_removed(tmpdir):
+    """Test that a new topdir is created under the root and removed."""
+    work = workspace.Workspace(str(tmpdir))
+    with work.topdir() as top:
+        assert os.path.dirname(top) == str(tmpdir)
+        for name in workspace.SUBDIRS:
+            assert os.path.isdir(os.path.join(top, name))
+    assert not os.path.exists(top)
+
+
+def test_topdir_failed(tmpdir):
+    """Test that a failed topdir is removed but its log is kept."""
+    work = workspace.Workspace(str(tmpdir))
+    with pytest.raises(BuildError) as exc:
+        with work.topdir() as top:
+            log = os.path.join(top, workspace.LOG_FILE)
+            with open(log, 'w') as log_file:
+                log_file.write('log')
+            raise BuildError(log)
+    assert not os.path.exists(top)
+    assert os.path.dirname(exc.value.log) == str(
+        tmpdir.join(workspace.FAILED_DIR)
+    )
+    with open(exc.value.log) as log_file:
+        assert log_file.read() == 'log'
+
+
+def test_topdir_keep_failed(tmpdir):
+    """Test that a failed topdir is kept when asked."""
+    work = workspace.Workspace(str(tmpdir), keep_failed=True)
+    with pytest.raises(BuildError) as exc:
+        with work.topdir() as top:
+            raise BuildError(os.path.join(top, workspace.LOG_FILE))
+    kept = tmpdir.join(workspace.FAILED_DIR, os.path.basename(top))
+    assert not os.path.exists(top)
+    assert kept.join('SOURCES').isdir()
+    assert exc.value.log == str(kept.join(workspace.LOG_FILE))
+
+
+def test_topdir_failed_pruned(tmpdir):
+    """Test that only the most recent failures are kept."""
+    work = workspace.Workspace(str(tmpdir), keep_failed=True)
+    failed = tmpdir.mkdir(workspace.FAILED_DIR)
+    failed.chmod(0o700)
+    for index in range(workspace.FAILED_KEPT):
+        failed.join('old{0}.log.gz'.format(index)).write('')
+        failed.join('old{0}.log.gz'.format(index)).setmtime(index)
+    with pytest.raises(ValueError):
+        with work.topdir() as top:
+            raise ValueError()
+    names = sorted(os.listdir(str(failed)))
+    assert len(names) == workspace.FAILED_KEPT
+    assert 'old0.log.gz' not in names
+    assert os.path.basename(top) in names
+
+
+def test_topdir_reuse(tmpdir):
+    """Test that a pooled topdir keeps its sources and drops its output."""
+    work = workspace.Workspace(str(tmpdir), reuse=True)
+    with work.topdir('/src/app') as top:
+        pooled = tmpdir.join(os.path.relpath(top, str(tmpdir)))
+        pooled.join('SOURCES', 'app', 'setup.py').write('', ensure=True)
+        pooled.join('BUILD', 'app', 'setup.py').write('', ensure=True)
+        pooled.join('RPMS', 'app.rpm').write('')
+    with work.topdir('/src/app') as again:
+        assert again == top
+        assert os.path.isfile(os.path.join(top, 'SOURCES', 'app', 'setup.py'))
+        assert os.path.isfile(os.path.join(top, 'BUILD', 'app', 'setup.py'))
+        assert os.listdir(os.path.join(top, 'RPMS')) == []
+        with work.topdir('/src/app') as other:
+            assert other != top
+    with work.topdir('/src/other') as other:
+        assert os.path.dirname(other) != os.path.dirname(top)
+
+
+def test_topdir_failed_unsafe(tmpdir):
+    """Test that a failed directory of another user is not used."""
+    work = workspace.Workspace(str(tmpdir), keep_failed=True)
+    tmpdir.mkdir(workspace.FAILED_DIR).chmod(0o777)
+    with pytest.raises(BuildError):
+        with work.topdir() as top:
+            raise BuildError(os.path.join(top, workspace.LOG_FILE))
+    assert os.path.isdir(top)
+    assert tmpdir.join(workspace.FAILED_DIR).listdir() == []
+
+
+def test_default_root(tmpdir, monkeypatch):
+    """Test that the default root is private to the user."""
+    monkeypatch.setattr(workspace.tempfile, 'tempdir', str(tmpdir))
+    root = workspace.default_root()
+    assert root == str(tmpdir.join('rpmvenv-{0}'.format(os.getuid())))
+    assert os.stat(root).st_mode & 0o777 == 0o700
+    os.chmod(root, 0o777)
+    other = workspace.default_root()
+    assert other != root
+    assert os.stat(other).st_mode & 0o777 == 0o700
+
+
+def test_pool_slots_and_clean(tmpdir):
+    """Test that the pool is capped and unused directories are removed."""
+    work = workspace.Workspace(str(tmpdir), reuse=True, slots=1)
+    with work.topdir('/src/app') as top:
+        with work.topdir('/src/app') as other:
+            assert os.path.dirname(other) == str(tmpdir)
+        assert not os.path.exists(other)
+        assert work.clean() == 0
+    assert os.path.isdir(top)
+    assert work.clean() == 1
+    assert tmpdir.join(workspace.POOL_DIR).listdir() == []